@@ -0,0 +1,431 @@
+#!/usr/bin/python3
+
+import argparse
+import json
+import logging
+import os
+import pathlib
+import platform
+import random
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import date, datetime, timedelta
+
+import sqlalchemy
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from chronophore import __version__, controller, occupancy, report
+from chronophore.models import (
+    Base, Entry, User, add_missing_indexes, use_compact_timesheet
+)
+
+from generate import generate_database
+
+__description__ = """
+Time Chronophore's hot paths against a large made up database, and
+compare the results with a previous run.
+"""
+
+HERE = pathlib.Path(__file__).resolve().parent
+SCRIPTS = HERE.parent.joinpath('scripts')
+
+
+def summarize(samples):
+    """Return statistics in milliseconds for a list of durations in
+    seconds.
+    """
+    samples = sorted(samples)
+
+    def percentile(p):
+        return samples[min(len(samples) - 1, int(round(p * (len(samples) - 1))))]
+
+    return dict(
+        n=len(samples),
+        min=samples[0] * 1000,
+        median=percentile(0.5) * 1000,
+        p95=percentile(0.95) * 1000,
+        max=samples[-1] * 1000,
+    )
+
+
+def repeat(function, number, setup=None):
+    """Call a function some number of times and return how long each
+    call took. `setup` is called, untimed, before each call.
+    """
+    samples = []
+    for _ in range(number):
+        if setup is not None:
+            setup()
+        started = time.perf_counter()
+        function()
+        samples.append(time.perf_counter() - started)
+    return samples
+
+
+def bench_sign(database_file, work_dir, number, rng):
+    """Sign random single-type users in and out of a copy of the
+    database, each with a new session, like the gui does.
+    """
+    copy = work_dir.joinpath('sign.sqlite')
+    shutil.copy(str(database_file), str(copy))
+    engine = create_engine('sqlite:///{}'.format(copy))
+    use_compact_timesheet(engine)
+    Session = sessionmaker(bind=engine)
+
+    session = Session()
+    user_ids = [
+        user_id for (user_id, ) in
+        session.query(User.user_id)
+        .filter(User.is_student.isnot(User.is_tutor))
+    ]
+    session.close()
+
+    def sign():
+        session = Session()
+        controller.sign(rng.choice(user_ids), session=session)
+        session.close()
+
+    samples = repeat(sign, number)
+    engine.dispose()
+    return samples
+
+
+def bench_signed_in_users(Session, number):
+    def signed_in_users():
+        session = Session()
+        controller.signed_in_users(session)
+        session.close()
+
+    return repeat(signed_in_users, number)
+
+
+def bench_registry_load(Session, number):
+    def load():
+        session = Session()
+        controller.SignedInRegistry().load(session)
+        session.close()
+
+    return repeat(load, number)
+
+
+def bench_flag_forgotten_entries(database_file, work_dir, number):
+    """Flag forgotten entries in a copy of the database where none of
+    them have been flagged yet.
+    """
+    copy = work_dir.joinpath('flag.sqlite')
+    state = {}
+
+    def setup():
+        shutil.copy(str(database_file), str(copy))
+        engine = create_engine('sqlite:///{}'.format(copy))
+        use_compact_timesheet(engine)
+        engine.execute(
+            Entry.__table__.update()
+            .where(Entry.forgot_sign_out.is_(True))
+            .values(forgot_sign_out=False)
+        )
+        state['session'] = sessionmaker(bind=engine)()
+
+    def flag():
+        controller.flag_forgotten_entries(state['session'])
+        state['session'].close()
+
+    return repeat(flag, number, setup)
+
+
+def bench_startup(database_file, work_dir, number):
+    """Do the database work `chronophore.main()` does before the gui
+    appears.
+    """
+    copy = work_dir.joinpath('startup.sqlite')
+
+    def setup():
+        shutil.copy(str(database_file), str(copy))
+
+    def start():
+        engine = create_engine('sqlite:///{}'.format(copy))
+        use_compact_timesheet(engine)
+        Base.metadata.create_all(engine)
+        add_missing_indexes(engine)
+        Session = sessionmaker(bind=engine)
+        controller.flag_forgotten_entries(session=Session())
+        controller.SignedInRegistry().load(session=Session())
+        engine.dispose()
+
+    return repeat(start, number, setup)
+
+
+def bench_report(Session, number):
+    def run_report():
+        session = Session()
+        timesheet = report.load_timesheet(session, start=date(date.today().year, 1, 1))
+        report.total_hours(timesheet, group='user', period='week')
+        session.close()
+
+    return repeat(run_report, number)
+
+
+def bench_occupancy(Session, number):
+    """Minute by minute occupancy for the last year."""
+    def run_occupancy():
+        session = Session()
+        intervals = occupancy.load_intervals(
+            session, start=date.today() - timedelta(days=365)
+        )
+        occupancy.occupancy(intervals, resolution=60)
+        session.close()
+
+    return repeat(run_occupancy, number)
+
+
+def bench_import(Session, work_dir, entries, stream):
+    """Export some of the database to the old json format, then time
+    `scripts/json_to_sqlite.py` loading it into a new database.
+    """
+    session = Session()
+    users = {
+        user.user_id: {
+            'Date Joined': None,
+            'Date Left': None,
+            'Education Plan': user.education_plan,
+            'School Email': user.school_email,
+            'Personal Email': user.personal_email,
+            'First Name': user.first_name,
+            'Last Name': user.last_name,
+            'Major': user.major,
+        }
+        for user in session.query(User)
+    }
+    timesheet = {
+        entry.uuid: {
+            'date': entry.date.isoformat(),
+            'time_in': entry.time_in.isoformat(),
+            'time_out': None if entry.time_out is None else entry.time_out.isoformat(),
+            'user_id': entry.user_id,
+        }
+        for entry in session.query(Entry).limit(entries)
+    }
+    session.close()
+
+    users_file = work_dir.joinpath('users.json')
+    timesheet_file = work_dir.joinpath('timesheet.json')
+    with users_file.open('w') as f:
+        json.dump(users, f)
+    with timesheet_file.open('w') as f:
+        json.dump(timesheet, f)
+
+    output = work_dir.joinpath('import.sqlite')
+    env = dict(os.environ, PYTHONPATH=str(HERE.parent))
+    extra = ['--stream'] if stream else []
+
+    def setup():
+        if output.exists():
+            output.unlink()
+        subprocess.check_call(
+            [sys.executable, str(SCRIPTS.joinpath('json_to_sqlite.py')),
+             '-t', 'users', '-o', str(output), str(users_file)] + extra,
+            env=env, stderr=subprocess.DEVNULL,
+        )
+
+    def run_import():
+        subprocess.check_call(
+            [sys.executable, str(SCRIPTS.joinpath('json_to_sqlite.py')),
+             '-t', 'timesheet', '-o', str(output), str(timesheet_file)] + extra,
+            env=env, stderr=subprocess.DEVNULL,
+        )
+
+    return repeat(run_import, 1, setup)
+
+
+def bench_cold_start(args, number):
+    """Start a fresh interpreter and run chronophore with the given
+    arguments, to time what it imports before doing anything.
+    """
+    env = dict(os.environ, PYTHONPATH=str(HERE.parent))
+
+    def start():
+        subprocess.check_call(
+            [sys.executable] + args,
+            env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+        )
+
+    return repeat(start, number)
+
+
+def git_revision():
+    try:
+        return subprocess.check_output(
+            ['git', 'rev-parse', '--short', 'HEAD'],
+            cwd=str(HERE), stderr=subprocess.DEVNULL,
+        ).decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run_benchmarks(database_file, work_dir, number, seed):
+    """Run every benchmark and return a report as a dict."""
+    rng = random.Random(seed)
+    engine = create_engine('sqlite:///{}'.format(database_file))
+    use_compact_timesheet(engine)
+    Session = sessionmaker(bind=engine)
+
+    session = Session()
+    user_count = session.query(User).count()
+    entry_count = session.query(Entry).count()
+    session.close()
+
+    benchmarks = [
+        ('cold_start_version', lambda: bench_cold_start(
+            ['-m', 'chronophore', '--version'], 10)),
+        ('cold_start_import', lambda: bench_cold_start(
+            ['-c', 'import chronophore.chronophore'], 10)),
+        ('startup', lambda: bench_startup(database_file, work_dir, 3)),
+        ('flag_forgotten_entries', lambda: bench_flag_forgotten_entries(
+            database_file, work_dir, 3)),
+        ('registry_load', lambda: bench_registry_load(Session, number)),
+        ('signed_in_users', lambda: bench_signed_in_users(Session, number)),
+        ('sign', lambda: bench_sign(database_file, work_dir, number * 4, rng)),
+        ('report', lambda: bench_report(Session, 3)),
+        ('occupancy', lambda: bench_occupancy(Session, 3)),
+        ('import_json', lambda: bench_import(Session, work_dir, 20000, False)),
+        ('import_json_stream', lambda: bench_import(
+            Session, work_dir, 20000, True)),
+    ]
+
+    results = {}
+    for name, bench in benchmarks:
+        logging.info('Running {}...'.format(name))
+        results[name] = summarize(bench())
+        logging.info('{}: median {:.2f} ms'.format(name, results[name]['median']))
+
+    engine.dispose()
+    return dict(
+        meta=dict(
+            chronophore=__version__,
+            revision=git_revision(),
+            python=platform.python_version(),
+            sqlalchemy=sqlalchemy.__version__,
+            platform=platform.platform(),
+            time=datetime.now().isoformat(),
+            users=user_count,
+            entries=entry_count,
+        ),
+        results=results,
+    )
+
+
+def compare(old, new, threshold):
+    """Print a comparison of two reports, and return the names of the
+    benchmarks whose median got slower by more than `threshold` times.
+    """
+    regressions = []
+    print('{:<24} {:>12} {:>12} {:>8}'.format('benchmark', 'old ms', 'new ms', 'ratio'))
+    for name, result in sorted(new['results'].items()):
+        if name not in old['results']:
+            print('{:<24} {:>12} {:>12.2f}'.format(name, '-', result['median']))
+            continue
+
+        old_median = old['results'][name]['median']
+        ratio = result['median'] / old_median if old_median else float('inf')
+        flag = ''
+        if ratio > threshold:
+            flag = ' REGRESSION'
+            regressions.append(name)
+        print('{:<24} {:>12.2f} {:>12.2f} {:>8.2f}{}'.format(
+            name, old_median, result['median'], ratio, flag))
+
+    if old['meta'].get('entries') != new['meta'].get('entries'):
+        print('Note: the databases differ in size; results may not be comparable.')
+
+    return regressions
+
+
+def get_args():
+    parser = argparse.ArgumentParser(description=__description__)
+    parser.add_argument(
+        '-d', '--database',
+        help='existing database to benchmark (default: generate one)'
+    )
+    parser.add_argument(
+        '--users', type=int, default=2000,
+        help='number of users to generate (default: 2000)'
+    )
+    parser.add_argument(
+        '--years', type=int, default=3,
+        help='years of history to generate (default: 3)'
+    )
+    parser.add_argument(
+        '--visits-per-day', type=int, default=400,
+        help='average entries per weekday to generate (default: 400)'
+    )
+    parser.add_argument(
+        '-n', '--number', type=int, default=50,
+        help='base number of repetitions per benchmark (default: 50)'
+    )
+    parser.add_argument(
+        '--seed', type=int, default=0,
+        help='random seed (default: 0)'
+    )
+    parser.add_argument(
+        '--compact', action='store_true',
+        help='generate the database with the compact timesheet schema'
+    )
+    parser.add_argument(
+        '-o', '--output',
+        help='write the report as json to this file'
+    )
+    parser.add_argument(
+        '-c', '--compare',
+        help='previous json report to compare against'
+    )
+    parser.add_argument(
+        '--threshold', type=float, default=1.25,
+        help='slowdown ratio counted as a regression (default: 1.25)'
+    )
+    return parser.parse_args()
+
+
+def main():
+    args = get_args()
+    logging.basicConfig(
+        level=logging.INFO,
+        format='%(levelname)s:%(asctime)s: %(message)s'
+    )
+    # Keep chronophore's own logging out of the timings.
+    logging.getLogger('chronophore').setLevel(logging.WARNING)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        work_dir = pathlib.Path(tmp)
+
+        if args.database:
+            database_file = pathlib.Path(args.database)
+        else:
+            database_file = work_dir.joinpath('bench.sqlite')
+            logging.info('Generating database...')
+            generate_database(
+                database_file, args.users, args.years, args.visits_per_day,
+                seed=args.seed, compact=args.compact,
+            )
+
+        results = run_benchmarks(database_file, work_dir, args.number, args.seed)
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2, sort_keys=True)
+        logging.info('Report written to {}'.format(args.output))
+    else:
+        print(json.dumps(results, indent=2, sort_keys=True))
+
+    if args.compare:
+        with open(args.compare) as f:
+            old = json.load(f)
+        if compare(old, results, args.threshold):
+            raise SystemExit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,187 @@
+#!/usr/bin/python3
+
+import argparse
+import logging
+import pathlib
+import random
+import uuid
+from datetime import date, datetime, time, timedelta
+from sqlalchemy import create_engine
+
+from chronophore.models import (
+    Base, Entry, User, add_missing_indexes, use_compact_timesheet
+)
+
+__description__ = """
+Generate a Chronophore database full of made up users and timesheet
+entries, for benchmarking.
+"""
+
+FIRST_NAMES = [
+    'Aragorn', 'Arwen', 'Bilbo', 'Boromir', 'Eowyn', 'Faramir', 'Frodo',
+    'Galadriel', 'Gimli', 'Legolas', 'Merry', 'Pippin', 'Rosie', 'Sam',
+]
+
+LAST_NAMES = [
+    'Baggins', 'Brandybuck', 'Cotton', 'Gamgee', 'Greenleaf', 'Oakenshield',
+    'Took', 'Undomiel',
+]
+
+
+def make_users(count, rng):
+    """Return a list of dicts of made up users. Most are students, some
+    are tutors, and a few are both.
+    """
+    users = []
+    for i in range(count):
+        roll = rng.random()
+        users.append(dict(
+            user_id='{:09d}'.format(100000000 + i),
+            date_joined=date(2010, 1, 1) + timedelta(days=rng.randrange(2000)),
+            date_left=None,
+            education_plan=rng.random() < 0.5,
+            school_email=None,
+            personal_email=None,
+            first_name=rng.choice(FIRST_NAMES),
+            last_name=rng.choice(LAST_NAMES),
+            major=None,
+            is_student=roll < 0.95,
+            is_tutor=roll >= 0.85,
+        ))
+    return users
+
+
+def make_entries(users, start, days, visits_per_day, forgot_rate, rng):
+    """Yield dicts of made up timesheet entries, one weekday at a time.
+    Entries on the last day are left signed in.
+    """
+    for day in range(days):
+        entry_date = start + timedelta(days=day)
+        if entry_date.weekday() >= 5:
+            continue
+
+        last_day = day == days - 1
+        for _ in range(rng.randint(visits_per_day // 2, visits_per_day * 3 // 2)):
+            user = rng.choice(users)
+            if user['is_student'] and user['is_tutor']:
+                user_type = rng.choice(['student', 'tutor'])
+            elif user['is_tutor']:
+                user_type = 'tutor'
+            else:
+                user_type = 'student'
+
+            minute_in = rng.randrange(8 * 60, 18 * 60)
+            minute_out = min(minute_in + rng.randrange(20, 240), 23 * 60 + 59)
+            forgot = not last_day and rng.random() < forgot_rate
+
+            if last_day or forgot:
+                time_out = None
+            else:
+                time_out = time(minute_out // 60, minute_out % 60, rng.randrange(60))
+
+            yield dict(
+                uuid=str(uuid.UUID(int=rng.getrandbits(128), version=4)),
+                date=entry_date,
+                forgot_sign_out=forgot,
+                time_in=time(minute_in // 60, minute_in % 60, rng.randrange(60)),
+                time_out=time_out,
+                user_id=user['user_id'],
+                user_type=user_type,
+            )
+
+
+def generate_database(
+        database_file, users=2000, years=3, visits_per_day=400,
+        forgot_rate=0.02, seed=0, end=None, chunk_size=20000, compact=False):
+    """Create a database of made up users and entries, ending today.
+    With `compact`, the timesheet uses the compact integer schema.
+
+    :return: Tuple of the number of users and entries created.
+    """
+    rng = random.Random(seed)
+    end = date.today() if end is None else end
+    days = 365 * years
+    start = end - timedelta(days=days - 1)
+
+    engine = create_engine('sqlite:///{}'.format(database_file))
+    use_compact_timesheet(engine, create=compact)
+    Base.metadata.create_all(engine)
+    add_missing_indexes(engine)
+
+    user_rows = make_users(users, rng)
+    engine.execute(User.__table__.insert(), user_rows)
+
+    count = 0
+    chunk = []
+    for entry in make_entries(
+            user_rows, start, days, visits_per_day, forgot_rate, rng):
+        chunk.append(entry)
+        if len(chunk) >= chunk_size:
+            engine.execute(Entry.__table__.insert(), chunk)
+            count += len(chunk)
+            chunk = []
+            logging.info('{} entries generated'.format(count))
+    if chunk:
+        engine.execute(Entry.__table__.insert(), chunk)
+        count += len(chunk)
+
+    engine.dispose()
+    return len(user_rows), count
+
+
+def get_args():
+    parser = argparse.ArgumentParser(description=__description__)
+    parser.add_argument(
+        'database',
+        help='path of the sqlite database to create',
+    )
+    parser.add_argument(
+        '--users', type=int, default=2000,
+        help='number of users (default: 2000)'
+    )
+    parser.add_argument(
+        '--years', type=int, default=3,
+        help='years of timesheet history (default: 3)'
+    )
+    parser.add_argument(
+        '--visits-per-day', type=int, default=400,
+        help='average number of entries per weekday (default: 400)'
+    )
+    parser.add_argument(
+        '--forgot-rate', type=float, default=0.02,
+        help='fraction of entries with a forgotten sign out (default: 0.02)'
+    )
+    parser.add_argument(
+        '--seed', type=int, default=0,
+        help='random seed (default: 0)'
+    )
+    parser.add_argument(
+        '--compact', action='store_true',
+        help='use the compact integer timesheet schema'
+    )
+    return parser.parse_args()
+
+
+def main():
+    args = get_args()
+    logging.basicConfig(
+        level=logging.INFO,
+        format='%(levelname)s:%(asctime)s: %(message)s'
+    )
+
+    database_file = pathlib.Path(args.database)
+    if database_file.exists():
+        logging.error('{} already exists.'.format(database_file))
+        raise SystemExit(1)
+
+    started = datetime.now()
+    users, entries = generate_database(
+        database_file, args.users, args.years, args.visits_per_day,
+        args.forgot_rate, args.seed, compact=args.compact,
+    )
+    logging.info('Created {} users and {} entries in {}'.format(
+        users, entries, datetime.now() - started))
+
+
+if __name__ == '__main__':
+    main()
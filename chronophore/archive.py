@@ -0,0 +1,336 @@
+import collections
+import logging
+import pathlib
+import sqlite3
+from datetime import date, timedelta
+
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from chronophore import attendance
+from chronophore.models import (
+    Base, Entry, User, _is_compact, is_compact_timesheet, use_compact_timesheet
+)
+
+logger = logging.getLogger(__name__)
+
+#: The terms of a year, by name and first month. Each term lasts until
+#: the next one starts.
+TERMS = (
+    ('spring', 1),
+    ('summer', 6),
+    ('fall', 8),
+)
+
+#: The most archives SQLite can attach to one connection, by default.
+#: More than this are read a group at a time.
+MAX_ATTACHED = 10
+
+#: Timesheet columns shared by the live database and its archives.
+TIMESHEET_COLUMNS = (
+    'uuid', 'date', 'forgot_sign_out', 'time_in', 'time_out', 'user_id',
+    'user_type',
+)
+
+#: Term is a namedtuple describing one term of the year.
+#:
+#: .. attribute:: name
+#:
+#:    The year and term, like `'2016-spring'`.
+#:
+#: .. attribute:: start
+#:
+#:    The first day of the term, as a `datetime.date` object.
+#:
+#: .. attribute:: end
+#:
+#:    The last day of the term, as a `datetime.date` object.
+#:
+Term = collections.namedtuple('Term', ['name', 'start', 'end'])
+
+
+def term_of(day):
+    """Return the `Term` a date falls in.
+
+    :param day: `datetime.date` object.
+    """
+    for i, (name, month) in reversed(list(enumerate(TERMS))):
+        if day.month >= month:
+            break
+
+    start = date(day.year, month, 1)
+    if i + 1 < len(TERMS):
+        end = date(day.year, TERMS[i + 1][1], 1) - timedelta(days=1)
+    else:
+        end = date(day.year, 12, 31)
+    return Term('{}-{}'.format(day.year, name), start, end)
+
+
+def archive_path(archive_dir, term):
+    """Return the path of a term's archive database.
+
+    :param archive_dir: `pathlib.Path` object. Directory holding the archives.
+    :param term: `Term` named tuple object.
+    """ # noqa
+    return pathlib.Path(archive_dir).joinpath(
+        'chronophore-{}.sqlite'.format(term.name)
+    )
+
+
+def list_archives(archive_dir, start=None, end=None):
+    """Return the archives in a directory, oldest first, with the terms
+    they hold.
+
+    :param archive_dir: `pathlib.Path` object. Directory holding the archives.
+    :param start: (optional) `datetime.date` object. Leave out terms that end before this day.
+    :param end: (optional) `datetime.date` object. Leave out terms that start after this day.
+    :return: List of `(Term, pathlib.Path)` tuples.
+    """ # noqa
+    archives = []
+    for path in pathlib.Path(archive_dir).glob('chronophore-*-*.sqlite'):
+        year, name = path.stem.split('-')[1:3]
+        month = dict(TERMS).get(name)
+        if not year.isdigit() or month is None:
+            continue
+
+        term = term_of(date(int(year), month, 1))
+        if start is not None and term.end < start:
+            continue
+        if end is not None and term.start > end:
+            continue
+        archives.append((term, path))
+
+    return sorted(archives)
+
+
+def _closed_entries(session, before):
+    return (
+        session
+        .query(Entry)
+        .filter(Entry.date < before)
+        .filter(Entry.time_out.isnot(None) | Entry.forgot_sign_out.is_(True))
+    )
+
+
+def _row(instance, columns):
+    return {column: getattr(instance, column) for column in columns}
+
+
+def _archive_term(session, term, before, path, compact):
+    """Copy one term's closed entries, and their users, to its archive,
+    then delete them from the live database.
+    """
+    last_day = min(term.end, before - timedelta(days=1))
+    entries = (
+        _closed_entries(session, before)
+        .filter(Entry.date >= term.start)
+        .filter(Entry.date <= last_day)
+        .all()
+    )
+    if not entries:
+        return 0
+
+    engine = create_engine('sqlite:///{}'.format(path))
+    use_compact_timesheet(engine, create=compact)
+    Base.metadata.create_all(engine, tables=[User.__table__, Entry.__table__])
+    archive_session = sessionmaker(bind=engine)()
+
+    try:
+        archived_uuids = {
+            uuid for (uuid, ) in archive_session.query(Entry.uuid)
+        }
+        archived_users = {
+            user_id for (user_id, ) in archive_session.query(User.user_id)
+        }
+        user_columns = [column.key for column in User.__table__.columns]
+        users = {
+            entry.user_id: entry.user for entry in entries
+            if entry.user_id not in archived_users
+        }
+        archive_session.bulk_insert_mappings(
+            User, [_row(user, user_columns) for user in users.values()]
+        )
+        archive_session.bulk_insert_mappings(Entry, [
+            _row(entry, TIMESHEET_COLUMNS) for entry in entries
+            if entry.uuid not in archived_uuids
+        ])
+        archive_session.commit()
+    finally:
+        archive_session.close()
+        engine.dispose()
+
+    # Only delete entries from the live database once they're safely
+    # in the archive. If this is interrupted, archiving again finishes
+    # the job.
+    uuids = [entry.uuid for entry in entries]
+    for i in range(0, len(uuids), 500):
+        (
+            session
+            .query(Entry)
+            .filter(Entry.uuid.in_(uuids[i:i + 500]))
+            .delete(synchronize_session=False)
+        )
+    session.commit()
+    session.expunge_all()
+
+    logger.info('Archived {} entries to {}.'.format(len(entries), path))
+    return len(entries)
+
+
+def archive_entries(session, archive_dir, before):
+    """Move closed entries from before a date out of the live database,
+    into one archive database per term. Entries that are still signed
+    in stay where they are. Users are copied into the archives along
+    with their entries, so each archive stands on its own.
+
+    The attendance table isn't changed, so attendance totals still
+    cover the archived entries.
+
+    This function is idempotent.
+
+    :param session: SQLAlchemy session through which to access the database.
+    :param archive_dir: `pathlib.Path` object. Directory to put the archives in.
+    :param before: `datetime.date` object. Archive entries from before this day.
+    :return: Dictionary of the number of entries archived, by term name.
+    """ # noqa
+    if before > date.today():
+        raise ValueError('Can only archive entries from before today.')
+
+    archive_dir = pathlib.Path(archive_dir)
+    archive_dir.mkdir(parents=True, exist_ok=True)
+    compact = _is_compact(session.bind.dialect)
+
+    first = (
+        _closed_entries(session, before)
+        .order_by(Entry.date)
+        .with_entities(Entry.date)
+        .first()
+    )
+    if first is None:
+        return {}
+
+    counts = {}
+    term = term_of(first.date)
+    while term.start < before:
+        path = archive_path(archive_dir, term)
+        count = _archive_term(session, term, before, path, compact)
+        if count:
+            counts[term.name] = count
+        term = term_of(term.end + timedelta(days=1))
+
+    return counts
+
+
+def _attach_archives(connection, archives):
+    """Attach the archives to a connection, and return the tables to
+    read their timesheets from.
+    """
+    if len(archives) <= MAX_ATTACHED:
+        for i, path in enumerate(archives):
+            connection.execute(
+                'ATTACH DATABASE ? AS archive_{}'.format(i),
+                (path.resolve().as_uri() + '?mode=ro', ),
+            )
+        return ['archive_{}.timesheet'.format(i) for i in range(len(archives))]
+
+    # Too many to attach at once, so copy their timesheets into a
+    # temporary table a group at a time.
+    columns = ', '.join(TIMESHEET_COLUMNS)
+    connection.execute(
+        'CREATE TEMP TABLE archived_timesheet AS'
+        ' SELECT {} FROM main.timesheet WHERE 0'.format(columns)
+    )
+    for i in range(0, len(archives), MAX_ATTACHED):
+        group = archives[i:i + MAX_ATTACHED]
+        for j, path in enumerate(group):
+            connection.execute(
+                'ATTACH DATABASE ? AS archive_{}'.format(j),
+                (path.resolve().as_uri() + '?mode=ro', ),
+            )
+        for j in range(len(group)):
+            connection.execute(
+                'INSERT INTO temp.archived_timesheet'
+                ' SELECT {} FROM archive_{}.timesheet'.format(columns, j)
+            )
+        connection.commit()
+        for j in range(len(group)):
+            connection.execute('DETACH DATABASE archive_{}'.format(j))
+    return ['temp.archived_timesheet']
+
+
+def create_archive_engine(database_file, archive_dir, start=None, end=None):
+    """Create an engine that reads a live database together with its
+    archives.
+
+    Each connection attaches the archives read-only, and defines a
+    temporary `timesheet` view joining the live timesheet with theirs.
+    Unqualified queries find the view before the live table, so the
+    usual queries, like those in `report`, see every entry. Since it's
+    a view, the timesheet can't be changed through this engine. When
+    there are more than `MAX_ATTACHED` archives, they're attached a
+    group at a time and copied into a temporary table instead, which
+    makes connecting slower.
+
+    An entry that is in both the live database and an archive is only
+    counted once. That happens when reading a snapshot taken before the
+    entries were archived, or when archiving was interrupted before the
+    entries were deleted from the live database.
+
+    :param database_file: `pathlib.Path` object. The live SQLite database.
+    :param archive_dir: `pathlib.Path` object. Directory holding the archives.
+    :param start: (optional) `datetime.date` object. Only attach archives of terms that end on or after this day.
+    :param end: (optional) `datetime.date` object. Only attach archives of terms that start on or before this day.
+    :return: SQLAlchemy engine.
+    """ # noqa
+    database_file = pathlib.Path(database_file).resolve()
+    archives = [path for _, path in list_archives(archive_dir, start, end)]
+
+    engine = create_engine('sqlite:///{}'.format(database_file))
+    compact = is_compact_timesheet(engine)
+    engine.dispose()
+
+    columns = ', '.join(TIMESHEET_COLUMNS)
+
+    def connect():
+        connection = sqlite3.connect(
+            database_file.as_uri(), uri=True, check_same_thread=False
+        )
+        # Entries still in the live database are only read from there.
+        view = ' UNION ALL '.join(
+            ['SELECT {} FROM main.timesheet'.format(columns)]
+            + [
+                'SELECT {} FROM {}'
+                ' WHERE uuid NOT IN (SELECT uuid FROM main.timesheet)'.format(
+                    columns, table
+                )
+                for table in _attach_archives(connection, archives)
+            ]
+        )
+        connection.execute('CREATE TEMP VIEW timesheet AS {}'.format(view))
+        return connection
+
+    engine = create_engine(
+        'sqlite:///{}'.format(database_file), creator=connect
+    )
+    engine.dialect.compact_timesheet = compact
+    logger.debug(
+        'Reading {} with {} archives.'.format(database_file, len(archives))
+    )
+    return engine
+
+
+def rebuild_attendance(database_file, archive_dir):
+    """Recalculate a live database's attendance table from its timesheet
+    together with its archives, so the archived days aren't dropped.
+
+    :param database_file: `pathlib.Path` object. The live SQLite database.
+    :param archive_dir: `pathlib.Path` object. Directory holding the archives.
+    :return: The number of attendance rows written.
+    """ # noqa
+    engine = create_archive_engine(database_file, archive_dir)
+    session = sessionmaker(bind=engine)()
+    try:
+        return attendance.rebuild(session)
+    finally:
+        session.close()
+        engine.dispose()
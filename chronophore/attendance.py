@@ -0,0 +1,187 @@
+import collections
+import logging
+from datetime import datetime
+
+from sqlalchemy import func
+
+from chronophore.models import Attendance, Entry
+
+logger = logging.getLogger(__name__)
+
+#: DailyTotal is a namedtuple holding a day's attendance.
+#:
+#: .. attribute:: date
+#:
+#:    The day, as a `datetime.date` object.
+#:
+#: .. attribute:: users
+#:
+#:    The number of users who signed in and out that day.
+#:
+#: .. attribute:: visits
+#:
+#:    The number of signed out entries.
+#:
+#: .. attribute:: hours
+#:
+#:    The total number of hours signed in.
+#:
+DailyTotal = collections.namedtuple(
+    'DailyTotal',
+    [
+        'date',
+        'users',
+        'visits',
+        'hours',
+    ]
+)
+
+
+def entry_seconds(entry):
+    """Return how many seconds a signed out entry lasted, or `None` if
+    it hasn't been signed out.
+
+    :param entry: `models.Entry` object, or a row with the same fields.
+    """
+    if entry.time_in is None or entry.time_out is None:
+        return None
+    time_in = datetime.combine(entry.date, entry.time_in)
+    time_out = datetime.combine(entry.date, entry.time_out)
+    return max(0, int((time_out - time_in).total_seconds()))
+
+
+def _update(session, entry, sign):
+    seconds = entry_seconds(entry)
+    if seconds is None:
+        return
+
+    key = (entry.date, entry.user_id, entry.user_type)
+    day = session.query(Attendance).get(key)
+    if day is None and sign < 0:
+        logger.warning(
+            'Attendance not found for {}. Rebuild it to correct it.'.format(entry)
+        )
+        return
+    elif day is None:
+        day = Attendance(
+            date=entry.date,
+            user_id=entry.user_id,
+            user_type=entry.user_type,
+            seconds=0,
+            visits=0,
+        )
+        session.add(day)
+
+    day.seconds += sign * seconds
+    day.visits += sign
+
+    if day.visits > 0:
+        logger.debug(day)
+    elif day in session.new:
+        session.expunge(day)
+    else:
+        session.delete(day)
+
+
+def add_entry(session, entry):
+    """Count a signed out entry in the attendance table. Entries that
+    haven't been signed out are ignored. Changes are added to the
+    session, but not committed.
+
+    :param session: SQLAlchemy session through which to access the database.
+    :param entry: `models.Entry` object. The entry that was signed out.
+    """ # noqa
+    _update(session, entry, 1)
+
+
+def remove_entry(session, entry):
+    """Stop counting a signed out entry in the attendance table, before
+    it's deleted or signed back in. Changes are added to the session,
+    but not committed.
+
+    :param session: SQLAlchemy session through which to access the database.
+    :param entry: `models.Entry` object. The entry as it was counted.
+    """ # noqa
+    _update(session, entry, -1)
+
+
+def rebuild(session):
+    """Recalculate the whole attendance table from the timesheet, and
+    commit it.
+
+    :param session: SQLAlchemy session through which to access the database.
+    :return: The number of attendance rows written.
+    """ # noqa
+    query = (
+        session
+        .query(
+            Entry.date,
+            Entry.user_id,
+            Entry.user_type,
+            Entry.time_in,
+            Entry.time_out,
+        )
+        .filter(Entry.time_out.isnot(None))
+    )
+
+    seconds = collections.Counter()
+    visits = collections.Counter()
+    session.flush()
+    for row in session.execute(query.statement):
+        key = (row.date, row.user_id, row.user_type)
+        seconds[key] += entry_seconds(row)
+        visits[key] += 1
+
+    session.query(Attendance).delete(synchronize_session=False)
+    session.bulk_insert_mappings(Attendance, [
+        dict(
+            date=date,
+            user_id=user_id,
+            user_type=user_type,
+            seconds=seconds[(date, user_id, user_type)],
+            visits=count,
+        )
+        for (date, user_id, user_type), count in visits.items()
+    ])
+    session.commit()
+
+    logger.info('Rebuilt attendance: {} rows.'.format(len(visits)))
+    return len(visits)
+
+
+def daily_totals(session, start=None, end=None, user_type=None):
+    """Total up attendance per day from the attendance table.
+
+    :param session: SQLAlchemy session through which to access the database.
+    :param start: (optional) `datetime.date` object. The first day to include.
+    :param end: (optional) `datetime.date` object. The last day to include.
+    :param user_type: (optional) Only include `'student'` or `'tutor'` attendance.
+    :return: List of `DailyTotal` named tuple objects, sorted by date.
+    """ # noqa
+    query = (
+        session
+        .query(
+            Attendance.date,
+            func.count(func.distinct(Attendance.user_id)),
+            func.sum(Attendance.visits),
+            func.sum(Attendance.seconds),
+        )
+        .group_by(Attendance.date)
+        .order_by(Attendance.date)
+    )
+    if start is not None:
+        query = query.filter(Attendance.date >= start)
+    if end is not None:
+        query = query.filter(Attendance.date <= end)
+    if user_type is not None:
+        query = query.filter(Attendance.user_type == user_type)
+
+    return [
+        DailyTotal(
+            date=day,
+            users=users,
+            visits=int(visits),
+            hours=round(int(seconds) / 3600, 2),
+        )
+        for day, users, visits, seconds in query
+    ]
@@ -9,11 +9,45 @@ from chronophore import __title__
 
 logger = logging.getLogger(__name__)
 
+#: Default config options, by section. They're used for any options
+#: missing from the config file.
+DEFAULT_CONFIG = OrderedDict((
+    (
+        'gui',
+        OrderedDict(
+            (
+                ('message_duration', 5),
+                ('gui_welcome_label', 'Welcome to the STEM Learning Center!'),
+                ('full_user_names', True),
+                ('large_font_size', 30),
+                ('medium_font_size', 18),
+                ('small_font_size', 15),
+                ('tiny_font_size', 10),
+                ('max_input_length', 9),
+            )
+        ),
+    ),
+    (
+        'database',
+        OrderedDict(
+            (
+                ('url', ''),
+                ('pool_size', 5),
+                ('journal_mode', 'WAL'),
+                ('synchronous', 'NORMAL'),
+                ('cache_size', -8000),
+                ('busy_timeout', 5000),
+            )
+        ),
+    ),
+))
+
 
 def _load_config(config_file):
     """Load settings from config file and return them as a dict.  If the
     config file is not found, or if it is invalid, create and use a
-    default config file.
+    default config file. Sections and options missing from the config
+    file are filled in with their defaults.
 
     :param config_file: `pathlib.Path` object. Path to config file.
     :return: Dictionary of config options.
@@ -21,27 +55,22 @@ def _load_config(config_file):
     logger.debug('Config file: {}'.format(config_file))
 
     parser = configparser.ConfigParser()
+    parser.read_dict(DEFAULT_CONFIG)
     try:
         with config_file.open('r') as f:
             parser.read_file(f)
 
-    except FileNotFoundError as e:
+    except FileNotFoundError:
         logger.warning('Config file not found')
         parser = _use_default(config_file)
 
-    except configparser.ParsingError as e:
+    except configparser.Error as e:
         logger.warning('Error in config file: {}'.format(e))
         parser = _use_default(config_file)
 
-    finally:
-        try:
-            config = _load_options(parser)
-        except (configparser.NoOptionError):
-            parser = _use_default(config_file)
-            config = _load_options(parser)
-
-        logger.debug('Config loaded: {}'.format(config_file))
-        return config
+    config = _load_options(parser)
+    logger.debug('Config loaded: {}'.format(config_file))
+    return config
 
 
 def _load_options(parser):
@@ -59,6 +88,12 @@ def _load_options(parser):
         SMALL_FONT_SIZE=parser.getint('gui', 'small_font_size'),
         TINY_FONT_SIZE=parser.getint('gui', 'tiny_font_size'),
         MAX_INPUT_LENGTH=parser.getint('gui', 'max_input_length'),
+        DATABASE_URL=parser.get('database', 'url', raw=True),
+        POOL_SIZE=parser.getint('database', 'pool_size'),
+        JOURNAL_MODE=parser.get('database', 'journal_mode'),
+        SYNCHRONOUS=parser.get('database', 'synchronous'),
+        CACHE_SIZE=parser.getint('database', 'cache_size'),
+        BUSY_TIMEOUT=parser.getint('database', 'busy_timeout'),
     )
     return config
 
@@ -70,26 +105,8 @@ def _use_default(config_file):
     :param config_file: `pathlib.Path` object. Path to config file.
     :return: `ConfigParser` object with the values loaded.
     """
-    default_config = OrderedDict((
-        (
-            'gui',
-            OrderedDict(
-                (
-                    ('message_duration', 5),
-                    ('gui_welcome_label', 'Welcome to the STEM Learning Center!'),
-                    ('full_user_names', True),
-                    ('large_font_size', 30),
-                    ('medium_font_size', 18),
-                    ('small_font_size', 15),
-                    ('tiny_font_size', 10),
-                    ('max_input_length', 9),
-                )
-            ),
-        ),
-    ))
-
     parser = configparser.ConfigParser()
-    parser.read_dict(default_config)
+    parser.read_dict(DEFAULT_CONFIG)
 
     if config_file.exists():
         backup = config_file.with_suffix('.bak')
@@ -104,6 +121,22 @@ def _use_default(config_file):
     return parser
 
 
+def get_config():
+    """Return the config options, loading them from the config file
+    the first time they're needed. Loading creates the config file if
+    it doesn't exist yet, so it's put off until then instead of
+    happening on import.
+
+    :return: Dictionary of config options.
+    """
+    global CONFIG
+    if CONFIG is None:
+        os.makedirs(str(CONFIG_FILE.parent), exist_ok=True)
+        CONFIG = _load_config(CONFIG_FILE)
+    return CONFIG
+
+
 CONFIG_FILE = pathlib.Path(appdirs.user_config_dir(__title__), 'config.ini')
-os.makedirs(str(CONFIG_FILE.parent), exist_ok=True)
-CONFIG = _load_config(CONFIG_FILE)
+
+#: Config options, once `get_config()` has loaded them.
+CONFIG = None
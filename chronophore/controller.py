@@ -1,9 +1,16 @@
 import collections
 import logging
+import threading
+import time
 import uuid
 from datetime import date, datetime
 
-from chronophore import Session
+from sqlalchemy import event as sa_event, inspect as sa_inspect
+from sqlalchemy.orm import make_transient_to_detached
+
+from chronophore import attendance
+from chronophore.database import session_scope
+from chronophore.metrics import metrics
 from chronophore.models import Entry, User
 
 logger = logging.getLogger(__name__)
@@ -62,12 +69,396 @@ Status = collections.namedtuple(
 )
 
 
+#: FlaggedEntries is a namedtuple used by the `flag_forgotten_entries()`
+#: function to report which entries it flagged.
+#:
+#: .. attribute:: count
+#:
+#:    The number of entries flagged.
+#:
+#: .. attribute:: uuids
+#:
+#:    The uuids of the flagged entries.
+#:
+FlaggedEntries = collections.namedtuple('FlaggedEntries', ['count', 'uuids'])
+
+
+class SignedInRegistry:
+    """An in-memory record of who is currently signed in today, so
+    that checking whether a user is signed in, or listing everyone who
+    is, doesn't need a database query.
+
+    The registry is loaded from the database once with `load()`, then
+    kept up to date by `sign()`, `undo_sign_in()` and `undo_sign_out()`
+    as they commit their changes. `verify()` compares it with the
+    database, which remains the source of truth.
+    """
+
+    def __init__(self):
+        #: The date the registry is tracking.
+        self.today = None
+        # Maps entry uuid -> (user_id, first_name, last_name)
+        self._entries = {}
+        # Maps user_id -> number of open entries
+        self._user_ids = collections.Counter()
+        # The registry is updated from the gui's worker thread.
+        self._lock = threading.RLock()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def _roll_over(self, today):
+        """Forget everyone if the day has changed since the registry
+        was last used. Entries from previous days aren't signed in.
+        """
+        today = date.today() if today is None else today
+        if today != self.today:
+            if self._entries:
+                logger.debug('Clearing signed in registry for %s.', self.today)
+            self.today = today
+            self._entries.clear()
+            self._user_ids.clear()
+
+    def _add(self, uuid, user_id, first_name, last_name):
+        if uuid not in self._entries:
+            self._entries[uuid] = (user_id, first_name, last_name)
+            self._user_ids[user_id] += 1
+
+    def _remove(self, uuid):
+        if uuid in self._entries:
+            user_id = self._entries.pop(uuid)[0]
+            self._user_ids[user_id] -= 1
+            if not self._user_ids[user_id]:
+                del self._user_ids[user_id]
+
+    def _query(self, session, today):
+        return (
+            session
+            .query(Entry.uuid, User.user_id, User.first_name, User.last_name)
+            .filter(Entry.date == today)
+            .filter(Entry.time_out.is_(None))
+            .filter(User.user_id == Entry.user_id)
+            .all()
+        )
+
+    def load(self, session, today=None):
+        """Replace the contents of the registry with the entries that
+        are signed in according to the database.
+
+        :param session: SQLAlchemy session through which to access the database.
+        :param today: (optional) The current date as a `datetime.date` object. Used for testing.
+        """ # noqa
+        with self._lock:
+            self.today = None
+            self._roll_over(today)
+            for row in self._query(session, self.today):
+                self._add(*row)
+        logger.debug('Signed in registry loaded: %s entries.', len(self))
+
+    def add(self, entry, today=None):
+        """Record a signed in entry.
+
+        :param entry: `models.Entry` object. The entry that was signed into.
+        :param today: (optional) The current date as a `datetime.date` object. Used for testing.
+        """ # noqa
+        with self._lock:
+            self._roll_over(today)
+            if entry.date == self.today and entry.time_out is None:
+                self._add(
+                    entry.uuid,
+                    entry.user_id,
+                    entry.user.first_name,
+                    entry.user.last_name,
+                )
+
+    def remove(self, entry, today=None):
+        """Forget a signed out or deleted entry.
+
+        :param entry: `models.Entry` object. The entry that was signed out of.
+        :param today: (optional) The current date as a `datetime.date` object. Used for testing.
+        """ # noqa
+        with self._lock:
+            self._roll_over(today)
+            self._remove(entry.uuid)
+
+    def is_signed_in(self, user_id, today=None):
+        """Return whether a user has an open entry today.
+
+        :param user_id: The ID of the user to check.
+        :param today: (optional) The current date as a `datetime.date` object. Used for testing.
+        """ # noqa
+        with self._lock:
+            self._roll_over(today)
+            return user_id in self._user_ids
+
+    def users(self, full_name=True, today=None):
+        """Return a dictionary of the names of signed in users, by
+        user id.
+
+        :param full_name: (optional) Whether to return full user names, or just first names.
+        :param today: (optional) The current date as a `datetime.date` object. Used for testing.
+        """ # noqa
+        with self._lock:
+            self._roll_over(today)
+            users = {
+                user_id: (first_name, last_name)
+                for user_id, first_name, last_name in self._entries.values()
+            }
+
+        if full_name:
+            return {
+                user_id: ' '.join(filter(None, name))
+                for user_id, name in users.items()
+            }
+        return {
+            user_id: first_name or ''
+            for user_id, (first_name, _) in users.items()
+        }
+
+    def user_name(self, user_id, full_name=True, today=None):
+        """Return the name of a signed in user, or `None` if they
+        aren't signed in.
+
+        :param user_id: The ID of the user to look up.
+        :param full_name: (optional) Whether to return the user's full name, or just their first name.
+        :param today: (optional) The current date as a `datetime.date` object. Used for testing.
+        """ # noqa
+        with self._lock:
+            self._roll_over(today)
+            if user_id not in self._user_ids:
+                return None
+            first_name, last_name = next(
+                (first_name, last_name)
+                for entry_user_id, first_name, last_name in self._entries.values()
+                if entry_user_id == user_id
+            )
+
+        if full_name:
+            return ' '.join(filter(None, (first_name, last_name)))
+        return first_name or ''
+
+    def names(self, full_name=True, today=None):
+        """Return a sorted list of the names of signed in users.
+
+        :param full_name: (optional) Whether to return full user names, or just first names.
+        :param today: (optional) The current date as a `datetime.date` object. Used for testing.
+        """ # noqa
+        return sorted(self.users(full_name, today).values())
+
+    def verify(self, session, today=None):
+        """Compare the registry with the database. If they differ,
+        log the difference and reload the registry from the database.
+
+        :param session: SQLAlchemy session through which to access the database.
+        :param today: (optional) The current date as a `datetime.date` object. Used for testing.
+        :return: `True` if the registry matched the database, `False` otherwise.
+        """ # noqa
+        with self._lock:
+            self._roll_over(today)
+            rows = self._query(session, self.today)
+            expected = {row[0] for row in rows}
+            actual = set(self._entries)
+
+            if expected == actual:
+                return True
+
+            logger.warning(
+                'Signed in registry out of sync. Missing: %s. Unexpected: %s.',
+                sorted(expected - actual), sorted(actual - expected),
+            )
+            self._entries.clear()
+            self._user_ids.clear()
+            for row in rows:
+                self._add(*row)
+            return False
+
+
+#: The `SignedInRegistry` kept up to date by this module's functions.
+signed_in = SignedInRegistry()
+
+
+class UserCache:
+    """A bounded, in-memory cache of users by user id, so that looking
+    up the user for a scan doesn't need a database query. Unregistered
+    ids are cached too, so repeated bad scans don't reach the database.
+
+    Cached users are kept detached from any session, and merged into
+    the caller's session without loading them again. The least recently
+    used users are dropped once the cache is full.
+
+    The cache is cleared whenever the database may have been changed
+    from elsewhere. For SQLite, that's whenever another connection has
+    committed since the last lookup, according to `PRAGMA data_version`.
+    For every database, users are also reloaded once they've been cached
+    for `max_age` seconds, and whenever this process changes them.
+
+    :param maxsize: (optional) The most users to cache.
+    :param max_age: (optional) Seconds to keep a user before loading it again.
+    """ # noqa
+
+    def __init__(self, maxsize=4096, max_age=300):
+        self.maxsize = maxsize
+        self.max_age = max_age
+        #: Lookups answered from the cache.
+        self.hits = 0
+        #: Lookups that needed a database query.
+        self.misses = 0
+        # Maps user_id -> (detached User or None, time cached)
+        self._users = collections.OrderedDict()
+        self._version = None
+        self._lock = threading.RLock()
+
+    def __len__(self):
+        return len(self._users)
+
+    def clear(self):
+        """Forget every cached user."""
+        with self._lock:
+            self._users.clear()
+
+    def invalidate(self, user_id):
+        """Forget one cached user, or cached unregistered id.
+
+        :param user_id: The ID of the user to forget.
+        """
+        with self._lock:
+            self._users.pop(user_id, None)
+
+    def peek(self, user_id):
+        """Return a cached user without touching the database, or
+        `None` if they aren't cached. The user is detached from any
+        session, and may be out of date.
+
+        :param user_id: The ID of the user to look up.
+        :return: `models.User` object, or `None`.
+        """
+        with self._lock:
+            cached = self._users.get(user_id)
+        return None if cached is None else cached[0]
+
+    def _data_version(self, session):
+        """Return a value that changes whenever another connection
+        commits to the database, or `None` if that can't be told.
+        """
+        connection = session.connection()
+        if connection.dialect.name != 'sqlite':
+            return None
+        data_version = connection.execute('PRAGMA data_version').scalar()
+        # Each connection counts its own data version.
+        return (id(connection.connection.connection), data_version)
+
+    def _store(self, user_id, user):
+        if user is not None:
+            user = User(**{
+                column.key: getattr(user, column.key)
+                for column in User.__table__.columns
+            })
+            make_transient_to_detached(user)
+
+        self._users[user_id] = (user, time.monotonic())
+        self._users.move_to_end(user_id)
+        while len(self._users) > self.maxsize:
+            self._users.popitem(last=False)
+
+    def get(self, session, user_id, lock=False):
+        """Return the user with an id, in the given session, or `None`
+        if there is no such user.
+
+        :param session: SQLAlchemy session through which to access the database.
+        :param user_id: The ID of the user to look up.
+        :param lock: (optional) Lock the user's row until the session commits, on databases that support it. Unregistered ids are still checked against the database, since they can't be locked.
+        :return: `models.User` object, or `None`.
+        """ # noqa
+        # The cache's own lock is never held while waiting on the
+        # database, which may be waiting on another thread's flush.
+        version = self._data_version(session)
+        registered = True
+        checked = lock and version is None
+        if checked:
+            # Only SQLite has no row locks, and it's the only
+            # database with a data version.
+            registered = (
+                session
+                .query(User.user_id)
+                .filter(User.user_id == user_id)
+                .with_for_update()
+                .scalar()
+            ) is not None
+
+        with self._lock:
+            if version != self._version:
+                if self._users:
+                    logger.debug('Database changed; clearing user cache.')
+                self._users.clear()
+                self._version = version
+
+            if not registered:
+                self._store(user_id, None)
+                return None
+
+            cached = self._users.get(user_id)
+            if checked and cached is not None and cached[0] is None:
+                # Registered since it was cached, maybe from another
+                # kiosk.
+                cached = None
+            if cached is not None and time.monotonic() - cached[1] < self.max_age:
+                self.hits += 1
+                self._users.move_to_end(user_id)
+                user = cached[0]
+            else:
+                self.misses += 1
+                cached = None
+
+        if cached is not None:
+            return None if user is None else session.merge(user, load=False)
+
+        user = (
+            session
+            .query(User)
+            .filter(User.user_id == user_id)
+            .one_or_none()
+        )
+        with self._lock:
+            self._store(user_id, user)
+        return user
+
+
+#: The `UserCache` used by `sign()`.
+user_cache = UserCache()
+
+
+@sa_event.listens_for(User, 'after_insert')
+@sa_event.listens_for(User, 'after_delete')
+def _invalidate_cached_user(mapper, connection, target):
+    """Forget a user in `user_cache` when this process adds or deletes
+    them.
+    """
+    user_cache.invalidate(target.user_id)
+
+
+@sa_event.listens_for(User, 'after_update')
+def _invalidate_updated_user(mapper, connection, target):
+    """Forget a user in `user_cache` when this process changes their
+    columns. Signing in only adds to their entries, which isn't cached.
+    """
+    state = sa_inspect(target)
+    if any(
+        state.attrs[attr.key].history.has_changes()
+        for attr in mapper.column_attrs
+    ):
+        user_cache.invalidate(target.user_id)
+        # The user id itself may have changed.
+        for user_id in state.attrs['user_id'].history.deleted:
+            user_cache.invalidate(user_id)
+
+
 def flag_forgotten_entries(session, today=None):
     """Flag any entries from previous days where users forgot to sign
-    out.
+    out. All of the entries are flagged with a single UPDATE.
 
     :param session: SQLAlchemy session through which to access the database.
     :param today: (optional) The current date as a `datetime.date` object. Used for testing.
+    :return: `FlaggedEntries` named tuple object. The entries that were flagged.
     """ # noqa
     today = date.today() if today is None else today
 
@@ -79,13 +470,28 @@ def flag_forgotten_entries(session, today=None):
         .filter(Entry.date < today)
     )
 
-    for entry in forgotten:
-        e = sign_out(entry, forgot=True)
-        logger.debug('Signing out forgotten entry: {}'.format(e))
-        session.add(e)
+    rows = forgotten.with_entities(Entry.uuid, Entry.user_id, Entry.date).all()
 
+    if rows:
+        count = forgotten.update(
+            {Entry.forgot_sign_out: True}, synchronize_session=False
+        )
+    else:
+        count = 0
     session.commit()
 
+    for entry_uuid, user_id, entry_date in rows:
+        logger.info('%s forgot to sign out on %s.', user_id, entry_date)
+        logger.debug('Flagged forgotten entry: %s', entry_uuid)
+
+    if count != len(rows):
+        logger.warning(
+            'Expected to flag %s forgotten entries, flagged %s.',
+            len(rows), count,
+        )
+
+    return FlaggedEntries(count=count, uuids=[row[0] for row in rows])
+
 
 def signed_in_users(session=None, today=None, full_name=True):
     """Return list of names of currently signed in users.
@@ -95,27 +501,22 @@ def signed_in_users(session=None, today=None, full_name=True):
     :param full_name: (optional) Whether to display full user names, or just first names.
     :return: List of currently signed in users.
     """ # noqa
-    if session is None:
-        session = Session()
-    else:
-        session = session
-
     if today is None:
         today = date.today()
     else:
         today = today
 
-    signed_in_users = (
-        session
-        .query(User)
-        .filter(Entry.date == today)
-        .filter(Entry.time_out.is_(None))
-        .filter(User.user_id == Entry.user_id)
-        .all()
-    )
+    with session_scope(session) as session:
+        signed_in_users = (
+            session
+            .query(User)
+            .filter(Entry.date == today)
+            .filter(Entry.time_out.is_(None))
+            .filter(User.user_id == Entry.user_id)
+            .all()
+        )
 
-    session.close()
-    return signed_in_users
+        return signed_in_users
 
 
 def get_user_name(user, full_name=True):
@@ -170,7 +571,7 @@ def sign_in(user, user_type=None, date=None, time_in=None):
         user=user,
     )
 
-    logger.info('{} ({}) signed in.'.format(new_entry.user_id, new_entry.user_type))
+    logger.info('%s (%s) signed in.', new_entry.user_id, new_entry.user_type)
     return new_entry
 
 
@@ -189,76 +590,131 @@ def sign_out(entry, time_out=None, forgot=False):
     if forgot:
         entry.forgot_sign_out = True
         logger.info(
-            '{} forgot to sign out on {}.'.format(entry.user_id, entry.date)
+            '%s forgot to sign out on %s.', entry.user_id, entry.date
         )
 
     else:
         entry.time_out = time_out
 
-    logger.info('{} ({}) signed out.'.format(entry.user_id, entry.user_type))
+    logger.info('%s (%s) signed out.', entry.user_id, entry.user_type)
     return entry
 
 
-def undo_sign_in(entry, session=None):
+@metrics.timed('undo_sign_in')
+def undo_sign_in(entry, session=None, registry=None):
     """Delete a signed in entry.
 
     :param entry: `models.Entry` object. The entry to delete.
     :param session: (optional) SQLAlchemy session through which to access the database.
+    :param registry: (optional) `SignedInRegistry` to update. Defaults to `signed_in`.
     """ # noqa
-    if session is None:
-        session = Session()
-    else:
-        session = session
-
-    entry_to_delete = (
-        session
-        .query(Entry)
-        .filter(Entry.uuid == entry.uuid)
-        .one_or_none()
-    )
+    if registry is None:
+        registry = signed_in
+
+    with session_scope(session) as session:
+        entry_to_delete = (
+            session
+            .query(Entry)
+            .filter(Entry.uuid == entry.uuid)
+            .one_or_none()
+        )
 
-    if entry_to_delete:
-        logger.info('Undo sign in: {}'.format(entry_to_delete.user_id))
-        logger.debug('Undo sign in: {}'.format(entry_to_delete))
-        session.delete(entry_to_delete)
-        session.commit()
-    else:
-        error_message = 'Entry not found: {}'.format(entry)
-        logger.error(error_message)
-        raise ValueError(error_message)
+        if entry_to_delete:
+            logger.info('Undo sign in: %s', entry_to_delete.user_id)
+            logger.debug('Undo sign in: %s', entry_to_delete)
+            attendance.remove_entry(session, entry_to_delete)
+            session.delete(entry_to_delete)
+            session.commit()
+            registry.remove(entry)
+        else:
+            error_message = 'Entry not found: {}'.format(entry)
+            logger.error(error_message)
+            raise ValueError(error_message)
 
 
-def undo_sign_out(entry, session=None):
+@metrics.timed('undo_sign_out')
+def undo_sign_out(entry, session=None, registry=None):
     """Sign in a signed out entry.
 
     :param entry: `models.Entry` object. The entry to sign back in.
     :param session: (optional) SQLAlchemy session through which to access the database.
+    :param registry: (optional) `SignedInRegistry` to update. Defaults to `signed_in`.
     """ # noqa
-    if session is None:
-        session = Session()
+    if registry is None:
+        registry = signed_in
+
+    with session_scope(session) as session:
+        entry_to_sign_in = (
+            session
+            .query(Entry)
+            .filter(Entry.uuid == entry.uuid)
+            .one_or_none()
+        )
+
+        if entry_to_sign_in:
+            logger.info('Undo sign out: %s', entry_to_sign_in.user_id)
+            logger.debug('Undo sign out: %s', entry_to_sign_in)
+            attendance.remove_entry(session, entry_to_sign_in)
+            entry_to_sign_in.time_out = None
+            session.add(entry_to_sign_in)
+            session.commit()
+            registry.add(entry_to_sign_in)
+        else:
+            error_message = 'Entry not found: {}'.format(entry)
+            logger.error(error_message)
+            raise ValueError(error_message)
+
+
+def _toggle(session, user, signed_in_entries, user_type=None, when=None):
+    """Sign a user in if they have no signed in entries, or out of all
+    of them if they do. Changes are added to the session, but not
+    committed.
+
+    :param session: SQLAlchemy session through which to access the database.
+    :param user: `models.User` object. The user to sign in or out.
+    :param signed_in_entries: List of the user's signed in `models.Entry` objects for the day.
+    :param user_type: (optional) Specify whether user is signing in as a `'student'` or `'tutor'`.
+    :param when: (optional) `datetime.datetime` object. When the user signed in or out. Defaults to now.
+    :return: `Status` named tuple object. Information about the sign attempt.
+    """ # noqa
+    if when is None:
+        entry_date, entry_time = None, None
     else:
-        session = session
+        entry_date, entry_time = when.date(), when.time()
 
-    entry_to_sign_in = (
-        session
-        .query(Entry)
-        .filter(Entry.uuid == entry.uuid)
-        .one_or_none()
-    )
+    if not signed_in_entries:
+        new_entry = sign_in(
+            user, user_type=user_type, date=entry_date, time_in=entry_time
+        )
+        session.add(new_entry)
+        status = Status(
+            valid=True,
+            in_or_out='in',
+            user_name=get_user_name(user),
+            user_type=new_entry.user_type,
+            entry=new_entry
+        )
 
-    if entry_to_sign_in:
-        logger.info('Undo sign out: {}'.format(entry_to_sign_in.user_id))
-        logger.debug('Undo sign out: {}'.format(entry_to_sign_in))
-        entry_to_sign_in.time_out = None
-        session.add(entry_to_sign_in)
-        session.commit()
     else:
-        error_message = 'Entry not found: {}'.format(entry)
-        logger.error(error_message)
-        raise ValueError(error_message)
+        for entry in signed_in_entries:
+            signed_out_entry = sign_out(entry, time_out=entry_time)
+            session.add(signed_out_entry)
+            attendance.add_entry(session, signed_out_entry)
+            status = Status(
+                valid=True,
+                in_or_out='out',
+                user_name=get_user_name(user),
+                user_type=signed_out_entry.user_type,
+                entry=signed_out_entry
+            )
 
+    return status
 
-def sign(user_id, user_type=None, today=None, session=None):
+
+@metrics.timed('sign')
+def sign(
+        user_id, user_type=None, today=None, session=None, registry=None,
+        cache=None):
     """Check user id for validity, then sign user in if they are signed
     out, or out if they are signed in.
 
@@ -266,65 +722,190 @@ def sign(user_id, user_type=None, today=None, session=None):
     :param user_type: (optional) Specify whether user is signing in as a `'student'` or `'tutor'`.
     :param today: (optional) The current date as a `datetime.date` object. Used for testing.
     :param session: (optional) SQLAlchemy session through which to access the database.
+    :param registry: (optional) `SignedInRegistry` to update. Defaults to `signed_in`.
+    :param cache: (optional) `UserCache` to look the user up in. Defaults to `user_cache`.
     :return: `Status` named tuple object. Information about the sign attempt.
     """ # noqa
-    if session is None:
-        session = Session()
-    else:
-        session = session
+    if registry is None:
+        registry = signed_in
+    if cache is None:
+        cache = user_cache
 
     if today is None:
         today = date.today()
     else:
         today = today
 
-    user = (
-        session
-        .query(User)
-        .filter(User.user_id == user_id)
-        .one_or_none()
-    )
+    with session_scope(session) as session:
+        # Lock the user's row until the commit, so that if two kiosks
+        # sharing a database server scan the same user at once, the
+        # second one waits and sees the first one's sign in or out.
+        # SQLite has no row locks; it only allows one writer anyway.
+        with metrics.timer('sign.lookup'):
+            user = cache.get(session, user_id, lock=True)
+
+        if user:
+            with metrics.timer('sign.entries'):
+                signed_in_entries = (
+                    user
+                    .entries
+                    .filter(Entry.date == today)
+                    .filter(Entry.time_out.is_(None))
+                    .all()
+                )
 
-    if user:
-        signed_in_entries = (
-            user
-            .entries
-            .filter(Entry.date == today)
-            .filter(Entry.time_out.is_(None))
-            .all()
-        )
+            status = _toggle(session, user, signed_in_entries, user_type=user_type)
+            with metrics.timer('sign.commit'):
+                session.commit()
 
-        if not signed_in_entries:
-            new_entry = sign_in(user, user_type=user_type)
-            session.add(new_entry)
-            status = Status(
-                valid=True,
-                in_or_out='in',
+            if status.in_or_out == 'in':
+                registry.add(status.entry, today=today)
+            else:
+                for entry in signed_in_entries:
+                    registry.remove(entry, today=today)
+
+        else:
+            raise UnregisteredUser(
+                '{} not registered. Please register at the front desk.'.format(
+                    user_id
+                )
+            )
+
+        logger.debug(status)
+        return status
+
+
+#: SignEvent is a namedtuple describing one scan for `sign_many()`.
+#:
+#: .. attribute:: user_id
+#:
+#:    The ID of the user to sign in or out.
+#:
+#: .. attribute:: timestamp
+#:
+#:    When the scan happened, as a `datetime.datetime` object.
+#:
+#: .. attribute:: user_type
+#:
+#:    `'student'`, `'tutor'`, or `None` to work it out from the user.
+#:
+SignEvent = collections.namedtuple(
+    'SignEvent',
+    [
+        'user_id',
+        'timestamp',
+        'user_type',
+    ]
+)
+
+
+def _chunks(items, size=500):
+    """Split a collection into lists small enough to use in an SQL IN
+    clause.
+    """
+    items = list(items)
+    for i in range(0, len(items), size):
+        yield items[i:i + size]
+
+
+@metrics.timed('sign_many')
+def sign_many(events, session=None, registry=None):
+    """Sign a batch of users in or out, in order, with the same rules as
+    `sign()`. Users and their signed in entries are looked up all at
+    once, and every change is committed in one transaction.
+
+    Instead of raising exceptions, events from unregistered users or
+    users whose type is ambiguous get a `Status` with `valid` set to
+    `False`, and are otherwise ignored.
+
+    :param events: Sequence of `SignEvent` named tuples, or `(user_id, timestamp, user_type)` tuples.
+    :param session: (optional) SQLAlchemy session through which to access the database.
+    :param registry: (optional) `SignedInRegistry` to update. Defaults to `signed_in`.
+    :return: List of `Status` named tuple objects, one per event.
+    """ # noqa
+    if registry is None:
+        registry = signed_in
+
+    with session_scope(session) as session:
+        events = [SignEvent(*event) for event in events]
+        if not events:
+            return []
+
+        user_ids = {event.user_id for event in events}
+        dates = {event.timestamp.date() for event in events}
+
+        users = {}
+        signed_in_entries = collections.defaultdict(list)
+        # Lock users in a consistent order, as in `sign()`, so batches
+        # from different kiosks can't deadlock.
+        for chunk in _chunks(sorted(user_ids)):
+            locked_users = (
+                session
+                .query(User)
+                .filter(User.user_id.in_(chunk))
+                .order_by(User.user_id)
+                .with_for_update()
+            )
+            for user in locked_users:
+                users[user.user_id] = user
+
+            open_entries = (
+                session
+                .query(Entry)
+                .filter(Entry.user_id.in_(chunk))
+                .filter(Entry.date.in_(dates))
+                .filter(Entry.time_out.is_(None))
+            )
+            for entry in open_entries:
+                signed_in_entries[(entry.user_id, entry.date)].append(entry)
+
+        statuses = []
+        # Registry changes to make once the batch is committed.
+        signed_in_changes = []
+
+        for event in events:
+            user = users.get(event.user_id)
+            invalid = Status(
+                valid=False,
+                in_or_out=None,
                 user_name=get_user_name(user),
-                user_type=new_entry.user_type,
-                entry=new_entry
+                user_type=event.user_type,
+                entry=None,
             )
 
-        else:
-            for entry in signed_in_entries:
-                signed_out_entry = sign_out(entry)
-                session.add(signed_out_entry)
-                status = Status(
-                    valid=True,
-                    in_or_out='out',
-                    user_name=get_user_name(user),
-                    user_type=signed_out_entry.user_type,
-                    entry=signed_out_entry
+            if user is None:
+                logger.warning('%s not registered.', event.user_id)
+                statuses.append(invalid)
+                continue
+
+            key = (event.user_id, event.timestamp.date())
+            try:
+                status = _toggle(
+                    session,
+                    user,
+                    signed_in_entries[key],
+                    user_type=event.user_type,
+                    when=event.timestamp,
                 )
+            except (AmbiguousUserType, ValueError) as e:
+                logger.warning('%s: %s', event.user_id, e)
+                statuses.append(invalid)
+                continue
+
+            if status.in_or_out == 'in':
+                signed_in_entries[key].append(status.entry)
+                signed_in_changes.append((registry.add, [status.entry]))
+            else:
+                signed_in_changes.append((registry.remove, signed_in_entries[key]))
+                signed_in_entries[key] = []
+
+            statuses.append(status)
 
         session.commit()
+        logger.debug('Signed %s events in one batch.', len(events))
 
-    else:
-        raise UnregisteredUser(
-            '{} not registered. Please register at the front desk.'.format(
-                user_id
-            )
-        )
+        for change, entries in signed_in_changes:
+            for entry in entries:
+                change(entry)
 
-    logger.debug(status)
-    return status
+        return statuses
@@ -0,0 +1,383 @@
+import collections
+import csv
+import json
+import logging
+import uuid
+from datetime import datetime
+
+from chronophore import attendance, controller
+from chronophore.database import session_scope
+from chronophore.models import Correction, Entry, User
+
+logger = logging.getLogger(__name__)
+
+#: Edits that can be made to an entry:
+#:
+#: - `'time_out'` sets its sign out time to `value`, a `datetime.time`
+#:   object, or `None` to sign it back in.
+#: - `'delete'` deletes it.
+#: - `'user_type'` sets its user type to `value`, `'student'` or
+#:   `'tutor'`.
+#: - `'clear_forgot'` clears its `forgot_sign_out` flag.
+ACTIONS = ('time_out', 'delete', 'user_type', 'clear_forgot')
+
+USER_TYPES = ('student', 'tutor')
+TIME_FORMATS = ('%H:%M:%S', '%H:%M')
+
+#: How many entries are looked up at a time.
+BATCH_SIZE = 500
+
+#: Edit is a namedtuple describing one change to a timesheet entry.
+#:
+#: .. attribute:: uuid
+#:
+#:    The uuid of the entry to change.
+#:
+#: .. attribute:: action
+#:
+#:    One of `ACTIONS`.
+#:
+#: .. attribute:: value
+#:
+#:    The new time out or user type, or `None` for actions that don't
+#:    need one.
+#:
+Edit = collections.namedtuple('Edit', ['uuid', 'action', 'value'])
+Edit.__new__.__defaults__ = (None, )
+
+# An entry's fields, as they were before or will be after the edits.
+_EntryState = collections.namedtuple(
+    '_EntryState',
+    [
+        'uuid', 'date', 'forgot_sign_out', 'time_in', 'time_out', 'user_id',
+        'user_type',
+    ]
+)
+
+
+class InvalidCorrections(Exception):
+    """This exception is raised when a batch of edits would break the
+    timesheet's rules. None of the edits are made.
+    """
+    def __init__(self, message, problems):
+        super().__init__(message)
+        self.message = message
+        #: A list of messages, one per problem found.
+        self.problems = problems
+
+
+def _state(entry):
+    return _EntryState(*[getattr(entry, field) for field in _EntryState._fields])
+
+
+def _to_json(state):
+    if state is None:
+        return None
+    return json.dumps({
+        'date': state.date.isoformat(),
+        'forgot_sign_out': bool(state.forgot_sign_out),
+        'time_in': None if state.time_in is None else state.time_in.isoformat(),
+        'time_out': None if state.time_out is None else state.time_out.isoformat(),
+        'user_id': state.user_id,
+        'user_type': state.user_type,
+    }, sort_keys=True)
+
+
+def _batches(items, size=BATCH_SIZE):
+    items = list(items)
+    for i in range(0, len(items), size):
+        yield items[i:i + size]
+
+
+def _parse_value(action, value):
+    value = (value or '').strip()
+    if action == 'time_out':
+        if not value:
+            return None
+        for time_format in TIME_FORMATS:
+            try:
+                return datetime.strptime(value, time_format).time()
+            except ValueError:
+                pass
+        raise ValueError('Invalid time_out: {!r}.'.format(value))
+    elif action == 'user_type':
+        return value.lower()
+    return None
+
+
+def read_edits(f):
+    """Read edits from a csv with `uuid`, `action` and `value` columns.
+    Times are written as `HH:MM` or `HH:MM:SS`, and an empty `value`
+    for `time_out` signs the entry back in.
+
+    :param f: File object open for reading text.
+    :return: List of `Edit` named tuple objects.
+    :raises InvalidCorrections: If any row can't be read.
+    """
+    reader = csv.DictReader(f)
+    if reader.fieldnames is None or not {'uuid', 'action'} <= set(reader.fieldnames):
+        raise InvalidCorrections('Edits need uuid and action columns.', [])
+
+    edits = []
+    problems = []
+    for row in reader:
+        line = reader.line_num
+        entry_uuid = (row['uuid'] or '').strip()
+        action = (row['action'] or '').strip().lower()
+        if not entry_uuid:
+            problems.append('Line {}: Missing uuid.'.format(line))
+            continue
+        if action not in ACTIONS:
+            problems.append('Line {}: Unknown action: {!r}.'.format(line, action))
+            continue
+        try:
+            value = _parse_value(action, row.get('value'))
+        except ValueError as e:
+            problems.append('Line {}: {}'.format(line, e))
+            continue
+        edits.append(Edit(entry_uuid, action, value))
+
+    if problems:
+        raise InvalidCorrections(
+            '{} rows could not be read.'.format(len(problems)), problems
+        )
+    return edits
+
+
+def _validate(session, edits, today):
+    """Work out what each edited entry will look like once every edit
+    is made, and check the results against the timesheet's rules.
+
+    :return: The loaded `models.Entry` objects by uuid, their states after the edits by uuid (`None` if deleted), and a list of problems.
+    """ # noqa
+    problems = []
+    entries = {}
+    for batch in _batches({edit.uuid for edit in edits}):
+        query = (
+            session
+            .query(Entry)
+            .filter(Entry.uuid.in_(batch))
+            .order_by(Entry.uuid)
+            .with_for_update()
+        )
+        for entry in query:
+            entries[entry.uuid] = entry
+
+    users = {}
+    for batch in _batches({entry.user_id for entry in entries.values()}):
+        for user in session.query(User).filter(User.user_id.in_(batch)):
+            users[user.user_id] = user
+
+    states = {}
+    for number, edit in enumerate(edits, 1):
+        def problem(message):
+            problems.append('Edit {} ({}): {}'.format(number, edit.uuid, message))
+
+        if edit.action not in ACTIONS:
+            problem('Unknown action: {!r}.'.format(edit.action))
+            continue
+        if edit.uuid not in entries:
+            problem('Entry not found.')
+            continue
+
+        state = states.get(edit.uuid, _state(entries[edit.uuid]))
+        if state is None:
+            problem('Entry is deleted by an earlier edit.')
+            continue
+
+        if edit.action == 'delete':
+            state = None
+        elif edit.action == 'time_out':
+            if edit.value is not None and edit.value < state.time_in:
+                problem('time_out {} is before time_in {}.'.format(
+                    edit.value, state.time_in
+                ))
+                continue
+            state = state._replace(time_out=edit.value)
+        elif edit.action == 'user_type':
+            user = users.get(state.user_id)
+            if edit.value not in USER_TYPES:
+                problem('Invalid user_type: {!r}.'.format(edit.value))
+                continue
+            elif not getattr(user, 'is_' + edit.value, False):
+                problem('{} is not a {}.'.format(state.user_id, edit.value))
+                continue
+            state = state._replace(user_type=edit.value)
+        elif edit.action == 'clear_forgot':
+            state = state._replace(forgot_sign_out=False)
+
+        states[edit.uuid] = state
+
+    for state in states.values():
+        if (
+                state is not None
+                and state.time_out is None
+                and state.date < today
+                and not state.forgot_sign_out):
+            problems.append(
+                'Entry {} would be signed in on {} without being flagged as'
+                ' forgotten.'.format(state.uuid, state.date)
+            )
+
+    problems.extend(_overlaps(session, entries, states))
+    return entries, states, problems
+
+
+def _overlaps(session, entries, states):
+    """Find edited entries that would overlap another of the user's
+    entries on the same day. A signed in entry has to be the user's
+    last entry of the day.
+    """
+    days = {
+        (entry.user_id, entry.date)
+        for entry_uuid, entry in entries.items()
+        if states.get(entry_uuid) is not None
+    }
+    if not days:
+        return []
+
+    by_day = collections.defaultdict(list)
+    dates = {day for _, day in days}
+    for batch in _batches({user_id for user_id, _ in days}):
+        query = (
+            session
+            .query(Entry)
+            .filter(Entry.user_id.in_(batch))
+            .filter(Entry.date.in_(dates))
+        )
+        for entry in query:
+            if (entry.user_id, entry.date) not in days:
+                continue
+            state = states.get(entry.uuid, _state(entry))
+            if state is not None:
+                by_day[(entry.user_id, entry.date)].append(state)
+
+    problems = []
+    for (user_id, day), day_states in sorted(by_day.items()):
+        day_states.sort(key=lambda s: s.time_in)
+        for first, second in zip(day_states, day_states[1:]):
+            if first.uuid not in states and second.uuid not in states:
+                continue
+            if first.time_out is None or first.time_out > second.time_in:
+                problems.append(
+                    'Entries {} and {} of {} would overlap on {}.'.format(
+                        first.uuid, second.uuid, user_id, day
+                    )
+                )
+    return problems
+
+
+def apply_corrections(
+        session, edits, reason=None, dry_run=False, registry=None, now=None):
+    """Validate a batch of edits to timesheet entries, then make them
+    all in one transaction, with a row in the corrections table for each
+    one as an audit trail. Edits to the same entry are made in order.
+
+    The batch is rejected as a whole if any edit refers to a missing or
+    already deleted entry, sets a time out before the time in, gives an
+    entry a user type its user doesn't have, would leave an entry from a
+    previous day signed in without being flagged as forgotten, or would
+    make an entry overlap another of the user's entries that day.
+
+    The attendance table and the signed in registry are kept up to date.
+
+    :param session: SQLAlchemy session through which to access the database.
+    :param edits: Sequence of `Edit` named tuples, or `(uuid, action, value)` tuples.
+    :param reason: (optional) Why the edits were made, for the audit trail.
+    :param dry_run: (optional) Validate the edits without making them.
+    :param registry: (optional) `controller.SignedInRegistry` to update. Defaults to `controller.signed_in`.
+    :param now: (optional) The current time as a `datetime.datetime` object. Used for testing.
+    :return: List of `models.Correction` objects, one per edit.
+    :raises InvalidCorrections: If any edit breaks the rules. Nothing is changed.
+    """ # noqa
+    if registry is None:
+        registry = controller.signed_in
+    now = datetime.now() if now is None else now
+    edits = [Edit(*edit) for edit in edits]
+
+    entries, states, problems = _validate(session, edits, now.date())
+    if problems:
+        raise InvalidCorrections(
+            '{} problems found; no edits were made.'.format(len(problems)),
+            problems,
+        )
+
+    batch_id = str(uuid.uuid4())
+    corrections = []
+    current = {}
+    for edit in edits:
+        before = current.get(edit.uuid, _state(entries[edit.uuid]))
+        if edit.action == 'delete':
+            after = None
+        elif edit.action == 'time_out':
+            after = before._replace(time_out=edit.value)
+        elif edit.action == 'user_type':
+            after = before._replace(user_type=edit.value)
+        else:
+            after = before._replace(forgot_sign_out=False)
+        current[edit.uuid] = after
+        corrections.append(Correction(
+            batch_id=batch_id,
+            corrected_at=now,
+            entry_uuid=edit.uuid,
+            action=edit.action,
+            before=_to_json(before),
+            after=_to_json(after),
+            reason=reason,
+        ))
+
+    if dry_run:
+        return corrections
+
+    originals = {entry_uuid: _state(entries[entry_uuid]) for entry_uuid in states}
+    for entry_uuid, state in states.items():
+        entry = entries[entry_uuid]
+        attendance.remove_entry(session, originals[entry_uuid])
+        if state is None:
+            session.delete(entry)
+            continue
+        entry.time_out = state.time_out
+        entry.user_type = state.user_type
+        entry.forgot_sign_out = state.forgot_sign_out
+        attendance.add_entry(session, entry)
+
+    session.add_all(corrections)
+    session.commit()
+    logger.info(
+        'Applied %s corrections to %s entries (batch %s).',
+        len(edits), len(states), batch_id,
+    )
+
+    for entry_uuid, state in states.items():
+        registry.remove(originals[entry_uuid], today=now.date())
+        if state is not None:
+            registry.add(entries[entry_uuid], today=now.date())
+
+    return corrections
+
+
+def undo_many(statuses, session=None, registry=None, reason=None):
+    """Undo a batch of sign ins and sign outs in one transaction, with
+    `apply_corrections()`. Sign ins are deleted, and sign outs are
+    signed back in.
+
+    :param statuses: Sequence of `controller.Status` named tuples, as returned by `controller.sign()` or `controller.sign_many()`. Invalid and journaled scans are ignored.
+    :param session: (optional) SQLAlchemy session through which to access the database.
+    :param registry: (optional) `controller.SignedInRegistry` to update. Defaults to `controller.signed_in`.
+    :param reason: (optional) Why the scans were undone, for the audit trail.
+    :return: List of `models.Correction` objects, one per undone scan.
+    :raises InvalidCorrections: If any scan can't be undone. Nothing is changed.
+    """ # noqa
+    edits = []
+    for status in statuses:
+        if not status.valid or status.entry is None:
+            continue
+        if status.in_or_out == 'in':
+            edits.append(Edit(status.entry.uuid, 'delete'))
+        elif status.in_or_out == 'out':
+            edits.append(Edit(status.entry.uuid, 'time_out', None))
+
+    with session_scope(session) as session:
+        return apply_corrections(
+            session, edits, reason=reason, registry=registry
+        )
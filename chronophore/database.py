@@ -0,0 +1,32 @@
+import contextlib
+from sqlalchemy.orm import scoped_session, sessionmaker
+
+#: Thread-local session factory. Objects stay loaded after a commit, so
+#: results like `controller.Status.entry` remain usable once their
+#: session has been closed.
+Session = scoped_session(sessionmaker(expire_on_commit=False))
+
+
+@contextlib.contextmanager
+def session_scope(session=None):
+    """Provide a session for one unit of work.
+
+    If a session is passed in, it's used as is, and closing it is left
+    to the caller. Otherwise the current thread's `Session` is used. It
+    is rolled back if an exception is raised, and removed when the work
+    is done, which returns its connection to the pool.
+
+    :param session: (optional) SQLAlchemy session to use instead.
+    """
+    if session is not None:
+        yield session
+        return
+
+    session = Session()
+    try:
+        yield session
+    except Exception:
+        session.rollback()
+        raise
+    finally:
+        Session.remove()
@@ -0,0 +1,196 @@
+import csv
+import logging
+import pathlib
+from datetime import date, time
+
+logger = logging.getLogger(__name__)
+
+#: File formats tables can be exported to.
+FORMATS = ('csv', 'parquet')
+
+#: Tables that are exported, in order.
+TABLES = ('users', 'timesheet')
+
+#: How many rows are read from the database, and written out, at a time.
+CHUNK_SIZE = 10000
+
+
+def _model(table):
+    # Imported here, so the command line can use this module's
+    # constants without loading SQLAlchemy.
+    from chronophore.models import Entry, User
+    return {'users': User, 'timesheet': Entry}[table]
+
+
+def _python_type(column):
+    column_type = getattr(column.type, 'impl', column.type)
+    return column_type.python_type
+
+
+def table_query(session, table, start=None, end=None, user_type=None):
+    """Build a query for every column of a table. The filters only
+    apply to the timesheet; all users are exported.
+
+    :param session: SQLAlchemy session through which to access the database.
+    :param table: `'users'` or `'timesheet'`.
+    :param start: (optional) `datetime.date` object. The first day of entries to export.
+    :param end: (optional) `datetime.date` object. The last day of entries to export.
+    :param user_type: (optional) Only export `'student'` or `'tutor'` entries.
+    :return: SQLAlchemy query object.
+    """ # noqa
+    model = _model(table)
+    query = session.query(*[
+        getattr(model, column.key) for column in model.__table__.columns
+    ])
+    if table != 'timesheet':
+        return query.order_by(model.user_id)
+
+    if start is not None:
+        query = query.filter(model.date >= start)
+    if end is not None:
+        query = query.filter(model.date <= end)
+    if user_type is not None:
+        query = query.filter(model.user_type == user_type)
+    return query.order_by(model.date, model.time_in)
+
+
+def iter_chunks(session, query, chunk_size=CHUNK_SIZE):
+    """Run a query, yielding its rows a chunk at a time. Databases that
+    support it, like PostgreSQL, use a server-side cursor, so only one
+    chunk is held in memory at once.
+
+    :param session: SQLAlchemy session through which to access the database.
+    :param query: SQLAlchemy query object.
+    :param chunk_size: (optional) The most rows in each chunk.
+    :return: Generator of lists of rows.
+    """ # noqa
+    session.flush()
+    statement = query.statement.execution_options(stream_results=True)
+    result = session.execute(statement)
+    try:
+        while True:
+            rows = result.fetchmany(chunk_size)
+            if not rows:
+                break
+            yield rows
+    finally:
+        result.close()
+
+
+def _csv_value(value):
+    if isinstance(value, bool):
+        return int(value)
+    return value
+
+
+def write_csv(chunks, columns, path):
+    """Write chunks of rows to a csv file, one chunk at a time. Booleans
+    are written as `1` or `0`, and dates and times in ISO format.
+
+    :param chunks: Iterable of lists of rows.
+    :param columns: List of column names, for the header.
+    :param path: `pathlib.Path` object. The file to write.
+    :return: The number of rows written.
+    """ # noqa
+    count = 0
+    with path.open('w', newline='') as f:
+        writer = csv.writer(f, lineterminator='\n')
+        writer.writerow(columns)
+        for rows in chunks:
+            writer.writerows(
+                [_csv_value(value) for value in row] for row in rows
+            )
+            count += len(rows)
+    return count
+
+
+def arrow_schema(table):
+    """Return the Arrow schema of a table's columns.
+
+    :param table: `'users'` or `'timesheet'`.
+    :return: `pyarrow.Schema` object.
+    """
+    import pyarrow as pa
+
+    arrow_types = {
+        bool: pa.bool_(),
+        date: pa.date32(),
+        int: pa.int64(),
+        str: pa.string(),
+        time: pa.time64('us'),
+    }
+    return pa.schema([
+        pa.field(
+            column.key,
+            arrow_types[_python_type(column)],
+            nullable=column.nullable,
+        )
+        for column in _model(table).__table__.columns
+    ])
+
+
+def write_parquet(chunks, schema, path):
+    """Write chunks of rows to a Parquet file, one row group per chunk.
+
+    :param chunks: Iterable of lists of rows.
+    :param schema: `pyarrow.Schema` object describing the rows.
+    :param path: `pathlib.Path` object. The file to write.
+    :return: The number of rows written.
+    """ # noqa
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    count = 0
+    with pq.ParquetWriter(str(path), schema) as writer:
+        for rows in chunks:
+            columns = list(zip(*rows))
+            writer.write_table(pa.Table.from_arrays(
+                [
+                    pa.array(values, type=field.type)
+                    for values, field in zip(columns, schema)
+                ],
+                schema=schema,
+            ))
+            count += len(rows)
+    return count
+
+
+def export(
+        session, directory, format='csv', start=None, end=None,
+        user_type=None, chunk_size=CHUNK_SIZE):
+    """Export the users and timesheet tables to `users.<format>` and
+    `timesheet.<format>` in a directory. Rows are streamed from the
+    database in chunks, so exports of any size use a bounded amount of
+    memory.
+
+    Exporting to Parquet needs pyarrow. It keeps the column types, and
+    compresses the data.
+
+    :param session: SQLAlchemy session through which to access the database.
+    :param directory: `pathlib.Path` object. The directory to write the files to.
+    :param format: (optional) `'csv'` or `'parquet'`. Defaults to `'csv'`.
+    :param start: (optional) `datetime.date` object. The first day of entries to export.
+    :param end: (optional) `datetime.date` object. The last day of entries to export.
+    :param user_type: (optional) Only export `'student'` or `'tutor'` entries.
+    :param chunk_size: (optional) How many rows to read and write at a time.
+    :return: Dictionary of the number of rows exported, by table.
+    """ # noqa
+    if format not in FORMATS:
+        raise ValueError('Unknown format: {}'.format(format))
+
+    directory = pathlib.Path(directory)
+    directory.mkdir(parents=True, exist_ok=True)
+
+    counts = {}
+    for table in TABLES:
+        query = table_query(session, table, start, end, user_type)
+        chunks = iter_chunks(session, query, chunk_size)
+        path = directory.joinpath('{}.{}'.format(table, format))
+        if format == 'parquet':
+            counts[table] = write_parquet(chunks, arrow_schema(table), path)
+        else:
+            columns = [c['name'] for c in query.column_descriptions]
+            counts[table] = write_csv(chunks, columns, path)
+        logger.info('Exported {} rows to {}.'.format(counts[table], path))
+
+    return counts
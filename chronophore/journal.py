@@ -0,0 +1,266 @@
+import json
+import logging
+import os
+import pathlib
+import threading
+import uuid
+from datetime import datetime
+
+from sqlalchemy.exc import InterfaceError, OperationalError
+
+from chronophore import controller
+from chronophore.database import session_scope
+from chronophore.models import JournalPosition
+
+logger = logging.getLogger(__name__)
+
+#: Errors that mean the database can't be reached right now, so scans
+#: should be journaled and applied later.
+UNAVAILABLE_ERRORS = (InterfaceError, OperationalError)
+
+TIMESTAMP_FORMAT = '%Y-%m-%dT%H:%M:%S.%f'
+
+
+class Journal:
+    """An append-only file of scans that couldn't be written to the
+    database yet. Each scan is one line of json, flushed to disk before
+    `append()` returns, so it survives a crash or power cut.
+
+    The first line holds the journal's id. `replay()` records how far
+    it has applied the journal under that id, in the database itself.
+    Once every scan has been applied, the file is replaced by an empty
+    journal with a new id.
+
+    :param path: `pathlib.Path` object. The journal file.
+    """
+
+    def __init__(self, path):
+        self.path = pathlib.Path(path)
+        self._lock = threading.Lock()
+        self._file = None
+        #: The journal's unique ID.
+        self.journal_id = None
+        #: Where the first scan starts, in bytes.
+        self.start = 0
+        # How far the journal is known to have been applied.
+        self._replayed = 0
+
+        with self._lock:
+            try:
+                with self.path.open('rb') as f:
+                    header = f.readline()
+                self.journal_id = json.loads(header.decode('utf-8'))['journal']
+                self.start = len(header)
+            except (OSError, ValueError, KeyError, TypeError):
+                self._create()
+            self._file = self.path.open('ab')
+
+    def _create(self):
+        """Replace the journal file with an empty one with a new id."""
+        journal_id = str(uuid.uuid4())
+        header = (json.dumps({'journal': journal_id}) + '\n').encode('utf-8')
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        temporary = self.path.with_name(self.path.name + '.tmp')
+        with temporary.open('wb') as f:
+            f.write(header)
+            f.flush()
+            os.fsync(f.fileno())
+        temporary.replace(self.path)
+
+        if self._file is not None:
+            self._file.close()
+            self._file = self.path.open('ab')
+        self.journal_id = journal_id
+        self.start = len(header)
+        self._replayed = 0
+        logger.debug('Started journal %s.', journal_id)
+
+    def _size(self):
+        return os.fstat(self._file.fileno()).st_size
+
+    def close(self):
+        with self._lock:
+            self._file.close()
+
+    def append(self, user_id, timestamp, user_type=None):
+        """Add a scan to the journal, and wait until it's on disk.
+
+        :param user_id: The ID of the user who scanned.
+        :param timestamp: `datetime.datetime` object. When they scanned.
+        :param user_type: (optional) `'student'`, `'tutor'`, or `None` to work it out from the user.
+        """ # noqa
+        line = json.dumps({
+            'user_id': user_id,
+            'timestamp': timestamp.strftime(TIMESTAMP_FORMAT),
+            'user_type': user_type,
+        }) + '\n'
+        with self._lock:
+            self._file.write(line.encode('utf-8'))
+            self._file.flush()
+            os.fsync(self._file.fileno())
+        logger.info('Journaled scan: %s', user_id)
+
+    def pending(self):
+        """Return whether the journal may have scans that haven't been
+        applied to the database yet.
+        """
+        with self._lock:
+            return self._size() > max(self.start, self._replayed)
+
+    def read(self, position, limit):
+        """Read scans from a position in the journal. A line that's
+        still being written is left for next time.
+
+        :param position: Where to start reading, in bytes.
+        :param limit: The most scans to read.
+        :return: A list of `controller.SignEvent` named tuples, and the position after the last one.
+        """ # noqa
+        events = []
+        with self._lock, self.path.open('rb') as f:
+            f.seek(max(position, self.start))
+            position = f.tell()
+            while len(events) < limit:
+                line = f.readline()
+                if not line.endswith(b'\n'):
+                    break
+                position += len(line)
+                try:
+                    scan = json.loads(line.decode('utf-8'))
+                    events.append(controller.SignEvent(
+                        scan['user_id'],
+                        datetime.strptime(scan['timestamp'], TIMESTAMP_FORMAT),
+                        scan['user_type'],
+                    ))
+                except (ValueError, KeyError):
+                    logger.error('Skipping unreadable journal line: %r', line)
+        return events, position
+
+    def replayed(self, position):
+        """Note that the journal has been applied up to a position, and
+        start a new journal if that's all of it.
+
+        :param position: How far the journal has been applied, in bytes.
+        :return: `True` if a new journal was started.
+        """
+        with self._lock:
+            self._replayed = position
+            if self._size() > position:
+                return False
+            self._create()
+            return True
+
+
+def replay(session, journal, batch_size=500, registry=None):
+    """Apply a journal's scans to the database, in order, in batches.
+    Each batch goes through `controller.sign_many()`, and is committed
+    along with the journal's new position, so a batch is never applied
+    twice, even if this is interrupted.
+
+    Scans from unregistered users, or users whose type is ambiguous,
+    are logged and skipped, as in `controller.sign_many()`.
+
+    :param session: SQLAlchemy session through which to access the database.
+    :param journal: `Journal` object.
+    :param batch_size: (optional) The most scans to apply at once.
+    :param registry: (optional) `controller.SignedInRegistry` to update. Defaults to `controller.signed_in`.
+    :return: The number of scans applied.
+    """ # noqa
+    count = 0
+    while True:
+        journal_id = journal.journal_id
+        row = session.query(JournalPosition).get(journal_id)
+        position = journal.start if row is None else row.position
+        events, end = journal.read(position, batch_size)
+
+        if events:
+            session.merge(JournalPosition(journal_id=journal_id, position=end))
+            controller.sign_many(events, session=session, registry=registry)
+            count += len(events)
+        elif end != position:
+            # Only unreadable lines.
+            session.merge(JournalPosition(journal_id=journal_id, position=end))
+            session.commit()
+
+        if journal.replayed(end):
+            session.query(JournalPosition).filter(
+                JournalPosition.journal_id == journal_id
+            ).delete()
+            session.commit()
+        if not events:
+            break
+
+    if count:
+        logger.info('Replayed %s journaled scans.', count)
+    return count
+
+
+def sign_or_journal(journal, user_id, user_type=None, now=None):
+    """Sign a user in or out with `controller.sign()`, or journal the
+    scan if the database can't be reached, or earlier scans are still
+    waiting to be replayed.
+
+    Journaled scans get a `controller.Status` with `in_or_out` and
+    `entry` set to `None`, since whether they sign the user in or out is
+    only known once they're applied. If the user is cached, and is both
+    a student and a tutor, `controller.AmbiguousUserType` is raised as
+    usual so they can choose before the scan is journaled.
+
+    :param journal: `Journal` object.
+    :param user_id: The ID of the user to sign in or out.
+    :param user_type: (optional) Specify whether user is signing in as a `'student'` or `'tutor'`.
+    :param now: (optional) The current time as a `datetime.datetime` object. Used for testing.
+    :return: `controller.Status` named tuple object.
+    """ # noqa
+    now = datetime.now() if now is None else now
+
+    if not journal.pending():
+        try:
+            return controller.sign(user_id, user_type=user_type)
+        except UNAVAILABLE_ERRORS as e:
+            logger.warning('Database unavailable, journaling scans: %s', e)
+
+    user = controller.user_cache.peek(user_id)
+    if user is not None and user_type is None and user.is_student and user.is_tutor:
+        raise controller.AmbiguousUserType('User is both a student and a tutor.')
+
+    journal.append(user_id, now, user_type)
+    return controller.Status(
+        valid=True,
+        in_or_out=None,
+        user_name=controller.get_user_name(user),
+        user_type=user_type,
+        entry=None,
+    )
+
+
+class Replayer(threading.Thread):
+    """A daemon thread that replays a journal whenever it has scans
+    waiting, retrying until the database can be reached.
+
+    :param journal: `Journal` object.
+    :param interval: (optional) Seconds between checks.
+    """
+
+    def __init__(self, journal, interval=5):
+        super().__init__(name='journal-replayer', daemon=True)
+        self.journal = journal
+        self.interval = interval
+        self._stopped = threading.Event()
+
+    def stop(self):
+        self._stopped.set()
+
+    def run(self):
+        while not self._stopped.wait(self.interval):
+            if not self.journal.pending():
+                continue
+            try:
+                with session_scope() as session:
+                    replay(session, self.journal)
+            except UNAVAILABLE_ERRORS as e:
+                logger.warning('Could not replay journal yet: %s', e)
+            except Exception as e:
+                logger.error(
+                    'Could not replay journal: %s', e,
+                    exc_info=(type(e), e, e.__traceback__),
+                )
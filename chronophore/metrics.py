@@ -0,0 +1,258 @@
+import bisect
+import collections
+import contextlib
+import csv
+import functools
+import json
+import logging
+import sys
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+#: Upper bounds of the histogram buckets, in seconds. Each bucket is a
+#: quarter larger than the one before, from 10 microseconds up to about
+#: two minutes, so percentiles are accurate to within 25%.
+BUCKETS = tuple(1e-5 * 1.25 ** i for i in range(74))
+
+#: Percentiles reported by `Histogram.summary()`.
+PERCENTILES = (50, 95, 99)
+
+#: Summary is a namedtuple of statistics about one timed operation.
+#: Times are in milliseconds.
+#:
+#: .. attribute:: name
+#:
+#:    The name of the operation.
+#:
+#: .. attribute:: count
+#:
+#:    How many times it was timed.
+#:
+#: .. attribute:: p50
+#:
+#:    The median time.
+#:
+#: .. attribute:: p95
+#:
+#:    The 95th percentile time.
+#:
+#: .. attribute:: p99
+#:
+#:    The 99th percentile time.
+#:
+#: .. attribute:: max
+#:
+#:    The longest time.
+#:
+Summary = collections.namedtuple(
+    'Summary', ['name', 'count', 'p50', 'p95', 'p99', 'max']
+)
+
+
+class Histogram:
+    """Counts of durations in fixed, exponentially sized buckets. Its
+    size doesn't grow with the number of durations recorded.
+    """
+
+    def __init__(self):
+        self.counts = [0] * (len(BUCKETS) + 1)
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def record(self, seconds):
+        """Add a duration.
+
+        :param seconds: The duration, in seconds.
+        """
+        self.counts[bisect.bisect_left(BUCKETS, seconds)] += 1
+        self.count += 1
+        self.total += seconds
+        self.max = max(self.max, seconds)
+
+    def percentile(self, percent):
+        """Return the upper bound of the bucket holding a percentile,
+        in seconds, or `None` if nothing has been recorded. Durations
+        past the last bucket are reported as the longest duration.
+
+        :param percent: The percentile, from 0 to 100.
+        """
+        if not self.count:
+            return None
+        rank = max(1, percent / 100 * self.count)
+        seen = 0
+        for i, count in enumerate(self.counts):
+            seen += count
+            if seen >= rank:
+                if i < len(BUCKETS):
+                    return min(BUCKETS[i], self.max)
+                return self.max
+
+    def summary(self, name):
+        """Return a `Summary` named tuple object of this histogram.
+
+        :param name: The name of the timed operation.
+        """
+        def ms(seconds):
+            return None if seconds is None else round(seconds * 1000, 3)
+
+        return Summary(
+            name,
+            self.count,
+            *[ms(self.percentile(p)) for p in PERCENTILES],
+            max=ms(self.max if self.count else None)
+        )
+
+    def to_dict(self):
+        return {
+            'counts': self.counts,
+            'count': self.count,
+            'total': self.total,
+            'max': self.max,
+        }
+
+    @classmethod
+    def from_dict(cls, data):
+        histogram = cls()
+        if len(data['counts']) == len(histogram.counts):
+            histogram.counts = list(data['counts'])
+            histogram.count = data['count']
+            histogram.total = data['total']
+            histogram.max = data['max']
+        return histogram
+
+
+class Metrics:
+    """A set of named histograms of how long operations take. It's safe
+    to time operations from several threads at once.
+    """
+
+    def __init__(self):
+        self._histograms = collections.defaultdict(Histogram)
+        self._lock = threading.Lock()
+
+    def record(self, name, seconds):
+        """Add a duration to a histogram.
+
+        :param name: The name of the timed operation.
+        :param seconds: The duration, in seconds.
+        """
+        with self._lock:
+            self._histograms[name].record(seconds)
+
+    @contextlib.contextmanager
+    def timer(self, name):
+        """Time the body of a `with` block, even if it raises.
+
+        :param name: The name of the timed operation.
+        """
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(name, time.perf_counter() - start)
+
+    def timed(self, name):
+        """Decorate a function to time each call.
+
+        :param name: The name of the timed operation.
+        """
+        def decorator(function):
+            @functools.wraps(function)
+            def wrapper(*args, **kwargs):
+                with self.timer(name):
+                    return function(*args, **kwargs)
+            return wrapper
+        return decorator
+
+    def clear(self):
+        """Forget every recorded duration."""
+        with self._lock:
+            self._histograms.clear()
+
+    def summaries(self):
+        """Return a list of `Summary` named tuple objects, sorted by
+        name.
+        """
+        with self._lock:
+            return [
+                histogram.summary(name)
+                for name, histogram in sorted(self._histograms.items())
+            ]
+
+    def to_dict(self):
+        with self._lock:
+            return {
+                'buckets': len(BUCKETS),
+                'histograms': {
+                    name: histogram.to_dict()
+                    for name, histogram in self._histograms.items()
+                },
+            }
+
+    def write(self, path):
+        """Save the histograms to a json file. The file is replaced all
+        at once, so it can be read while the kiosk is running.
+
+        :param path: `pathlib.Path` object. The file to write.
+        """
+        temporary = path.with_name(path.name + '.tmp')
+        with temporary.open('w') as f:
+            json.dump(self.to_dict(), f)
+        temporary.replace(path)
+
+    @classmethod
+    def read(cls, path):
+        """Load histograms saved with `write()`.
+
+        :param path: `pathlib.Path` object. The file to read.
+        :return: `Metrics` object.
+        """
+        metrics = cls()
+        with path.open() as f:
+            data = json.load(f)
+        for name, histogram in data['histograms'].items():
+            metrics._histograms[name] = Histogram.from_dict(histogram)
+        return metrics
+
+
+#: The `Metrics` that chronophore's hot paths are timed in.
+metrics = Metrics()
+
+
+def save_periodically(path, interval=60):
+    """Write `metrics` to a file every `interval` seconds from a daemon
+    thread, so the latest timings can be read while the kiosk runs.
+
+    :param path: `pathlib.Path` object. The file to write.
+    :param interval: (optional) Seconds between writes.
+    :return: `threading.Event` object. Set it to stop saving.
+    """ # noqa
+    stopped = threading.Event()
+
+    def save():
+        while not stopped.wait(interval):
+            try:
+                metrics.write(path)
+            except OSError as e:
+                logger.warning('Could not save metrics: {}'.format(e))
+
+    threading.Thread(target=save, name='metrics', daemon=True).start()
+    return stopped
+
+
+def write_summaries(summaries, output=None):
+    """Write summaries as csv.
+
+    :param summaries: List of `Summary` named tuple objects.
+    :param output: (optional) File object to write to. Defaults to stdout.
+    """ # noqa
+    output = sys.stdout if output is None else output
+    writer = csv.writer(output, lineterminator='\n')
+    writer.writerow(
+        ['name', 'count', 'p50_ms', 'p95_ms', 'p99_ms', 'max_ms']
+    )
+    for summary in summaries:
+        writer.writerow(summary)
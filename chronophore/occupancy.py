@@ -0,0 +1,256 @@
+import collections
+import csv
+import itertools
+import logging
+import sys
+from datetime import datetime, timedelta
+
+logger = logging.getLogger(__name__)
+
+#: Kinds of user occupancy is counted for, besides everyone together.
+USER_TYPES = ('student', 'tutor')
+
+#: Interval is a namedtuple holding the time one entry was signed in.
+#:
+#: .. attribute:: date
+#:
+#:    The date of the entry.
+#:
+#: .. attribute:: start
+#:
+#:    Sign in time, in seconds since midnight.
+#:
+#: .. attribute:: end
+#:
+#:    Sign out time, in seconds since midnight.
+#:
+#: .. attribute:: user_type
+#:
+#:    Whether the entry was signed into as a `student` or a `tutor`.
+#:
+Interval = collections.namedtuple(
+    'Interval',
+    [
+        'date',
+        'start',
+        'end',
+        'user_type',
+    ]
+)
+
+#: OccupancyRow is a namedtuple holding the most people signed in at
+#: once during one interval of time.
+#:
+#: .. attribute:: start
+#:
+#:    The start of the interval, as a `datetime.datetime` object.
+#:
+#: .. attribute:: students
+#:
+#:    The most students signed in at once.
+#:
+#: .. attribute:: tutors
+#:
+#:    The most tutors signed in at once.
+#:
+#: .. attribute:: total
+#:
+#:    The most users of any type signed in at once.
+#:
+OccupancyRow = collections.namedtuple(
+    'OccupancyRow',
+    [
+        'start',
+        'students',
+        'tutors',
+        'total',
+    ]
+)
+
+#: Peak is a namedtuple holding the highest occupancy over a date range.
+#:
+#: .. attribute:: count
+#:
+#:    The most users signed in at once.
+#:
+#: .. attribute:: at
+#:
+#:    When that many users were first signed in, as a
+#:    `datetime.datetime` object, or `None` if nobody was.
+#:
+Peak = collections.namedtuple('Peak', ['count', 'at'])
+
+
+def _seconds(t):
+    return t.hour * 3600 + t.minute * 60 + t.second
+
+
+def load_intervals(session, start=None, end=None, user_type=None):
+    """Load the signed in intervals of timesheet entries. Entries that
+    were never signed out are left out.
+
+    :param session: SQLAlchemy session through which to access the database.
+    :param start: (optional) `datetime.date` object. The first day to load.
+    :param end: (optional) `datetime.date` object. The last day to load.
+    :param user_type: (optional) Only load `'student'` or `'tutor'` entries.
+    :return: List of `Interval` named tuple objects.
+    """ # noqa
+    from chronophore.models import Entry
+
+    query = (
+        session
+        .query(Entry.date, Entry.time_in, Entry.time_out, Entry.user_type)
+        .filter(Entry.time_in.isnot(None))
+        .filter(Entry.time_out.isnot(None))
+    )
+    if start is not None:
+        query = query.filter(Entry.date >= start)
+    if end is not None:
+        query = query.filter(Entry.date <= end)
+    if user_type is not None:
+        query = query.filter(Entry.user_type == user_type)
+
+    session.flush()
+    intervals = [
+        Interval(date, _seconds(time_in), _seconds(time_out), entry_user_type)
+        for date, time_in, time_out, entry_user_type
+        in session.execute(query.statement)
+    ]
+    logger.debug('Loaded {} intervals.'.format(len(intervals)))
+    return intervals
+
+
+def _events(intervals):
+    """Turn intervals into sign in and sign out events, sorted by time.
+    At the same moment, sign outs come before sign ins, so back to back
+    entries don't overlap. Empty intervals are skipped.
+    """
+    events = []
+    for interval in intervals:
+        if interval.end <= interval.start:
+            continue
+        events.append((interval.date, interval.start, 1, interval.user_type))
+        events.append((interval.date, interval.end, -1, interval.user_type))
+    events.sort(key=lambda event: event[:3])
+    return events
+
+
+def sweep(intervals):
+    """Sweep over the intervals in time order, yielding each moment
+    that the number of users signed in changes.
+
+    Runs in O(n log n) time for n intervals.
+
+    :param intervals: Iterable of `Interval` named tuple objects.
+    :return: Generator of `(datetime.date, seconds since midnight, counts)` tuples, where `counts` is a dictionary of the number of users signed in from then on, by user type. Each day starts with no one signed in.
+    """ # noqa
+    events = _events(intervals)
+    for day, day_events in itertools.groupby(events, key=lambda e: e[0]):
+        counts = collections.Counter()
+        for seconds, moment in itertools.groupby(day_events, key=lambda e: e[1]):
+            for _, _, delta, user_type in moment:
+                counts[user_type] += delta
+            yield day, seconds, dict(counts)
+
+
+def occupancy(intervals, resolution=60):
+    """Count how many users were signed in during each interval of
+    `resolution` seconds. Each day's rows run from the first sign in to
+    the last sign out, and days with no one signed in are left out.
+
+    :param intervals: Iterable of `Interval` named tuple objects.
+    :param resolution: (optional) Seconds per row. Defaults to one minute.
+    :return: List of `OccupancyRow` named tuple objects, sorted by time.
+    """ # noqa
+    if resolution <= 0:
+        raise ValueError('Resolution must be positive: {}'.format(resolution))
+
+    rows = []
+    changes = itertools.groupby(sweep(intervals), key=lambda change: change[0])
+    for day, day_changes in changes:
+        midnight = datetime.combine(day, datetime.min.time())
+        day_changes = list(day_changes)
+        first = day_changes[0][1] // resolution
+        last = (day_changes[-1][1] - 1) // resolution
+        maximums = [[0, 0, 0] for _ in range(last - first + 1)]
+
+        # Each change holds until the next one.
+        for (_, start, counts), (_, end, _) in zip(day_changes, day_changes[1:]):
+            current = [
+                counts.get('student', 0),
+                counts.get('tutor', 0),
+                sum(counts.values()),
+            ]
+            for bucket in range(start // resolution, (end - 1) // resolution + 1):
+                maximum = maximums[bucket - first]
+                for i, count in enumerate(current):
+                    if count > maximum[i]:
+                        maximum[i] = count
+
+        for i, (students, tutors, total) in enumerate(maximums):
+            rows.append(OccupancyRow(
+                start=midnight + timedelta(seconds=(first + i) * resolution),
+                students=students,
+                tutors=tutors,
+                total=total,
+            ))
+
+    return rows
+
+
+def peak_occupancy(intervals):
+    """Find the most users signed in at once.
+
+    :param intervals: Iterable of `Interval` named tuple objects.
+    :return: Dictionary of `Peak` named tuple objects, by user type, and for everyone under `'total'`.
+    """ # noqa
+    peaks = {key: Peak(0, None) for key in USER_TYPES + ('total',)}
+    for day, seconds, counts in sweep(intervals):
+        counts = dict(counts, total=sum(counts.values()))
+        for key, count in counts.items():
+            if count > peaks.get(key, Peak(0, None)).count:
+                at = datetime.combine(day, datetime.min.time())
+                peaks[key] = Peak(count, at + timedelta(seconds=seconds))
+    return peaks
+
+
+def write_occupancy(rows, output=None):
+    """Write occupancy rows as csv.
+
+    :param rows: List of `OccupancyRow` named tuple objects.
+    :param output: (optional) File object to write to. Defaults to stdout.
+    """ # noqa
+    output = sys.stdout if output is None else output
+    writer = csv.writer(output, lineterminator='\n')
+    writer.writerow(OccupancyRow._fields)
+    for row in rows:
+        writer.writerow(
+            [row.start.isoformat(sep=' ')] + list(row[1:])
+        )
+
+
+def print_occupancy(
+        session, start=None, end=None, user_type=None, resolution=60,
+        output=None):
+    """Load the timesheet, count occupancy, and write it as csv. Takes
+    the same parameters as `load_intervals()`, `occupancy()` and
+    `write_occupancy()`.
+    """
+    intervals = load_intervals(session, start, end, user_type)
+    write_occupancy(occupancy(intervals, resolution), output)
+
+
+def print_peak_occupancy(session, start=None, end=None, output=None):
+    """Load the timesheet, find the peak occupancy, and write it as csv.
+    Takes the same parameters as `load_intervals()` and
+    `write_occupancy()`.
+    """
+    intervals = load_intervals(session, start, end)
+    peaks = peak_occupancy(intervals)
+
+    output = sys.stdout if output is None else output
+    writer = csv.writer(output, lineterminator='\n')
+    writer.writerow(['user_type', 'count', 'at'])
+    for key, peak in sorted(peaks.items()):
+        at = '' if peak.at is None else peak.at.isoformat(sep=' ')
+        writer.writerow([key, peak.count, at])
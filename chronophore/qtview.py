@@ -1,7 +1,13 @@
+import bisect
+import collections
 import logging
-from PyQt5.QtCore import Qt, QTimer
+from PyQt5.QtCore import (
+    pyqtSignal, pyqtSlot, Qt, QAbstractListModel, QModelIndex, QObject,
+    QThread, QTimer
+)
 from PyQt5.QtGui import QFont
 from PyQt5.QtWidgets import (
+    QAbstractItemView,
     QDesktopWidget,
     QDialog,
     QFrame,
@@ -10,6 +16,7 @@ from PyQt5.QtWidgets import (
     QGroupBox,
     QLabel,
     QLineEdit,
+    QListView,
     QMessageBox,
     QPushButton,
     QRadioButton,
@@ -18,9 +25,17 @@ from PyQt5.QtWidgets import (
 )
 
 from chronophore import __title__, __version__, controller
-from chronophore.config import CONFIG
+from chronophore.config import get_config
+from chronophore.database import session_scope
+from chronophore.journal import sign_or_journal
+from chronophore.metrics import metrics
 
 logger = logging.getLogger(__name__)
+CONFIG = get_config()
+
+#: How often to check the signed in list against the database, in case
+#: it was changed by something other than this kiosk.
+RECONCILE_SECONDS = 60
 
 
 class QtChronophoreUI(QWidget):
@@ -30,14 +45,51 @@ class QtChronophoreUI(QWidget):
         - Entry for user id input
         - Feedback label that temporarily appears
         - Sign in/out button
+
+    Sign in attempts are handled one at a time by a `QtSignWorker` on
+    another thread. Ids entered while one is in progress are queued.
+
+    The signed in list only changes the row of the user each sign in
+    attempt was for. Every `RECONCILE_SECONDS`, the worker checks the
+    signed in registry against the database, and the list is brought
+    in line with it.
+
+    If a `journal.Journal` is given, scans are journaled whenever the
+    database can't be reached, instead of failing.
+
+    :param journal: (optional) `journal.Journal` object.
     """
 
-    def __init__(self):
+    sign_requested = pyqtSignal(object, object)
+    undo_requested = pyqtSignal(object)
+    reconcile_requested = pyqtSignal()
+
+    def __init__(self, journal=None):
         super().__init__()
 
         # Variables
-        self.signed_in = ''
+        self.signed_in = QtSignedInModel(self)
         self.feedback_label_timer = QTimer()
+        self.reconcile_timer = QTimer(self)
+        self.pending = collections.deque()
+        self.busy = False
+
+        # Worker thread
+        self.worker_thread = QThread(self)
+        self.worker = QtSignWorker(journal)
+        self.worker.moveToThread(self.worker_thread)
+        self.sign_requested.connect(self.worker.sign)
+        self.undo_requested.connect(self.worker.undo)
+        self.reconcile_requested.connect(self.worker.reconcile)
+        self.worker.signed.connect(self._on_signed)
+        self.worker.sign_failed.connect(self._on_sign_failed)
+        self.worker.undone.connect(self._on_undone)
+        self.worker.undo_failed.connect(self._on_undo_failed)
+        self.worker.reconciled.connect(self._set_signed_in)
+        self.worker_thread.start()
+
+        self.reconcile_timer.timeout.connect(self.reconcile_requested)
+        self.reconcile_timer.start(1000 * RECONCILE_SECONDS)
 
         # Fonts
         medium_font = QFont('SansSerif', CONFIG['MEDIUM_FONT_SIZE'])
@@ -53,9 +105,14 @@ class QtChronophoreUI(QWidget):
         frm_signed_in = QFrame(self)
         frm_signed_in.setFrameShape(QFrame.StyledPanel)
 
-        self.lbl_signedin_list = QLabel(self.signed_in, frm_signed_in)
-        self.lbl_signedin_list.setFont(tiny_font)
-        self.lbl_signedin_list.setContentsMargins(10, 10, 10, 10)
+        self.lst_signed_in = QListView(frm_signed_in)
+        self.lst_signed_in.setModel(self.signed_in)
+        self.lst_signed_in.setFont(tiny_font)
+        self.lst_signed_in.setContentsMargins(10, 10, 10, 10)
+        self.lst_signed_in.setFrameShape(QFrame.NoFrame)
+        self.lst_signed_in.setSelectionMode(QAbstractItemView.NoSelection)
+        self.lst_signed_in.setFocusPolicy(Qt.NoFocus)
+        self.lst_signed_in.setUniformItemSizes(True)
 
         lbl_welcome = QLabel(CONFIG['GUI_WELCOME_LABLE'], self)
         lbl_welcome.setFont(large_header)
@@ -83,7 +140,7 @@ class QtChronophoreUI(QWidget):
         # Grid
         grid.addWidget(lbl_signedin, 0, 0, Qt.AlignTop)
         grid.addWidget(frm_signed_in, 1, 0, 6, 1)
-        grid.addWidget(self.lbl_signedin_list, 1, 0, 6, 1, Qt.AlignTop)
+        grid.addWidget(self.lst_signed_in, 1, 0, 6, 1)
 
         grid.addWidget(lbl_welcome, 1, 1, 1, -1, Qt.AlignTop | Qt.AlignCenter)
         grid.addWidget(lbl_id, 2, 3, Qt.AlignBottom | Qt.AlignCenter)
@@ -125,14 +182,33 @@ class QtChronophoreUI(QWidget):
         self.move(qr.topLeft())
 
     def _set_signed_in(self):
-        """Populate the signed_in list with the names of currently
-        signed in users.
+        """Bring the signed_in list in line with everyone in the
+        signed in registry.
+        """
+        with metrics.timer('gui.set_signed_in'):
+            changed = self.signed_in.sync(
+                controller.signed_in.users(full_name=CONFIG['FULL_USER_NAMES'])
+            )
+        if changed:
+            logger.debug('Signed in list reconciled: {} rows changed.'.format(
+                changed
+            ))
+
+    def _update_signed_in(self, status):
+        """Update the signed_in list's row for the user whose sign in
+        attempt is described by `status`.
         """
-        names = [
-            controller.get_user_name(user, full_name=CONFIG['FULL_USER_NAMES'])
-            for user in controller.signed_in_users()
-        ]
-        self.lbl_signedin_list.setText('\n'.join(sorted(names)))
+        if status.entry is None:
+            return
+
+        user_id = status.entry.user_id
+        name = controller.signed_in.user_name(
+            user_id, full_name=CONFIG['FULL_USER_NAMES']
+        )
+        if name is None:
+            self.signed_in.remove(user_id)
+        else:
+            self.signed_in.add(user_id, name)
 
     def _show_feedback_label(self, message, seconds=None):
         """Display a message in lbl_feedback, which times out after some
@@ -157,25 +233,93 @@ class QtChronophoreUI(QWidget):
         logger.debug('Feedback label hidden')
 
     def _sign_button_press(self):
-        """Validate input from ent_id, then sign in to the Timesheet."""
+        """Queue the user id from ent_id to be signed in or out, then
+        clear ent_id so the next user can scan right away.
+        """
         user_id = self.ent_id.text().strip()
+        self.ent_id.clear()
+        self.ent_id.setFocus()
 
-        try:
-            status = controller.sign(user_id)
+        self.pending.append(user_id)
+        logger.debug('Sign request queued: {} ({} pending)'.format(
+            user_id, len(self.pending)
+        ))
+        self._next_request()
 
-        # ERROR: User type is unknown (!student and !tutor)
-        except ValueError as e:
-            logger.error(e, exc_info=True)
-            QMessageBox.critical(
-                self,
-                __title__ + ' Error',
-                str(e),
-                buttons=QMessageBox.Ok,
-                defaultButton=QMessageBox.Ok,
+    def _next_request(self):
+        """Send the next queued user id to the worker thread, unless it
+        is still busy with the previous one.
+        """
+        if self.busy or not self.pending:
+            return
+
+        self.busy = True
+        self.sign_requested.emit(self.pending.popleft(), None)
+
+    def _finish_request(self):
+        self.busy = False
+        self.ent_id.setFocus()
+        self._next_request()
+
+    def _on_signed(self, user_id, user_type, status):
+        """Confirm a completed sign in or sign out with the user."""
+        self._update_signed_in(status)
+
+        # The database couldn't be reached, so the scan was journaled
+        # to be applied later, and can't be undone.
+        if status.in_or_out is None:
+            self._show_feedback_label(
+                'Scan saved: {}. It will be recorded when the database '
+                'is available.'.format(status.user_name or user_id)
             )
+            self._finish_request()
+            return
+
+        # The user already confirmed by choosing a user type.
+        if user_type is not None:
+            self._show_feedback_label(
+                'Signed {}: {} ({})'.format(
+                    status.in_or_out, status.user_name, status.user_type
+                )
+            )
+            self._finish_request()
+            return
+
+        sign_choice_confirmed = QMessageBox.question(
+            self,
+            'Confirm Sign-{}'.format(status.in_or_out),
+            'Sign {}: {}?'.format(status.in_or_out, status.user_name),
+            buttons=QMessageBox.Yes | QMessageBox.No,
+            defaultButton=QMessageBox.Yes,
+        )
+
+        logger.debug('Sign {} confirmed: {}'.format(
+            status.in_or_out, sign_choice_confirmed
+        ))
+
+        if sign_choice_confirmed == QMessageBox.No:
+            # Undo sign-in or sign-out. The request finishes once the
+            # worker has undone it.
+            self.undo_requested.emit(status)
+        else:
+            self._show_feedback_label(
+                'Signed {}: {}'.format(status.in_or_out, status.user_name)
+            )
+            self._finish_request()
+
+    def _on_sign_failed(self, user_id, user_type, e):
+        """Tell the user why a sign in or sign out didn't work."""
+
+        # User needs to select type
+        if isinstance(e, controller.AmbiguousUserType):
+            logger.debug(e)
+            u = QtUserTypeSelectionDialog('Select User Type: ', self)
+            if u.exec_() == QDialog.Accepted:
+                self.sign_requested.emit(user_id, u.user_type)
+                return
 
         # ERROR: User is unregistered
-        except controller.UnregisteredUser as e:
+        elif isinstance(e, controller.UnregisteredUser):
             logger.debug(e)
             QMessageBox.warning(
                 self,
@@ -185,47 +329,178 @@ class QtChronophoreUI(QWidget):
                 defaultButton=QMessageBox.Ok,
             )
 
-        # User needs to select type
-        except controller.AmbiguousUserType as e:
-            logger.debug(e)
-            u = QtUserTypeSelectionDialog('Select User Type: ', self)
-            if u.exec_() == QDialog.Accepted:
-                status = controller.sign(user_id, user_type=u.user_type)
-                self._show_feedback_label(
-                    'Signed {}: {} ({})'.format(
-                        status.in_or_out, status.user_name, status.user_type
-                    )
-                )
-
-        # User has signed in or out normally
+        # ERROR: User type is unknown (!student and !tutor), or the
+        # database couldn't be reached
         else:
-            sign_choice_confirmed = QMessageBox.question(
+            logger.error(e, exc_info=(type(e), e, e.__traceback__))
+            QMessageBox.critical(
                 self,
-                'Confirm Sign-{}'.format(status.in_or_out),
-                'Sign {}: {}?'.format(status.in_or_out, status.user_name),
-                buttons=QMessageBox.Yes | QMessageBox.No,
-                defaultButton=QMessageBox.Yes,
+                __title__ + ' Error',
+                str(e),
+                buttons=QMessageBox.Ok,
+                defaultButton=QMessageBox.Ok,
             )
 
-            logger.debug('Sign {} confirmed: {}'.format(
-                status.in_or_out, sign_choice_confirmed
-            ))
+        self._finish_request()
+
+    def _on_undone(self, status):
+        logger.debug('Sign {} undone: {}'.format(status.in_or_out, status.user_name))
+        self._update_signed_in(status)
+        self._finish_request()
+
+    def _on_undo_failed(self, status, e):
+        logger.error(e, exc_info=(type(e), e, e.__traceback__))
+        QMessageBox.critical(
+            self,
+            __title__ + ' Error',
+            str(e),
+            buttons=QMessageBox.Ok,
+            defaultButton=QMessageBox.Ok,
+        )
+        self._finish_request()
+
+    def closeEvent(self, e):
+        self.reconcile_timer.stop()
+        self.worker_thread.quit()
+        self.worker_thread.wait()
+        super().closeEvent(e)
+
+
+class QtSignWorker(QObject):
+    """Runs the controller's database calls on a worker thread, so a
+    slow or locked database doesn't freeze the gui. Results are sent
+    back to the gui thread with signals.
+
+    :param journal: (optional) `journal.Journal` object to save scans to when the database can't be reached.
+    """ # noqa
+
+    #: Emitted with the user id, requested user type, and `Status`.
+    signed = pyqtSignal(object, object, object)
 
-            if sign_choice_confirmed == QMessageBox.No:
-                # Undo sign-in or sign-out
-                if status.in_or_out == 'in':
-                    controller.undo_sign_in(status.entry)
-                elif status.in_or_out == 'out':
-                    controller.undo_sign_out(status.entry)
+    #: Emitted with the user id, requested user type, and exception.
+    sign_failed = pyqtSignal(object, object, object)
+
+    #: Emitted with the `Status` that was undone.
+    undone = pyqtSignal(object)
+
+    #: Emitted with the `Status` that couldn't be undone, and exception.
+    undo_failed = pyqtSignal(object, object)
+
+    #: Emitted once the signed in registry has been checked against the
+    #: database.
+    reconciled = pyqtSignal()
+
+    def __init__(self, journal=None):
+        super().__init__()
+        self.journal = journal
+
+    @pyqtSlot(object, object)
+    def sign(self, user_id, user_type):
+        try:
+            if self.journal is None:
+                status = controller.sign(user_id, user_type=user_type)
             else:
-                self._show_feedback_label(
-                    'Signed {}: {}'.format(status.in_or_out, status.user_name)
+                status = sign_or_journal(
+                    self.journal, user_id, user_type=user_type
                 )
+        except Exception as e:
+            self.sign_failed.emit(user_id, user_type, e)
+        else:
+            self.signed.emit(user_id, user_type, status)
+
+    @pyqtSlot(object)
+    def undo(self, status):
+        try:
+            if status.in_or_out == 'in':
+                controller.undo_sign_in(status.entry)
+            elif status.in_or_out == 'out':
+                controller.undo_sign_out(status.entry)
+        except Exception as e:
+            self.undo_failed.emit(status, e)
+        else:
+            self.undone.emit(status)
+
+    @pyqtSlot()
+    def reconcile(self):
+        try:
+            with session_scope() as session:
+                controller.signed_in.verify(session)
+        except Exception as e:
+            logger.error(
+                'Could not check signed in users: {}'.format(e),
+                exc_info=(type(e), e, e.__traceback__),
+            )
+        self.reconciled.emit()
+
+
+class QtSignedInModel(QAbstractListModel):
+    """The names of signed in users, sorted, one row per user.
+
+    Rows are inserted and removed one at a time, so the view only
+    redraws what changed instead of the whole list.
+    """
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        # Sorted list of (name, user_id)
+        self._rows = []
+        # Maps user_id -> name
+        self._names = {}
+
+    def rowCount(self, parent=QModelIndex()):
+        if parent.isValid():
+            return 0
+        return len(self._rows)
+
+    def data(self, index, role=Qt.DisplayRole):
+        if role == Qt.DisplayRole and index.isValid():
+            return self._rows[index.row()][0]
+        return None
 
-        finally:
-            self._set_signed_in()
-            self.ent_id.clear()
-            self.ent_id.setFocus()
+    def add(self, user_id, name):
+        """Insert a row for a user, or rename their row if they already
+        have one.
+
+        :return: Whether the model changed.
+        """
+        if self._names.get(user_id) == name:
+            return False
+        self.remove(user_id)
+
+        row = bisect.bisect(self._rows, (name, user_id))
+        self.beginInsertRows(QModelIndex(), row, row)
+        self._rows.insert(row, (name, user_id))
+        self._names[user_id] = name
+        self.endInsertRows()
+        return True
+
+    def remove(self, user_id):
+        """Remove a user's row, if they have one.
+
+        :return: Whether the model changed.
+        """
+        if user_id not in self._names:
+            return False
+
+        row = bisect.bisect_left(self._rows, (self._names[user_id], user_id))
+        self.beginRemoveRows(QModelIndex(), row, row)
+        del self._rows[row]
+        del self._names[user_id]
+        self.endRemoveRows()
+        return True
+
+    def sync(self, users):
+        """Add, rename and remove rows to match a dictionary of names
+        by user id.
+
+        :return: The number of rows that changed.
+        """
+        changed = 0
+        for user_id in set(self._names) - set(users):
+            changed += self.remove(user_id)
+        for user_id, name in users.items():
+            changed += self.add(user_id, name)
+        return changed
 
 
 class QtUserTypeSelectionDialog(QDialog):
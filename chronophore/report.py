@@ -0,0 +1,278 @@
+import collections
+import csv
+import logging
+import sys
+from datetime import date, timedelta
+
+logger = logging.getLogger(__name__)
+
+#: Ways to group hours, besides by period.
+GROUPS = ('user', 'user_type')
+
+#: Periods hours can be totalled over. A `term` is one of the terms in
+#: `archive.TERMS`, and `all` is the whole date range of the report.
+PERIODS = ('day', 'week', 'month', 'term', 'all')
+
+#: How to count entries where the user forgot to sign out:
+#:
+#: - `exclude`: leave them out of the report entirely.
+#: - `zero`: count the visit, but no hours.
+#: - `fixed`: count the visit, and a fixed number of hours.
+FORGOT_POLICIES = ('exclude', 'zero', 'fixed')
+
+#: Timesheet is a namedtuple of parallel lists, one per column, holding
+#: the timesheet entries a report is made from.
+#:
+#: .. attribute:: user_ids
+#:
+#:    The user id of each entry.
+#:
+#: .. attribute:: user_types
+#:
+#:    Whether each entry was signed into as a `student` or a `tutor`.
+#:
+#: .. attribute:: dates
+#:
+#:    The date of each entry.
+#:
+#: .. attribute:: seconds
+#:
+#:    How long each entry lasted, or `None` if it has no sign out time.
+#:
+#: .. attribute:: forgot
+#:
+#:    Whether the user forgot to sign out of each entry.
+#:
+Timesheet = collections.namedtuple(
+    'Timesheet',
+    [
+        'user_ids',
+        'user_types',
+        'dates',
+        'seconds',
+        'forgot',
+    ]
+)
+
+#: ReportRow is a namedtuple holding one line of an hours report.
+#:
+#: .. attribute:: period
+#:
+#:    The first day of the period, or `None` for the whole date range.
+#:
+#: .. attribute:: group
+#:
+#:    The user id or user type the hours belong to.
+#:
+#: .. attribute:: visits
+#:
+#:    The number of entries counted.
+#:
+#: .. attribute:: hours
+#:
+#:    The total number of hours signed in.
+#:
+ReportRow = collections.namedtuple(
+    'ReportRow',
+    [
+        'period',
+        'group',
+        'visits',
+        'hours',
+    ]
+)
+
+
+def _seconds(t):
+    return None if t is None else t.hour * 3600 + t.minute * 60 + t.second
+
+
+def _duration(time_in, time_out):
+    if time_in is None or time_out is None:
+        return None
+    return max(0, time_out - time_in)
+
+
+def _period_start(period):
+    """Return a function mapping a date to the first day of its period."""
+    if period == 'day':
+        return lambda d: d
+    elif period == 'week':
+        return lambda d: d - timedelta(days=d.weekday())
+    elif period == 'month':
+        return lambda d: d.replace(day=1)
+    elif period == 'term':
+        # Imported here, since archive loads SQLAlchemy.
+        from chronophore.archive import term_of
+        return lambda d: term_of(d).start
+    elif period == 'all':
+        return lambda d: None
+    else:
+        raise ValueError('Unknown period: {}'.format(period))
+
+
+def load_timesheet(session, start=None, end=None, user_type=None, today=None):
+    """Load timesheet entries into a `Timesheet` of columns.
+
+    Entries from previous days with no sign out time count as forgotten
+    even if `controller.flag_forgotten_entries()` hasn't flagged them
+    yet. Entries that are still signed in today are left out.
+
+    :param session: SQLAlchemy session through which to access the database.
+    :param start: (optional) `datetime.date` object. The first day to load.
+    :param end: (optional) `datetime.date` object. The last day to load.
+    :param user_type: (optional) Only load `'student'` or `'tutor'` entries.
+    :param today: (optional) The current date as a `datetime.date` object. Used for testing.
+    :return: `Timesheet` named tuple object.
+    """ # noqa
+    # Imported here, so the command line can use this module's
+    # constants without loading SQLAlchemy.
+    from chronophore.models import Entry
+
+    today = date.today() if today is None else today
+
+    query = (
+        session
+        .query(
+            Entry.user_id,
+            Entry.user_type,
+            Entry.date,
+            Entry.time_in,
+            Entry.time_out,
+            Entry.forgot_sign_out,
+        )
+        .filter(
+            Entry.time_out.isnot(None)
+            | Entry.forgot_sign_out.is_(True)
+            | (Entry.date < today)
+        )
+    )
+    if start is not None:
+        query = query.filter(Entry.date >= start)
+    if end is not None:
+        query = query.filter(Entry.date <= end)
+    if user_type is not None:
+        query = query.filter(Entry.user_type == user_type)
+
+    # Skip building ORM result tuples; plain rows are much faster to load.
+    session.flush()
+    rows = session.execute(query.statement).fetchall()
+    if not rows:
+        return Timesheet([], [], [], [], [])
+
+    user_ids, user_types, dates, times_in, times_out, flags = zip(*rows)
+    seconds = list(map(
+        _duration, map(_seconds, times_in), map(_seconds, times_out)
+    ))
+    forgot = [
+        bool(flag) or duration is None
+        for flag, duration in zip(flags, seconds)
+    ]
+
+    logger.debug('Loaded {} timesheet entries.'.format(len(rows)))
+    return Timesheet(
+        list(user_ids), list(user_types), list(dates), seconds, forgot
+    )
+
+
+def total_hours(
+        timesheet, group='user', period='all',
+        forgot_policy='exclude', forgot_hours=0):
+    """Total up the hours in a timesheet.
+
+    :param timesheet: `Timesheet` named tuple object. The entries to total.
+    :param group: (optional) Whether to total hours by `'user'` or `'user_type'`.
+    :param period: (optional) Whether to total hours by `'day'`, `'week'`, `'month'`, `'term'`, or `'all'`.
+    :param forgot_policy: (optional) How to count forgotten entries. One of `FORGOT_POLICIES`.
+    :param forgot_hours: (optional) Hours to count for each forgotten entry with the `'fixed'` policy.
+    :return: List of `ReportRow` named tuple objects, sorted by period and group.
+    """ # noqa
+    if group == 'user':
+        groups = timesheet.user_ids
+    elif group == 'user_type':
+        groups = timesheet.user_types
+    else:
+        raise ValueError('Unknown group: {}'.format(group))
+
+    if forgot_policy == 'exclude':
+        forgot_seconds = None
+    elif forgot_policy == 'zero':
+        forgot_seconds = 0
+    elif forgot_policy == 'fixed':
+        forgot_seconds = int(forgot_hours * 3600)
+    else:
+        raise ValueError('Unknown forgot sign out policy: {}'.format(forgot_policy))
+
+    seconds = [
+        forgot_seconds if forgot else duration
+        for forgot, duration in zip(timesheet.forgot, timesheet.seconds)
+    ]
+    periods = map(_period_start(period), timesheet.dates)
+
+    totals = collections.Counter()
+    visits = collections.Counter()
+    for key, duration in zip(zip(periods, groups), seconds):
+        if duration is not None:
+            totals[key] += duration
+            visits[key] += 1
+
+    return [
+        ReportRow(
+            period=key[0],
+            group=key[1],
+            visits=visits[key],
+            hours=round(totals[key] / 3600, 2),
+        )
+        for key in sorted(visits, key=lambda k: (k[0] or date.min, k[1]))
+    ]
+
+
+def write_report(rows, output=None, names=None):
+    """Write report rows as csv.
+
+    :param rows: List of `ReportRow` named tuple objects.
+    :param output: (optional) File object to write to. Defaults to stdout.
+    :param names: (optional) Dictionary of user names by user id. Adds a name column.
+    """ # noqa
+    output = sys.stdout if output is None else output
+    writer = csv.writer(output, lineterminator='\n')
+
+    header = list(ReportRow._fields)
+    if names is not None:
+        header.insert(2, 'name')
+    writer.writerow(header)
+
+    for row in rows:
+        line = [
+            '' if row.period is None else row.period.isoformat(),
+            row.group,
+            row.visits,
+            '{:.2f}'.format(row.hours),
+        ]
+        if names is not None:
+            line.insert(2, names.get(row.group, ''))
+        writer.writerow(line)
+
+
+def print_report(
+        session, start=None, end=None, user_type=None, group='user',
+        period='all', forgot_policy='exclude', forgot_hours=0, output=None):
+    """Load the timesheet, total up its hours, and write them as csv.
+    Takes the same parameters as `load_timesheet()`, `total_hours()`
+    and `write_report()`.
+    """
+    from chronophore.models import User
+
+    timesheet = load_timesheet(session, start, end, user_type)
+    rows = total_hours(timesheet, group, period, forgot_policy, forgot_hours)
+
+    if group == 'user':
+        names = {
+            user_id: ' '.join(filter(None, [first_name, last_name]))
+            for user_id, first_name, last_name
+            in session.query(User.user_id, User.first_name, User.last_name)
+        }
+    else:
+        names = None
+
+    write_report(rows, output, names)
@@ -0,0 +1,207 @@
+import collections
+import csv
+import logging
+from datetime import date, datetime
+
+logger = logging.getLogger(__name__)
+
+#: Columns a roster csv may have, besides `user_id`, which is required.
+#: Columns that are left out aren't changed for existing users.
+ROSTER_COLUMNS = (
+    'date_joined', 'date_left', 'education_plan', 'school_email',
+    'personal_email', 'first_name', 'last_name', 'major', 'is_student',
+    'is_tutor',
+)
+
+BOOLEAN_COLUMNS = ('education_plan', 'is_student', 'is_tutor')
+DATE_COLUMNS = ('date_joined', 'date_left')
+TRUE_VALUES = ('1', 'true', 'yes', 'y', 't')
+FALSE_VALUES = ('0', 'false', 'no', 'n', 'f', '')
+
+#: How many users are written to the database at a time.
+BATCH_SIZE = 500
+
+#: RosterChanges is a namedtuple describing what a roster sync changed.
+#: Each attribute is a sorted list of user ids.
+#:
+#: .. attribute:: added
+#:
+#:    Users in the roster that weren't in the database.
+#:
+#: .. attribute:: updated
+#:
+#:    Users whose details differed from the roster.
+#:
+#: .. attribute:: closed
+#:
+#:    Users missing from the roster, who had their `date_left` filled in.
+#:
+#: .. attribute:: unchanged
+#:
+#:    Users in the roster that already matched it.
+#:
+#: .. attribute:: skipped
+#:
+#:    `(line number, reason)` tuples for roster rows that couldn't be used.
+#:
+RosterChanges = collections.namedtuple(
+    'RosterChanges',
+    [
+        'added',
+        'updated',
+        'closed',
+        'unchanged',
+        'skipped',
+    ]
+)
+
+
+def _parse(column, value):
+    value = value.strip()
+    if column in BOOLEAN_COLUMNS:
+        if value.lower() in TRUE_VALUES:
+            return True
+        elif value.lower() in FALSE_VALUES:
+            return False
+        raise ValueError('{} is not true or false: {!r}'.format(column, value))
+    elif column in DATE_COLUMNS:
+        if not value:
+            return None
+        return datetime.strptime(value, '%Y-%m-%d').date()
+    return value or None
+
+
+def read_roster(f):
+    """Read users from a roster csv, one row at a time. The first row
+    names the columns, which must include `user_id` and can include any
+    of `ROSTER_COLUMNS`. Other columns are ignored.
+
+    Booleans can be written as `1`/`0`, `true`/`false` or `yes`/`no`,
+    and dates as `YYYY-MM-DD`.
+
+    :param f: File object open for reading text.
+    :return: Generator of `(line number, dictionary of columns)` tuples for valid rows, and `(line number, error message)` tuples for invalid ones.
+    """ # noqa
+    reader = csv.DictReader(f)
+    if reader.fieldnames is None or 'user_id' not in reader.fieldnames:
+        raise ValueError('Roster has no user_id column.')
+    columns = [c for c in reader.fieldnames if c in ROSTER_COLUMNS]
+
+    for row in reader:
+        line = reader.line_num
+        user_id = (row['user_id'] or '').strip()
+        if not user_id:
+            yield line, 'Missing user_id.'
+            continue
+        try:
+            user = {c: _parse(c, row[c] or '') for c in columns}
+        except ValueError as e:
+            yield line, str(e)
+            continue
+        user['user_id'] = user_id
+        yield line, user
+
+
+def _batches(items, size=BATCH_SIZE):
+    for i in range(0, len(items), size):
+        yield items[i:i + size]
+
+
+def sync_roster(session, f, close_missing=True, today=None, dry_run=False):
+    """Make the users table match a roster csv, as read by
+    `read_roster()`, in one pass over the file.
+
+    Users in the roster are added, or updated where they differ from it.
+    A user who had left is brought back, unless the roster gives their
+    `date_left`. Users missing from the roster who haven't left are
+    closed by setting their `date_left` to today. Every change is
+    written in batches, and committed in one transaction.
+
+    This function is idempotent.
+
+    :param session: SQLAlchemy session through which to access the database.
+    :param f: File object holding the roster csv.
+    :param close_missing: (optional) Whether to close users missing from the roster.
+    :param today: (optional) The current date as a `datetime.date` object. Used for testing.
+    :param dry_run: (optional) Work out the changes without making them.
+    :return: `RosterChanges` named tuple object.
+    """ # noqa
+    from chronophore.controller import user_cache
+    from chronophore.models import User
+
+    today = date.today() if today is None else today
+    columns = ('user_id', ) + ROSTER_COLUMNS
+    query = session.query(*[getattr(User, c) for c in columns])
+    existing = {row.user_id: row._asdict() for row in query}
+
+    inserts, updates, unchanged, skipped = {}, {}, [], []
+    seen = set()
+
+    for line, user in read_roster(f):
+        if isinstance(user, str):
+            skipped.append((line, user))
+            continue
+
+        user_id = user['user_id']
+        if user_id in seen:
+            skipped.append((line, 'Duplicate user_id {}.'.format(user_id)))
+            continue
+        seen.add(user_id)
+
+        current = existing.get(user_id)
+        if current is None:
+            user.setdefault('date_joined', today)
+            user.setdefault('date_left', None)
+            inserts[user_id] = user
+            continue
+
+        if 'date_left' not in user and current['date_left'] is not None:
+            user['date_left'] = None
+        changes = {
+            column: value for column, value in user.items()
+            if current[column] != value
+        }
+        if changes:
+            changes['user_id'] = user_id
+            updates[user_id] = changes
+        else:
+            unchanged.append(user_id)
+
+    closed = []
+    if close_missing:
+        closed = sorted(
+            user_id for user_id, current in existing.items()
+            if user_id not in seen and current['date_left'] is None
+        )
+
+    changes = RosterChanges(
+        added=sorted(inserts),
+        updated=sorted(updates),
+        closed=closed,
+        unchanged=sorted(unchanged),
+        skipped=skipped,
+    )
+    for line, reason in skipped:
+        logger.warning('Skipped roster line {}: {}'.format(line, reason))
+    if dry_run:
+        return changes
+
+    for batch in _batches(list(inserts.values())):
+        session.bulk_insert_mappings(User, batch)
+    for batch in _batches(list(updates.values())):
+        session.bulk_update_mappings(User, batch)
+    for batch in _batches(closed):
+        session.bulk_update_mappings(
+            User, [{'user_id': user_id, 'date_left': today} for user_id in batch]
+        )
+    session.commit()
+
+    # Bulk changes skip the ORM events that keep the cache up to date.
+    user_cache.clear()
+    logger.info(
+        'Roster synced: {} added, {} updated, {} closed, {} unchanged.'.format(
+            len(changes.added), len(changes.updated), len(changes.closed),
+            len(changes.unchanged),
+        )
+    )
+    return changes
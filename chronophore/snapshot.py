@@ -0,0 +1,161 @@
+import logging
+import os
+import pathlib
+import sqlite3
+import stat
+import time
+from datetime import datetime
+
+from sqlalchemy import create_engine
+
+from chronophore.models import is_compact_timesheet
+
+logger = logging.getLogger(__name__)
+
+#: How many pages are copied at a time. Between steps, the live
+#: database is free for the kiosk to write to.
+SNAPSHOT_PAGES = 1024
+
+#: Seconds to pause between steps.
+SNAPSHOT_PAUSE = 0.005
+
+TIMESTAMP_FORMAT = '%Y%m%dT%H%M%S'
+
+
+def snapshot_path(snapshot_dir, database_file, taken_at):
+    """Return the path of a database's snapshot, like
+    `chronophore-20160217T170000.sqlite`.
+
+    :param snapshot_dir: `pathlib.Path` object. Directory holding the snapshots.
+    :param database_file: `pathlib.Path` object. The live SQLite database.
+    :param taken_at: `datetime.datetime` object. When the snapshot was taken.
+    """ # noqa
+    return pathlib.Path(snapshot_dir).joinpath('{}-{}.sqlite'.format(
+        pathlib.Path(database_file).stem, taken_at.strftime(TIMESTAMP_FORMAT)
+    ))
+
+
+def list_snapshots(snapshot_dir, database_file):
+    """Return a database's snapshots in a directory, oldest first, with
+    when they were taken.
+
+    :param snapshot_dir: `pathlib.Path` object. Directory holding the snapshots.
+    :param database_file: `pathlib.Path` object. The live SQLite database.
+    :return: List of `(datetime.datetime, pathlib.Path)` tuples.
+    """ # noqa
+    prefix = pathlib.Path(database_file).stem + '-'
+    snapshots = []
+    for path in pathlib.Path(snapshot_dir).glob(prefix + '*.sqlite'):
+        try:
+            taken_at = datetime.strptime(
+                path.stem[len(prefix):], TIMESTAMP_FORMAT
+            )
+        except ValueError:
+            continue
+        snapshots.append((taken_at, path))
+    return sorted(snapshots)
+
+
+def latest_snapshot(snapshot_dir, database_file):
+    """Return a database's newest snapshot, or `None` if it has none.
+
+    :param snapshot_dir: `pathlib.Path` object. Directory holding the snapshots.
+    :param database_file: `pathlib.Path` object. The live SQLite database.
+    :return: `(datetime.datetime, pathlib.Path)` tuple, or `None`.
+    """ # noqa
+    snapshots = list_snapshots(snapshot_dir, database_file)
+    return snapshots[-1] if snapshots else None
+
+
+def create_snapshot(
+        database_file, snapshot_dir, pages=SNAPSHOT_PAGES,
+        pause=SNAPSHOT_PAUSE, now=None):
+    """Copy a live SQLite database into a timestamped, read-only
+    snapshot, with SQLite's online backup API.
+
+    The database is copied a few pages at a time, so the kiosk can keep
+    signing users in while it runs. If the kiosk writes to the database
+    partway through, the copy starts over, so the snapshot is always
+    consistent. The snapshot only appears once it's complete, and it
+    uses a rollback journal, so it can be read without its own WAL
+    files.
+
+    :param database_file: `pathlib.Path` object. The live SQLite database.
+    :param snapshot_dir: `pathlib.Path` object. Directory to keep the snapshots in.
+    :param pages: (optional) How many pages to copy at a time.
+    :param pause: (optional) Seconds to pause between steps.
+    :param now: (optional) The current time as a `datetime.datetime` object. Used for testing.
+    :return: `pathlib.Path` object. The new snapshot.
+    """ # noqa
+    now = datetime.now() if now is None else now
+    snapshot_dir = pathlib.Path(snapshot_dir)
+    snapshot_dir.mkdir(parents=True, exist_ok=True)
+    path = snapshot_path(snapshot_dir, database_file, now)
+    temporary = path.with_name(path.name + '.tmp')
+    if temporary.exists():
+        _remove(temporary)
+
+    def progress(status, remaining, total):
+        if remaining:
+            time.sleep(pause)
+
+    source = sqlite3.connect(str(database_file))
+    target = sqlite3.connect(str(temporary))
+    try:
+        source.backup(target, pages=pages, progress=progress)
+        target.execute('PRAGMA journal_mode=DELETE')
+    finally:
+        target.close()
+        source.close()
+
+    temporary.chmod(stat.S_IRUSR | stat.S_IRGRP | stat.S_IROTH)
+    temporary.replace(path)
+    logger.info('Took snapshot of {}: {}'.format(database_file, path))
+    return path
+
+
+def _remove(path):
+    # Read-only files can't be deleted on Windows.
+    path.chmod(stat.S_IRUSR | stat.S_IWUSR)
+    os.remove(str(path))
+
+
+def prune_snapshots(snapshot_dir, database_file, keep):
+    """Delete all but a database's newest snapshots.
+
+    :param snapshot_dir: `pathlib.Path` object. Directory holding the snapshots.
+    :param database_file: `pathlib.Path` object. The live SQLite database.
+    :param keep: How many snapshots to keep. Must be at least 1.
+    :return: List of `pathlib.Path` objects. The deleted snapshots.
+    """ # noqa
+    if keep < 1:
+        raise ValueError('At least one snapshot must be kept.')
+    old = [path for _, path in list_snapshots(snapshot_dir, database_file)][:-keep]
+    for path in old:
+        _remove(path)
+        logger.debug('Deleted snapshot: {}'.format(path))
+    return old
+
+
+def create_snapshot_engine(path):
+    """Create an engine that reads a snapshot. The snapshot is opened
+    read-only and immutable, so reading it takes no locks, and nothing
+    can be written through the engine.
+
+    :param path: `pathlib.Path` object. The snapshot.
+    :return: SQLAlchemy engine.
+    """
+    path = pathlib.Path(path).resolve()
+    uri = path.as_uri() + '?mode=ro&immutable=1'
+
+    def connect():
+        return sqlite3.connect(uri, uri=True, check_same_thread=False)
+
+    engine = create_engine('sqlite:///{}'.format(path), creator=connect)
+    compact = is_compact_timesheet(engine)
+    engine.dispose()
+
+    engine = create_engine('sqlite:///{}'.format(path), creator=connect)
+    engine.dialect.compact_timesheet = compact
+    logger.debug('Reading snapshot {}.'.format(path))
+    return engine
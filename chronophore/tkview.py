@@ -5,9 +5,12 @@ from tkinter import font, messagebox, ttk, N, S, E, W
 from tkinter.simpledialog import Dialog
 
 from chronophore import __title__, __version__, controller
-from chronophore.config import CONFIG
+from chronophore.config import get_config
+from chronophore.journal import sign_or_journal
+from chronophore.metrics import metrics
 
 logger = logging.getLogger(__name__)
+CONFIG = get_config()
 
 
 class TkChronophoreUI:
@@ -16,9 +19,15 @@ class TkChronophoreUI:
         - Entry for user id input
         - Button to sign in or out
         - List of currently signed in users
+
+    If a `journal.Journal` is given, scans are journaled whenever the
+    database can't be reached, instead of failing.
+
+    :param journal: (optional) `journal.Journal` object.
     """
 
-    def __init__(self):
+    def __init__(self, journal=None):
+        self.journal = journal
         self.root = tkinter.Tk()
         self.root.title('{} {}'.format(__title__, __version__))
         self.content = ttk.Frame(self.root, padding=(5, 5, 10, 10))
@@ -127,11 +136,11 @@ class TkChronophoreUI:
         """Populate the signed_in list with the names of currently
         signed in users.
         """
-        names = [
-            controller.get_user_name(user, full_name=CONFIG['FULL_USER_NAMES'])
-            for user in controller.signed_in_users()
-        ]
-        self.signed_in.set('\n'.join(sorted(names)))
+        with metrics.timer('gui.set_signed_in'):
+            names = controller.signed_in.names(
+                full_name=CONFIG['FULL_USER_NAMES']
+            )
+            self.signed_in.set('\n'.join(names))
 
     def _show_feedback_label(self, message, seconds=None):
         """Display a message in lbl_feedback, which then times out after
@@ -166,12 +175,23 @@ class TkChronophoreUI:
         # TODO(amin): Bind KP_Enter in all dialogs
         return yes_pressed
 
+    def _sign(self, user_id, user_type=None):
+        if self.journal is None:
+            return controller.sign(user_id, user_type=user_type)
+        return sign_or_journal(self.journal, user_id, user_type=user_type)
+
+    def _show_journaled(self, user_id, status):
+        self._show_feedback_label(
+            'Scan saved: {}. It will be recorded when the database '
+            'is available.'.format(status.user_name or user_id)
+        )
+
     def _sign_button_press(self, *args):
         """Validate input from ent_id, then sign in to the Timesheet."""
         user_id = self.ent_id.get().strip()
 
         try:
-            status = controller.sign(user_id)
+            status = self._sign(user_id)
 
         # ERROR: User type is unknown (!student and !tutor)
         except ValueError as e:
@@ -192,15 +212,22 @@ class TkChronophoreUI:
                     entry_to_clear=self.ent_id)
             if u.result:
                 logger.debug('User type selected: {}'.format(u.result))
-                status = controller.sign(user_id, user_type=u.result)
-                self._show_feedback_label(
-                    'Signed {}: {} ({})'.format(
-                        status.in_or_out, status.user_name, status.user_type
+                status = self._sign(user_id, user_type=u.result)
+                if status.in_or_out is None:
+                    self._show_journaled(user_id, status)
+                else:
+                    self._show_feedback_label(
+                        'Signed {}: {} ({})'.format(
+                            status.in_or_out, status.user_name, status.user_type
+                        )
                     )
-                )
 
-        # User has signed in or out normally
+        # User has signed in or out normally, or the database couldn't
+        # be reached and the scan was journaled
         else:
+            if status.in_or_out is None:
+                self._show_journaled(user_id, status)
+                return
             sign_choice_confirmed = self._show_confirm_window(
                 'Sign {}: {}?'.format(status.in_or_out, status.user_name),
                 'Confirm Sign-{}'.format(status.in_or_out)
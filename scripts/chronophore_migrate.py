@@ -7,7 +7,10 @@ import sqlalchemy
 from sqlalchemy import create_engine
 from sqlalchemy.orm import sessionmaker
 
-from chronophore.models import Base, Entry
+from chronophore.models import (
+    Base, Entry, add_missing_indexes, convert_to_compact_timesheet,
+    use_compact_timesheet,
+)
 
 __description__ = """
 Update Chronophore database to be compatible with a new version.
@@ -29,6 +32,25 @@ def migrate_050_to_051(session):
         session.add(entry)
 
 
+def migrate_060_to_061(engine, dry_run=False):
+    """Add the timesheet indexes used by the sign in/out lookups."""
+    if dry_run:
+        logging.info('Skipping index creation in test run.')
+        return
+
+    for index_name in add_missing_indexes(engine):
+        logging.info('Index created {}'.format(index_name))
+
+
+def migrate_to_compact_timesheet(engine, dry_run=False):
+    """Convert the timesheet to the compact integer schema."""
+    if dry_run:
+        logging.info('Skipping compact timesheet conversion in test run.')
+        return
+
+    convert_to_compact_timesheet(engine)
+
+
 def get_args():
     parser = argparse.ArgumentParser(
         description=__description__
@@ -37,6 +59,13 @@ def get_args():
         'database',
         help='Chronophore database to update in-place',
     )
+    parser.add_argument(
+        '--compact', action='store_true',
+        help=(
+            'convert the timesheet to the compact schema, which stores'
+            + ' dates and times as integers'
+        )
+    )
     parser.add_argument(
         '-n', '--dry-run', action='store_true',
         help='perform a trial run with no changes made'
@@ -71,11 +100,18 @@ def main():
 
     engine = create_engine('sqlite:///{}'.format(DATABASE_FILE))
     Session = sessionmaker(bind=engine)
+
+    if args.compact:
+        migrate_to_compact_timesheet(engine, dry_run=DRY_RUN)
+    else:
+        use_compact_timesheet(engine)
+
     Base.metadata.create_all(engine)
 
     session = Session()
 
     migrate_050_to_051(session)
+    migrate_060_to_061(engine, dry_run=DRY_RUN)
 
     try:
         if not DRY_RUN:
@@ -1,16 +1,23 @@
 #!/usr/bin/python3
 
 import argparse
+import collections
 import json
 import logging
 import pathlib
 import sqlalchemy
 
 from datetime import datetime
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, inspect
 from sqlalchemy.orm import sessionmaker
 
-from chronophore.models import Base, Entry, User
+from chronophore import attendance
+from chronophore.models import (
+    Attendance, Base, Entry, User, use_compact_timesheet
+)
+
+# Characters that can continue a json number.
+NUMBER_CHARS = '0123456789+-.eE'
 
 
 def get_args():
@@ -43,6 +50,20 @@ def get_args():
         default='%H:%M:%S',
         help='format string for dates in json data'
     )
+    parser.add_argument(
+        '--stream', action='store_true',
+        help=(
+            'read json file(s) incrementally and commit in batches;'
+            + ' items already in the database are skipped, so a failed'
+            + ' import can be resumed by running it again'
+        )
+    )
+    parser.add_argument(
+        '--batch-size',
+        default=1000,
+        type=int,
+        help='number of items per batch when streaming (default: 1000)'
+    )
     parser.add_argument(
         '-n', '--dry-run', action='store_true',
         help='perform a trial run with no changes made'
@@ -55,7 +76,7 @@ def get_args():
     return parser.parse_args()
 
 
-def make_entry(json_item, time_format, date_format):
+def entry_fields(json_item, time_format, date_format):
     uuid, entry_info = json_item
 
     date = datetime.strptime(entry_info['date'], date_format).date()
@@ -68,7 +89,7 @@ def make_entry(json_item, time_format, date_format):
 
     user_id = entry_info['user_id']
 
-    return Entry(
+    return dict(
         uuid=uuid,
         date=date,
         time_in=time_in,
@@ -78,7 +99,11 @@ def make_entry(json_item, time_format, date_format):
     )
 
 
-def make_user(json_item, date_format):
+def make_entry(json_item, time_format, date_format):
+    return Entry(**entry_fields(json_item, time_format, date_format))
+
+
+def user_fields(json_item, date_format):
     user_id, user_info = json_item
 
     if user_info['Date Joined'] is not None:
@@ -102,7 +127,7 @@ def make_user(json_item, date_format):
     last_name = user_info['Last Name']
     major = user_info['Major']
 
-    return User(
+    return dict(
         user_id=user_id,
         date_joined=date_joined,
         date_left=date_left,
@@ -115,6 +140,227 @@ def make_user(json_item, date_format):
     )
 
 
+def make_user(json_item, date_format):
+    return User(**user_fields(json_item, date_format))
+
+
+def iter_json_items(f, read_size=65536):
+    """Yield the (key, value) pairs of the top level object in a json
+    file one at a time, reading the file in chunks rather than loading
+    all of it at once.
+    """
+    decoder = json.JSONDecoder()
+    buf = ''
+    pos = 0
+    # Characters read and discarded from the front of buf.
+    offset = 0
+    eof = False
+
+    def read_more():
+        nonlocal buf, pos, offset, eof
+        chunk = f.read(read_size)
+        if not chunk:
+            eof = True
+        buf = buf[pos:] + chunk
+        offset += pos
+        pos = 0
+
+    def skip_whitespace():
+        nonlocal pos
+        while True:
+            while pos < len(buf) and buf[pos].isspace():
+                pos += 1
+            if pos < len(buf) or eof:
+                return
+            read_more()
+
+    def expect(chars):
+        nonlocal pos
+        skip_whitespace()
+        if pos >= len(buf) or buf[pos] not in chars:
+            raise ValueError(
+                'Expected one of {!r} at character {}'.format(chars, offset + pos)
+            )
+        pos += 1
+        return buf[pos - 1]
+
+    def decode():
+        nonlocal pos
+        skip_whitespace()
+        while True:
+            try:
+                value, end = decoder.raw_decode(buf, pos)
+            except json.JSONDecodeError as e:
+                if eof:
+                    raise ValueError('{} at character {}'.format(
+                        e.msg, offset + e.pos
+                    )) from e
+            else:
+                # A value that runs to the end of the buffer, or stops
+                # at a character that could still be part of a number
+                # (like '1.' of '1.5'), might continue in the next chunk.
+                if eof or (end < len(buf) and buf[end] not in NUMBER_CHARS):
+                    pos = end
+                    return value
+            read_more()
+
+    expect('{')
+    skip_whitespace()
+    if pos < len(buf) and buf[pos] == '}':
+        return
+
+    while True:
+        key = decode()
+        expect(':')
+        value = decode()
+        yield key, value
+
+        if expect(',}') == '}':
+            return
+
+
+def stream_file(
+        session, json_file, model, make_fields, batch_size, dry_run,
+        on_insert=None):
+    """Add the items in a json file to the database in batches. Each
+    batch is committed on its own, and items that are already in the
+    database are skipped, so an interrupted import can be resumed.
+
+    `on_insert` is called with the fields of each batch's new items,
+    before the batch is committed.
+
+    :return: Tuple of the number of items inserted and skipped.
+    """
+    key_column = inspect(model).primary_key[0]
+    inserted = 0
+    skipped = 0
+
+    def flush(batch):
+        keys = [fields[key_column.key] for fields in batch]
+        existing = {
+            key for (key, ) in
+            session.query(key_column).filter(key_column.in_(keys))
+        }
+        new = [fields for fields in batch if fields[key_column.key] not in existing]
+
+        session.bulk_insert_mappings(model, new)
+        if on_insert is not None:
+            on_insert(new)
+        if dry_run:
+            session.rollback()
+        else:
+            session.commit()
+
+        return len(new), len(batch) - len(new)
+
+    with json_file.open('r') as f:
+        batch = []
+        for json_item in iter_json_items(f):
+            batch.append(make_fields(json_item))
+            if len(batch) >= batch_size:
+                batch_inserted, batch_skipped = flush(batch)
+                inserted += batch_inserted
+                skipped += batch_skipped
+                batch = []
+                logging.info('{}: {} items added, {} skipped'.format(
+                    json_file, inserted, skipped))
+
+        if batch:
+            batch_inserted, batch_skipped = flush(batch)
+            inserted += batch_inserted
+            skipped += batch_skipped
+            logging.info('{}: {} items added, {} skipped'.format(
+                json_file, inserted, skipped))
+
+    return inserted, skipped
+
+
+def add_attendance(session, entries):
+    """Count imported entries in the attendance table, adding to the
+    days already there. Unlike rebuilding it, this keeps the attendance
+    of days whose entries have been archived. Changes are added to the
+    session, but not committed.
+
+    :param entries: `Entry` objects, or dictionaries of their fields.
+    """
+    seconds = collections.Counter()
+    visits = collections.Counter()
+    for entry in entries:
+        if isinstance(entry, dict):
+            entry = argparse.Namespace(**entry)
+        entry_seconds = attendance.entry_seconds(entry)
+        if entry_seconds is not None:
+            key = (entry.date, entry.user_id, entry.user_type)
+            seconds[key] += entry_seconds
+            visits[key] += 1
+
+    with session.no_autoflush:
+        for key in visits:
+            day = session.query(Attendance).get(key)
+            if day is None:
+                day = Attendance(
+                    date=key[0], user_id=key[1], user_type=key[2],
+                    seconds=0, visits=0,
+                )
+                session.add(day)
+            day.seconds += seconds[key]
+            day.visits += visits[key]
+    logging.debug('Attendance updated for {} days.'.format(len(visits)))
+
+
+def stream_main(args, session):
+    """Import the json files in batches with bulk inserts."""
+    if args.type == 'timesheet':
+        model = Entry
+
+        def make_fields(json_item):
+            return entry_fields(json_item, args.time_format, args.date_format)
+
+        def on_insert(new):
+            add_attendance(session, new)
+
+    elif args.type == 'users':
+        model = User
+        on_insert = None
+
+        def make_fields(json_item):
+            return user_fields(json_item, args.date_format)
+
+    for json_file in [pathlib.Path(f) for f in args.files]:
+        try:
+            inserted, skipped = stream_file(
+                session, json_file, model, make_fields,
+                args.batch_size, args.dry_run, on_insert,
+            )
+
+        except FileNotFoundError as e:
+            logging.error('File not found: {}'.format(json_file))
+            logging.debug(e)
+            raise SystemExit
+
+        except (KeyError, ValueError) as e:
+            session.rollback()
+            logging.error("Invalid json data for type '{}' in {}".format(
+                args.type, json_file))
+            logging.debug(e)
+            logging.info('Stopping. Batches already commited were kept.')
+            raise SystemExit
+
+        except sqlalchemy.exc.IntegrityError as e:
+            session.rollback()
+            logging.error('{} in {}'.format(e.orig, json_file))
+            logging.debug(e)
+            logging.info('Stopping. Batches already commited were kept.')
+            raise SystemExit
+
+        else:
+            logging.info('Finished {}: {} items added, {} skipped.'.format(
+                json_file, inserted, skipped))
+
+    if args.dry_run:
+        logging.info('Finishing test run.\nNo data commited to database.')
+
+
 def main():
     args = get_args()
 
@@ -142,6 +388,7 @@ def main():
 
     engine = create_engine('sqlite:///{}'.format(DATABASE_FILE))
     Session = sessionmaker(bind=engine)
+    use_compact_timesheet(engine)
     Base.metadata.create_all(engine)
 
     TYPE = args.type
@@ -149,6 +396,15 @@ def main():
     TIME_FORMAT = args.time_format
 
     session = Session()
+    entries = []
+
+    if args.stream:
+        try:
+            stream_main(args, session)
+        finally:
+            session.close()
+        return
+
     for json_file in JSON_FILES:
         try:
             with json_file.open('r') as f:
@@ -157,6 +413,7 @@ def main():
                 for json_item in data.items():
                     if TYPE == 'timesheet':
                         db_item = make_entry(json_item, TIME_FORMAT, DATE_FORMAT)
+                        entries.append(db_item)
                         logging.debug('Adding timesheet entry:\n\t{}'.format(
                             db_item))
                     elif TYPE == 'users':
@@ -181,6 +438,8 @@ def main():
 
     try:
         if not DRY_RUN:
+            if TYPE == 'timesheet':
+                add_attendance(session, entries)
             session.commit()
 
     except sqlalchemy.exc.IntegrityError as e:
@@ -95,7 +95,9 @@ setup(
 
     extras_require={
         'dev': ['flake8'],
-        'test': ['pytest'],
+        'test': ['pytest', 'testing.postgresql'],
         'qt': ['PyQt5>=5.7'],
+        'postgres': ['psycopg2>=2.6'],
+        'parquet': ['pyarrow>=0.17'],
     },
 )
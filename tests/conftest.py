@@ -1,4 +1,5 @@
 import logging
+import os
 import pathlib
 import pytest
 from datetime import date, time
@@ -6,11 +7,33 @@ from datetime import date, time
 from sqlalchemy import create_engine
 from sqlalchemy.orm import sessionmaker
 
-from chronophore.models import Base, Entry, User
+from chronophore import controller
+from chronophore.database import Session as ScopedSession
+from chronophore.models import Base, Entry, User, create_database_engine
 
 logging.disable(logging.CRITICAL)
 
 
+@pytest.fixture(autouse=True)
+def fresh_registry(monkeypatch):
+    """Give each test an empty signed in registry, so
+    state doesn't leak between tests.
+    """
+    registry = controller.SignedInRegistry()
+    monkeypatch.setattr(controller, 'signed_in', registry)
+    return registry
+
+
+@pytest.fixture(autouse=True)
+def fresh_user_cache(monkeypatch):
+    """Give each test an empty user cache, so users from
+    one test's database aren't found in another's.
+    """
+    cache = controller.UserCache()
+    monkeypatch.setattr(controller, 'user_cache', cache)
+    return cache
+
+
 @pytest.fixture()
 def nonexistent_file(tmpdir, request):
     """Return a path to an empty config file.
@@ -69,6 +92,74 @@ def db_session(request, test_users, test_entries):
     return session
 
 
+@pytest.fixture()
+def scoped_db(request, db_session):
+    """Bind chronophore's scoped Session to the test
+    database, for calls that don't take a session.
+    Unbind it when the test is finished with it.
+    """
+    db_session.commit()
+    ScopedSession.remove()
+    ScopedSession.configure(bind=db_session.bind)
+
+    def tearDown():
+        ScopedSession.remove()
+        ScopedSession.configure(bind=None)
+
+    request.addfinalizer(tearDown)
+    return db_session
+
+
+@pytest.fixture(scope='session')
+def postgres_url():
+    """Return the URL of a PostgreSQL server to test against.
+
+    Set CHRONOPHORE_TEST_POSTGRES_URL to use an existing server.
+    Otherwise, start a throwaway local one with testing.postgresql,
+    or skip the test if that isn't possible.
+    """
+    pytest.importorskip('psycopg2')
+
+    url = os.environ.get('CHRONOPHORE_TEST_POSTGRES_URL')
+    if url:
+        yield url
+        return
+
+    testing_postgresql = pytest.importorskip('testing.postgresql')
+    try:
+        server = testing_postgresql.Postgresql()
+    except RuntimeError as e:
+        pytest.skip('Could not start PostgreSQL: {}'.format(e))
+
+    yield server.url()
+    server.stop()
+
+
+@pytest.fixture()
+def postgres_engine(request, postgres_url, test_users, test_entries):
+    """Create the tables in a PostgreSQL database, add
+    some test users and entries, and return an engine
+    connected to it.
+    Drop the tables when the test is finished with them.
+    """
+    engine = create_database_engine(postgres_url, pool_size=4)
+    Base.metadata.drop_all(engine)
+    Base.metadata.create_all(engine)
+
+    session = sessionmaker(bind=engine)()
+    session.add_all([user for user in test_users.values()])
+    session.add_all(test_entries)
+    session.commit()
+    session.close()
+
+    def tearDown():
+        Base.metadata.drop_all(engine)
+        engine.dispose()
+
+    request.addfinalizer(tearDown)
+    return engine
+
+
 @pytest.fixture()
 def test_users():
     test_users = dict(
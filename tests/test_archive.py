@@ -0,0 +1,211 @@
+import logging
+import pathlib
+import pytest
+from datetime import date, time
+
+from sqlalchemy import create_engine
+from sqlalchemy.exc import OperationalError
+from sqlalchemy.orm import sessionmaker
+
+from chronophore import archive, attendance, occupancy
+from chronophore.archive import Term
+from chronophore.models import (
+    Attendance, Base, Entry, User, is_compact_timesheet, use_compact_timesheet
+)
+
+logging.disable(logging.CRITICAL)
+
+
+@pytest.fixture()
+def live_session(request, tmpdir, test_users, test_entries):
+    """Create a sqlite database file with the test users
+    and entries, plus a closed entry from the fall term,
+    and return a session to it.
+    """
+    engine = create_engine('sqlite:///{}'.format(tmpdir.join('live.sqlite')))
+    Base.metadata.create_all(engine)
+    session = sessionmaker(bind=engine)()
+    session.add_all(test_users.values())
+    session.add_all(test_entries)
+    session.add(Entry(
+        uuid='0c1e5d1f-2b2e-4bfa-a8a5-0d5c4d0b8f55',
+        date=date(2015, 9, 1),
+        time_in=time(9, 0, 0),
+        time_out=time(10, 0, 0),
+        user_id='888111111',
+        user_type='student',
+    ))
+    session.commit()
+
+    def tearDown():
+        session.close()
+        engine.dispose()
+
+    request.addfinalizer(tearDown)
+    return session
+
+
+def archived(path):
+    engine = create_engine('sqlite:///{}'.format(path))
+    use_compact_timesheet(engine)
+    session = sessionmaker(bind=engine)()
+    uuids = sorted(uuid for (uuid, ) in session.query(Entry.uuid))
+    users = sorted(user_id for (user_id, ) in session.query(User.user_id))
+    session.close()
+    engine.dispose()
+    return uuids, users
+
+
+def test_term_of():
+    assert archive.term_of(date(2016, 2, 17)) == Term(
+        '2016-spring', date(2016, 1, 1), date(2016, 5, 31)
+    )
+    assert archive.term_of(date(2016, 7, 31)) == Term(
+        '2016-summer', date(2016, 6, 1), date(2016, 7, 31)
+    )
+    assert archive.term_of(date(2015, 9, 1)) == Term(
+        '2015-fall', date(2015, 8, 1), date(2015, 12, 31)
+    )
+
+
+def test_archive_entries(live_session, tmpdir):
+    """Closed entries are moved into one archive per term,
+    along with their users. Signed in entries stay put.
+    """
+    archive_dir = pathlib.Path(str(tmpdir)).joinpath('archive')
+    counts = archive.archive_entries(
+        live_session, archive_dir, before=date(2016, 3, 1)
+    )
+    assert counts == {'2015-fall': 1, '2016-spring': 2}
+
+    remaining = sorted(entry.uuid for entry in live_session.query(Entry))
+    assert remaining == [
+        '42a1eab2-cb94-4d05-9bab-e1a021f7f949',
+        '4407d790-a05f-45cb-bcd5-6023ce9500bf',
+    ]
+    assert live_session.query(User).count() == 5
+
+    assert archived(archive_dir.joinpath('chronophore-2016-spring.sqlite')) == (
+        [
+            '1f4f10a4-b0c6-43bf-94f4-9ce6e3e204d2',
+            '7b4ae0fc-3801-4412-998f-ace14829d150',
+        ],
+        ['888111111', '888222222'],
+    )
+    assert [term.name for term, _ in archive.list_archives(archive_dir)] == [
+        '2015-fall', '2016-spring'
+    ]
+
+
+def test_archive_entries_idempotent(live_session, tmpdir):
+    archive_dir = pathlib.Path(str(tmpdir))
+    before = date(2016, 3, 1)
+    archive.archive_entries(live_session, archive_dir, before)
+    assert archive.archive_entries(live_session, archive_dir, before) == {}
+
+
+def test_archive_entries_keeps_compact_schema(tmpdir, test_users):
+    """Archives of a compact timesheet are compact too."""
+    tmpdir = pathlib.Path(str(tmpdir))
+    engine = create_engine('sqlite:///{}'.format(tmpdir.joinpath('live.sqlite')))
+    use_compact_timesheet(engine, create=True)
+    Base.metadata.create_all(engine)
+    session = sessionmaker(bind=engine)()
+    session.add(test_users['sam'])
+    session.add(Entry(
+        uuid='0c1e5d1f-2b2e-4bfa-a8a5-0d5c4d0b8f55',
+        date=date(2015, 9, 1),
+        time_in=time(9, 0, 0),
+        time_out=time(10, 0, 0),
+        user_id='888111111',
+        user_type='student',
+    ))
+    session.commit()
+
+    archive.archive_entries(session, tmpdir, date(2015, 12, 1))
+    path = tmpdir.joinpath('chronophore-2015-fall.sqlite')
+    assert is_compact_timesheet(create_engine('sqlite:///{}'.format(path)))
+    assert archived(path) == (
+        ['0c1e5d1f-2b2e-4bfa-a8a5-0d5c4d0b8f55'], ['888111111']
+    )
+    session.close()
+    engine.dispose()
+
+
+def test_archive_engine(live_session, tmpdir):
+    """Queries through the archive engine see live and
+    archived entries together, but can't change them.
+    """
+    tmpdir = pathlib.Path(str(tmpdir))
+    archive.archive_entries(live_session, tmpdir, date(2016, 3, 1))
+
+    engine = archive.create_archive_engine(
+        tmpdir.joinpath('live.sqlite'), tmpdir
+    )
+    session = sessionmaker(bind=engine)()
+    assert session.query(Entry).count() == 5
+    intervals = occupancy.load_intervals(session, start=date(2016, 2, 17))
+    assert len(intervals) == 2
+
+    with pytest.raises(OperationalError):
+        session.query(Entry).delete()
+    session.close()
+    engine.dispose()
+
+
+def test_archive_engine_date_range(live_session, tmpdir):
+    """Only the archives of terms in the date range are attached."""
+    tmpdir = pathlib.Path(str(tmpdir))
+    archive.archive_entries(live_session, tmpdir, date(2016, 3, 1))
+
+    engine = archive.create_archive_engine(
+        tmpdir.joinpath('live.sqlite'), tmpdir, start=date(2016, 1, 1)
+    )
+    session = sessionmaker(bind=engine)()
+    assert session.query(Entry).filter(Entry.date < date(2016, 1, 1)).count() == 0
+    assert session.query(Entry).count() == 4
+    session.close()
+    engine.dispose()
+
+
+def test_rebuild_attendance(live_session, tmpdir):
+    """Rebuilding attendance after archiving keeps the
+    archived days.
+    """
+    tmpdir = pathlib.Path(str(tmpdir))
+    attendance.rebuild(live_session)
+    before = sorted(
+        (a.date, a.user_id, a.seconds) for a in live_session.query(Attendance)
+    )
+    archive.archive_entries(live_session, tmpdir, date(2016, 3, 1))
+
+    assert archive.rebuild_attendance(tmpdir.joinpath('live.sqlite'), tmpdir) == 3
+    live_session.expire_all()
+    assert sorted(
+        (a.date, a.user_id, a.seconds) for a in live_session.query(Attendance)
+    ) == before
+
+
+def test_archive_engine_many_archives(live_session, tmpdir, monkeypatch):
+    """More archives than can be attached at once are read a
+    group at a time.
+    """
+    tmpdir = pathlib.Path(str(tmpdir))
+    attendance.rebuild(live_session)
+    before = sorted(
+        (a.date, a.user_id, a.seconds) for a in live_session.query(Attendance)
+    )
+    archive.archive_entries(live_session, tmpdir, date(2016, 3, 1))
+    monkeypatch.setattr(archive, 'MAX_ATTACHED', 1)
+
+    engine = archive.create_archive_engine(tmpdir.joinpath('live.sqlite'), tmpdir)
+    session = sessionmaker(bind=engine)()
+    assert session.query(Entry).count() == 5
+    session.close()
+    engine.dispose()
+
+    assert archive.rebuild_attendance(tmpdir.joinpath('live.sqlite'), tmpdir) == 3
+    live_session.expire_all()
+    assert sorted(
+        (a.date, a.user_id, a.seconds) for a in live_session.query(Attendance)
+    ) == before
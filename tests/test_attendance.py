@@ -0,0 +1,86 @@
+import logging
+from datetime import date, datetime
+
+from chronophore import attendance, controller
+from chronophore.models import Attendance, Entry
+
+logging.disable(logging.CRITICAL)
+
+
+def rollup(session):
+    return {
+        (row.date, row.user_id, row.user_type): (row.seconds, row.visits)
+        for row in session.query(Attendance)
+    }
+
+
+def test_rebuild(db_session, test_users):
+    """Only signed out entries are counted."""
+    assert attendance.rebuild(db_session) == 2
+    assert rollup(db_session) == {
+        (date(2016, 2, 17), '888111111', 'student'): (14387, 1),
+        (date(2016, 2, 17), '888222222', 'tutor'): (9870, 1),
+    }
+
+
+def test_sign_out_updates_rollup(db_session, test_users):
+    """Signing out adds to the user's attendance for the day,
+    and undoing the sign out takes it away again.
+    """
+    attendance.rebuild(db_session)
+    sam = test_users['sam'].user_id
+    events = [
+        (sam, datetime(2016, 2, 17, 17, 0, 0), None),
+        (sam, datetime(2016, 2, 17, 17, 30, 0), None),
+    ]
+    statuses = controller.sign_many(events, session=db_session)
+    key = (date(2016, 2, 17), sam, 'student')
+    assert rollup(db_session)[key] == (14387 + 1800, 2)
+
+    controller.undo_sign_out(statuses[-1].entry, session=db_session)
+    assert rollup(db_session)[key] == (14387, 1)
+
+
+def test_undo_only_sign_out_removes_row(db_session, test_users):
+    """A day with no visits left has no attendance row."""
+    attendance.rebuild(db_session)
+    entry = (
+        db_session
+        .query(Entry)
+        .filter(Entry.uuid == '7b4ae0fc-3801-4412-998f-ace14829d150')
+        .one()
+    )
+    controller.undo_sign_out(entry, session=db_session)
+    controller.undo_sign_in(entry, session=db_session)
+
+    assert list(rollup(db_session)) == [
+        (date(2016, 2, 17), '888222222', 'tutor')
+    ]
+
+
+def test_incremental_matches_rebuild(db_session, test_users):
+    """Keeping the rollup up to date gives the same result as
+    rebuilding it.
+    """
+    attendance.rebuild(db_session)
+    for user in ('sam', 'pippin', 'sam', 'pippin', 'sam'):
+        controller.sign(test_users[user].user_id, session=db_session)
+
+    incremental = rollup(db_session)
+    attendance.rebuild(db_session)
+    assert rollup(db_session) == incremental
+
+
+def test_daily_totals(db_session, test_users):
+    """Daily totals are read from the rollup, filtered by
+    date and user type.
+    """
+    attendance.rebuild(db_session)
+    totals = attendance.daily_totals(db_session)
+    assert totals == [
+        attendance.DailyTotal(
+            date=date(2016, 2, 17), users=2, visits=2, hours=6.74
+        )
+    ]
+    assert attendance.daily_totals(db_session, user_type='tutor')[0].users == 1
+    assert attendance.daily_totals(db_session, start=date(2016, 2, 18)) == []
@@ -0,0 +1,27 @@
+import pytest
+
+from chronophore import chronophore
+
+
+def parse(monkeypatch, *argv):
+    monkeypatch.setattr('sys.argv', ['chronophore'] + list(argv))
+    return chronophore.get_args()
+
+
+@pytest.mark.parametrize('argv', [
+    ('export', 'out', '--chunk-size', '0'),
+    ('export', 'out', '--chunk-size', '-5'),
+    ('export', 'out', '--chunk-size', 'many'),
+    ('occupancy', '--minutes', '0'),
+    ('snapshot', '--keep', '0'),
+])
+def test_rejects_numbers_below_one(monkeypatch, capsys, argv):
+    with pytest.raises(SystemExit) as excinfo:
+        parse(monkeypatch, *argv)
+    assert excinfo.value.code == 2
+    assert 'expected 1 or more' in capsys.readouterr().err
+
+
+def test_positive_numbers(monkeypatch):
+    assert parse(monkeypatch, 'export', 'out', '--chunk-size', '500').chunk_size == 500
+    assert parse(monkeypatch, 'occupancy', '--minutes', '15').minutes == 15
@@ -49,7 +49,7 @@ def test_use_default(nonexistent_file):
     instead.
     """
     parser = _use_default(nonexistent_file)
-    sections = ('gui',)
+    sections = ('gui', 'database')
     assert set(sections) == set(parser.sections())
 
 
@@ -67,10 +67,57 @@ def test_invalid_config_file(invalid_file):
 
 def test_missing_options(missing_options_file):
     """Load a config file that is valid,
-    but missing one or more options
+    but missing one or more options. Use the
+    defaults for those, and leave the file alone.
     """
     backup = missing_options_file.with_suffix('.bak')
-    _load_config(missing_options_file)
-    assert backup.is_file()
-    assert missing_options_file.is_file()
-    backup.unlink()
+    text = missing_options_file.read_text()
+    config = _load_config(missing_options_file)
+    assert not backup.exists()
+    assert missing_options_file.read_text() == text
+    assert config['MESSAGE_DURATION'] == 5
+    assert config['FULL_USER_NAMES'] is True
+
+
+def test_missing_section(tmpdir):
+    """Load a config file from before the database
+    section existed. Keep its settings, and use the
+    defaults for the database.
+    """
+    config_file = pathlib.Path(str(tmpdir)).joinpath('config.ini')
+    config_file.write_text(
+        '[gui]\n'
+        + 'gui_welcome_label = Welcome to the Math Lab!\n'
+        + 'full_user_names = False\n'
+        + 'large_font_size = 40\n'
+    )
+    config = _load_config(config_file)
+    assert not config_file.with_suffix('.bak').exists()
+    assert config['GUI_WELCOME_LABLE'] == 'Welcome to the Math Lab!'
+    assert config['FULL_USER_NAMES'] is False
+    assert config['LARGE_FONT_SIZE'] == 40
+    assert config['JOURNAL_MODE'] == 'WAL'
+    assert config['DATABASE_URL'] == ''
+
+
+def test_missing_database_options(tmpdir):
+    """Load a config file whose database section is
+    from before the url and pool_size options. Keep
+    its pragma settings, and use the default url and
+    pool size.
+    """
+    config_file = pathlib.Path(str(tmpdir)).joinpath('config.ini')
+    config_file.write_text(
+        '[gui]\n'
+        + 'gui_welcome_label = Welcome to the Math Lab!\n'
+        + '[database]\n'
+        + 'journal_mode = DELETE\n'
+        + 'busy_timeout = 10000\n'
+    )
+    config = _load_config(config_file)
+    assert not config_file.with_suffix('.bak').exists()
+    assert config['GUI_WELCOME_LABLE'] == 'Welcome to the Math Lab!'
+    assert config['JOURNAL_MODE'] == 'DELETE'
+    assert config['BUSY_TIMEOUT'] == 10000
+    assert config['DATABASE_URL'] == ''
+    assert config['POOL_SIZE'] == 5
@@ -1,7 +1,12 @@
 import pytest
-from datetime import date, time
+from datetime import date, datetime, time
+
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
 from chronophore import controller
-from chronophore.models import Entry
+from chronophore.database import session_scope, Session
+from chronophore.models import Base, Entry, User
 
 UNREGISTERED_ID = '000000000'
 
@@ -198,13 +203,35 @@ def test_flag_forgotten_entries(db_session, test_users):
     ])
     db_session.commit()
 
-    controller.flag_forgotten_entries(db_session, today)
+    result = controller.flag_forgotten_entries(db_session, today)
 
     flagged = db_session.query(Entry).filter(Entry.date == yesterday)
     for entry in flagged:
         assert entry.time_out is None
         assert entry.forgot_sign_out
 
+    assert result.count == 2
+    assert set(result.uuids) == {
+        'f0030733-b216-430b-be34-79fa26cbf87d',
+        'ffac853d-12ac-4a85-8b6f-7c9793479633',
+    }
+
+
+def test_flag_forgotten_entries_none(db_session):
+    """Nobody forgot to sign out, so nothing is flagged.
+    Today's open entries are left alone.
+    """
+    result = controller.flag_forgotten_entries(db_session, date(2016, 2, 17))
+
+    assert result.count == 0
+    assert result.uuids == []
+    assert (
+        db_session
+        .query(Entry)
+        .filter(Entry.forgot_sign_out.is_(True))
+        .count()
+    ) == 0
+
 
 def test_sign_in_student(test_users):
     """Sam, who is just a student, signs in."""
@@ -299,3 +326,301 @@ def test_get_multi_word_user_name(test_users):
     """
     name = controller.get_user_name(test_users['gandalf'])
     assert name == 'Gandalf the Grey'
+
+
+def test_registry_load(db_session, test_users):
+    """The registry lists the same users as the database."""
+    today = date(2016, 2, 17)
+    registry = controller.SignedInRegistry()
+    registry.load(db_session, today=today)
+
+    assert registry.names(today=today) == ['Merry Brandybuck', 'Pippin Took']
+    assert registry.names(full_name=False, today=today) == ['Merry', 'Pippin']
+    assert registry.is_signed_in(test_users['pippin'].user_id, today=today)
+    assert not registry.is_signed_in(test_users['sam'].user_id, today=today)
+
+
+def test_registry_user_names(db_session, test_users):
+    """Look up the names of signed in users by user id."""
+    today = date(2016, 2, 17)
+    registry = controller.SignedInRegistry()
+    registry.load(db_session, today=today)
+
+    assert registry.users(today=today) == {
+        test_users['merry'].user_id: 'Merry Brandybuck',
+        test_users['pippin'].user_id: 'Pippin Took',
+    }
+    assert registry.user_name(
+        test_users['pippin'].user_id, full_name=False, today=today
+    ) == 'Pippin'
+    assert registry.user_name(test_users['sam'].user_id, today=today) is None
+
+
+def test_registry_sign(db_session, test_users, fresh_registry):
+    """Signing in and out, and undoing either, keeps the
+    registry in step with the database without reloading it.
+    """
+    today = date.today()
+    sam_id = test_users['sam'].user_id
+
+    status = controller.sign(sam_id, session=db_session)
+    assert fresh_registry.is_signed_in(sam_id)
+    assert fresh_registry.verify(db_session)
+
+    controller.undo_sign_in(status.entry, db_session)
+    assert not fresh_registry.is_signed_in(sam_id)
+
+    controller.sign(sam_id, session=db_session)
+    status = controller.sign(sam_id, session=db_session)
+    assert status.in_or_out == 'out'
+    assert not fresh_registry.is_signed_in(sam_id)
+
+    controller.undo_sign_out(status.entry, db_session)
+    assert fresh_registry.is_signed_in(sam_id)
+    assert fresh_registry.names(today=today) == ['Sam Gamgee']
+    assert fresh_registry.verify(db_session)
+
+
+def test_registry_verify_out_of_sync(db_session, test_users):
+    """The registry notices when the database was changed
+    behind its back, and reloads itself.
+    """
+    today = date(2016, 2, 17)
+    registry = controller.SignedInRegistry()
+    registry.load(db_session, today=today)
+
+    pippins_entry = (
+        db_session
+        .query(Entry)
+        .filter(Entry.user_id == test_users['pippin'].user_id)
+        .one()
+    )
+    pippins_entry.time_out = time(12, 0, 0)
+    db_session.commit()
+
+    assert not registry.verify(db_session, today=today)
+    assert registry.names(today=today) == ['Merry Brandybuck']
+    assert registry.verify(db_session, today=today)
+
+
+def test_registry_new_day(db_session, test_users):
+    """Yesterday's entries aren't signed in today."""
+    registry = controller.SignedInRegistry()
+    registry.load(db_session, today=date(2016, 2, 17))
+    assert registry.names(today=date(2016, 2, 18)) == []
+
+
+def test_sign_many(db_session, test_users):
+    """A reader replays a backlog of scans. Sam signs in and
+    out, Merry signs out of his entry from earlier, and an
+    unregistered scan and an ambiguous one are reported as
+    invalid without stopping the rest.
+    """
+    sam_id = test_users['sam'].user_id
+    merry_id = test_users['merry'].user_id
+    day = date(2016, 2, 17)
+
+    statuses = controller.sign_many(
+        [
+            (sam_id, datetime(2016, 2, 17, 17, 0, 0), None),
+            (UNREGISTERED_ID, datetime(2016, 2, 17, 17, 0, 5), None),
+            (merry_id, datetime(2016, 2, 17, 17, 1, 0), None),
+            (test_users['frodo'].user_id, datetime(2016, 2, 17, 17, 2, 0), None),
+            controller.SignEvent(sam_id, datetime(2016, 2, 17, 18, 30, 0), None),
+        ],
+        session=db_session,
+    )
+
+    assert [(s.valid, s.in_or_out) for s in statuses] == [
+        (True, 'in'),
+        (False, None),
+        (True, 'out'),
+        (False, None),
+        (True, 'out'),
+    ]
+    assert statuses[3].user_name == 'Frodo Baggins'
+
+    sams_entry = (
+        db_session
+        .query(Entry)
+        .filter(Entry.user_id == sam_id)
+        .filter(Entry.date == day)
+        .filter(Entry.time_in == time(17, 0, 0))
+        .one()
+    )
+    assert sams_entry.time_out == time(18, 30, 0)
+    assert (
+        db_session
+        .query(Entry)
+        .filter(Entry.user_id == merry_id)
+        .filter(Entry.time_out.is_(None))
+        .one_or_none()
+    ) is None
+
+
+def test_sign_many_registry(db_session, test_users, fresh_registry):
+    """Scans from today update the registry once the batch is
+    committed.
+    """
+    now = datetime.now()
+    sam_id = test_users['sam'].user_id
+    pippin_id = test_users['pippin'].user_id
+
+    controller.sign_many(
+        [(sam_id, now, None), (pippin_id, now, None)],
+        session=db_session,
+    )
+    assert fresh_registry.is_signed_in(sam_id)
+    assert fresh_registry.is_signed_in(pippin_id)
+
+    controller.sign_many([(sam_id, now, None)], session=db_session)
+    assert not fresh_registry.is_signed_in(sam_id)
+    assert fresh_registry.verify(db_session)
+
+
+def test_sign_many_empty(db_session):
+    assert controller.sign_many([], session=db_session) == []
+
+
+def test_session_scope_removes_session(scoped_db, test_users):
+    """Calls that make their own session close it when they
+    are done. Their results can still be used afterwards.
+    """
+    status = controller.sign(test_users['sam'].user_id)
+
+    assert not Session.registry.has()
+    assert status.entry.user_id == test_users['sam'].user_id
+
+    controller.undo_sign_in(status.entry)
+    assert not Session.registry.has()
+
+
+def test_session_scope_rolls_back(scoped_db):
+    """A failed unit of work is rolled back."""
+    with pytest.raises(RuntimeError):
+        with session_scope() as session:
+            session.query(Entry).delete()
+            raise RuntimeError()
+
+    assert scoped_db.query(Entry).count() == 4
+
+
+def test_session_scope_leaves_given_session(db_session):
+    """A session passed in is left open for the caller."""
+    with session_scope(db_session) as session:
+        assert session is db_session
+    assert db_session.query(Entry).count() == 4
+
+
+def test_user_cache_hit(db_session, test_users, fresh_user_cache):
+    """A user is loaded once, then found in the cache."""
+    sam_id = test_users['sam'].user_id
+    controller.sign(sam_id, session=db_session)
+    status = controller.sign(sam_id, session=db_session)
+
+    assert status.in_or_out == 'out'
+    assert status.user_name == 'Sam Gamgee'
+    assert (fresh_user_cache.hits, fresh_user_cache.misses) == (1, 1)
+
+
+def test_user_cache_unregistered(db_session, fresh_user_cache):
+    """Unregistered ids are cached too."""
+    for _ in range(3):
+        with pytest.raises(controller.UnregisteredUser):
+            controller.sign(UNREGISTERED_ID, session=db_session)
+    assert (fresh_user_cache.hits, fresh_user_cache.misses) == (2, 1)
+
+
+def test_user_cache_invalidated_by_roster_changes(db_session, test_users):
+    """Adding or changing a user in this process replaces
+    what the cache knows about them.
+    """
+    cache = controller.user_cache
+    assert cache.get(db_session, UNREGISTERED_ID) is None
+
+    db_session.add(User(
+        user_id=UNREGISTERED_ID, first_name='Bilbo', last_name='Baggins',
+        is_student=True, is_tutor=False,
+    ))
+    db_session.commit()
+    assert cache.get(db_session, UNREGISTERED_ID).first_name == 'Bilbo'
+
+    sam = db_session.query(User).get(test_users['sam'].user_id)
+    assert cache.get(db_session, sam.user_id).major == 'Agriculture'
+    sam.major = 'Gardening'
+    db_session.commit()
+    assert sam.user_id not in cache._users
+    assert cache.get(db_session, sam.user_id).major == 'Gardening'
+
+
+def test_user_cache_data_version(tmpdir, test_users, fresh_user_cache):
+    """The cache is cleared when another connection commits
+    to a SQLite database.
+    """
+    url = 'sqlite:///{}'.format(tmpdir.join('cache.sqlite'))
+    kiosk = create_engine(url)
+    desk = create_engine(url)
+    Base.metadata.create_all(kiosk)
+    session = sessionmaker(bind=kiosk)()
+
+    assert fresh_user_cache.get(session, UNREGISTERED_ID) is None
+    assert fresh_user_cache.get(session, UNREGISTERED_ID) is None
+    assert fresh_user_cache.hits == 1
+
+    # Registered at the front desk, by another program.
+    desk.execute(
+        User.__table__.insert(),
+        user_id=UNREGISTERED_ID, first_name='Bilbo', last_name='Baggins',
+        is_student=True, is_tutor=False,
+    )
+    assert fresh_user_cache.get(session, UNREGISTERED_ID).first_name == 'Bilbo'
+    session.close()
+    kiosk.dispose()
+    desk.dispose()
+
+
+def test_user_cache_locked_lookup(tmpdir, test_users, monkeypatch):
+    """Without a data version, a locked lookup that finds a
+    user replaces the cached unregistered id.
+    """
+    url = 'sqlite:///{}'.format(tmpdir.join('cache.sqlite'))
+    kiosk = create_engine(url)
+    desk = create_engine(url)
+    Base.metadata.create_all(kiosk)
+    session = sessionmaker(bind=kiosk)()
+    cache = controller.UserCache()
+    monkeypatch.setattr(cache, '_data_version', lambda session: None)
+
+    assert cache.get(session, UNREGISTERED_ID, lock=True) is None
+    session.commit()
+    desk.execute(
+        User.__table__.insert(),
+        user_id=UNREGISTERED_ID, first_name='Bilbo', last_name='Baggins',
+        is_student=True, is_tutor=False,
+    )
+    assert cache.get(session, UNREGISTERED_ID) is None
+    assert cache.get(session, UNREGISTERED_ID, lock=True).first_name == 'Bilbo'
+    assert cache.get(session, UNREGISTERED_ID).first_name == 'Bilbo'
+    session.close()
+    kiosk.dispose()
+    desk.dispose()
+
+
+def test_user_cache_max_age(db_session, test_users):
+    cache = controller.UserCache(max_age=0)
+    sam_id = test_users['sam'].user_id
+    cache.get(db_session, sam_id)
+    cache.get(db_session, sam_id)
+    assert (cache.hits, cache.misses) == (0, 2)
+
+
+def test_user_cache_maxsize(db_session, test_users):
+    """The least recently used users are dropped."""
+    cache = controller.UserCache(maxsize=2)
+    for name in ('frodo', 'sam', 'frodo', 'merry'):
+        cache.get(db_session, test_users[name].user_id)
+
+    assert len(cache) == 2
+    assert set(cache._users) == {
+        test_users['frodo'].user_id, test_users['merry'].user_id
+    }
@@ -0,0 +1,164 @@
+import io
+import json
+import logging
+import pytest
+from datetime import date, datetime, time
+
+from chronophore import attendance, controller, corrections
+from chronophore.corrections import Edit, InvalidCorrections
+from chronophore.models import Attendance, Correction, Entry
+
+logging.disable(logging.CRITICAL)
+
+NOW = datetime(2016, 2, 18, 9, 0, 0)
+DAY = date(2016, 2, 17)
+
+PIPPIN_ENTRY = '4407d790-a05f-45cb-bcd5-6023ce9500bf'
+SAM_ENTRY = '7b4ae0fc-3801-4412-998f-ace14829d150'
+
+
+def apply(session, edits, **kwargs):
+    return corrections.apply_corrections(session, edits, now=NOW, **kwargs)
+
+
+def test_apply_corrections(db_session):
+    """A forgotten sign out is filled in, and a mistaken entry
+    is deleted, with an audit row for each edit.
+    """
+    db_session.query(Entry).get(PIPPIN_ENTRY).forgot_sign_out = True
+    attendance.rebuild(db_session)
+    assert db_session.query(Attendance).get((DAY, '888111111', 'student'))
+
+    applied = apply(
+        db_session,
+        [
+            Edit(PIPPIN_ENTRY, 'time_out', time(12, 45, 23)),
+            Edit(PIPPIN_ENTRY, 'clear_forgot'),
+            Edit(SAM_ENTRY, 'delete'),
+        ],
+        reason='Kiosk was down.',
+    )
+
+    pippin = db_session.query(Entry).get(PIPPIN_ENTRY)
+    assert pippin.time_out == time(12, 45, 23)
+    assert not pippin.forgot_sign_out
+    assert db_session.query(Entry).get(SAM_ENTRY) is None
+
+    days = {a.user_id: a for a in db_session.query(Attendance)}
+    assert '888111111' not in days
+    assert days['888333333'].seconds == 2 * 60 * 60
+    assert days['888333333'].visits == 1
+
+    audit = db_session.query(Correction).order_by(Correction.id).all()
+    assert [a.action for a in audit] == ['time_out', 'clear_forgot', 'delete']
+    assert [a.id for a in applied] == [a.id for a in audit]
+    assert len({a.batch_id for a in audit}) == 1
+    assert {a.reason for a in audit} == {'Kiosk was down.'}
+    assert json.loads(audit[0].before)['time_out'] is None
+    assert json.loads(audit[1].before)['time_out'] == '12:45:23'
+    assert json.loads(audit[1].after)['forgot_sign_out'] is False
+    assert audit[2].after is None
+
+
+def test_apply_corrections_rejects_batch(db_session):
+    """Every problem is reported, and none of the edits are
+    made.
+    """
+    with pytest.raises(InvalidCorrections) as excinfo:
+        apply(db_session, [
+            Edit(PIPPIN_ENTRY, 'time_out', time(9, 0, 0)),
+            Edit(SAM_ENTRY, 'user_type', 'tutor'),
+            Edit('no-such-entry', 'delete'),
+            Edit(SAM_ENTRY, 'delete'),
+            Edit(SAM_ENTRY, 'clear_forgot'),
+            Edit(SAM_ENTRY, 'rename'),
+        ])
+
+    assert len(excinfo.value.problems) == 5
+    assert db_session.query(Correction).count() == 0
+    assert db_session.query(Entry).get(SAM_ENTRY) is not None
+    assert db_session.query(Entry).get(PIPPIN_ENTRY).time_out is None
+
+
+def test_apply_corrections_invariants(db_session):
+    """Past entries can't be left signed in without the
+    forgot flag, and entries can't be made to overlap.
+    """
+    db_session.add(Entry(
+        uuid='later', date=DAY, time_in=time(17, 0, 0),
+        time_out=time(18, 0, 0), user_id='888111111', user_type='student',
+    ))
+    db_session.commit()
+
+    with pytest.raises(InvalidCorrections) as excinfo:
+        apply(db_session, [Edit(SAM_ENTRY, 'time_out', None)])
+    assert len(excinfo.value.problems) == 2
+
+    with pytest.raises(InvalidCorrections) as excinfo:
+        apply(db_session, [Edit(SAM_ENTRY, 'time_out', time(17, 30, 0))])
+    assert excinfo.value.problems == [
+        'Entries {} and later of 888111111 would overlap on {}.'.format(
+            SAM_ENTRY, DAY
+        )
+    ]
+
+    apply(db_session, [Edit(SAM_ENTRY, 'time_out', time(17, 0, 0))])
+
+
+def test_apply_corrections_dry_run(db_session):
+    applied = apply(db_session, [Edit(SAM_ENTRY, 'delete')], dry_run=True)
+    assert [a.action for a in applied] == ['delete']
+    assert db_session.query(Correction).count() == 0
+    assert db_session.query(Entry).get(SAM_ENTRY) is not None
+
+
+def test_undo_many(db_session, test_users, fresh_registry):
+    """Today's sign ins are deleted and sign outs signed back in,
+    all at once.
+    """
+    sam_id = test_users['sam'].user_id
+    pippin_id = test_users['pippin'].user_id
+    controller.sign(sam_id, session=db_session)
+    statuses = [
+        controller.sign(pippin_id, session=db_session),
+        controller.sign(sam_id, session=db_session),
+    ]
+    assert not fresh_registry.is_signed_in(sam_id)
+
+    corrections.undo_many(statuses, session=db_session)
+
+    assert fresh_registry.is_signed_in(sam_id)
+    assert not fresh_registry.is_signed_in(pippin_id)
+    open_entries = (
+        db_session.query(Entry)
+        .filter(Entry.date == date.today(), Entry.time_out.is_(None))
+        .all()
+    )
+    assert [e.user_id for e in open_entries] == [sam_id]
+
+
+def test_read_edits():
+    edits = corrections.read_edits(io.StringIO(
+        'uuid,action,value\n'
+        'a,time_out,17:30\n'
+        'b,time_out,\n'
+        'c,user_type, Tutor\n'
+        'd,delete,\n'
+    ))
+    assert edits == [
+        Edit('a', 'time_out', time(17, 30)),
+        Edit('b', 'time_out', None),
+        Edit('c', 'user_type', 'tutor'),
+        Edit('d', 'delete', None),
+    ]
+
+    with pytest.raises(InvalidCorrections) as excinfo:
+        corrections.read_edits(io.StringIO(
+            'uuid,action,value\n'
+            'a,time_out,5pm\n'
+            ',delete,\n'
+            'c,rename,x\n'
+        ))
+    assert [p.split(':')[0] for p in excinfo.value.problems] == [
+        'Line 2', 'Line 3', 'Line 4'
+    ]
@@ -0,0 +1,81 @@
+import logging
+import pathlib
+import pytest
+from datetime import date, time
+
+from chronophore import export
+
+logging.disable(logging.CRITICAL)
+
+
+def read_lines(path):
+    with path.open() as f:
+        return f.read().splitlines()
+
+
+def test_export_csv(db_session, tmpdir):
+    """Both tables are exported, with booleans as numbers."""
+    directory = pathlib.Path(str(tmpdir))
+    counts = export.export(db_session, directory)
+    assert counts == {'users': 5, 'timesheet': 4}
+
+    users = read_lines(directory.joinpath('users.csv'))
+    assert users[0] == (
+        'user_id,date_joined,date_left,education_plan,school_email,'
+        'personal_email,first_name,last_name,major,is_student,is_tutor'
+    )
+    assert users[1] == (
+        '888000000,2014-12-11,,0,,baggins.frodo@gmail.com,'
+        'Frodo,Baggins,Medicine,1,1'
+    )
+
+    timesheet = read_lines(directory.joinpath('timesheet.csv'))
+    assert timesheet[0] == (
+        'uuid,date,forgot_sign_out,time_in,time_out,user_id,user_type'
+    )
+    assert timesheet[-1] == (
+        '7b4ae0fc-3801-4412-998f-ace14829d150,2016-02-17,0,'
+        '12:45:09,16:44:56,888111111,student'
+    )
+
+
+def test_export_filters(db_session, tmpdir):
+    """Filters apply to the timesheet only."""
+    directory = pathlib.Path(str(tmpdir))
+    counts = export.export(db_session, directory, user_type='tutor')
+    assert counts == {'users': 5, 'timesheet': 2}
+
+    counts = export.export(db_session, directory, start=date(2016, 2, 18))
+    assert counts == {'users': 5, 'timesheet': 0}
+    assert len(read_lines(directory.joinpath('timesheet.csv'))) == 1
+
+
+def test_iter_chunks(db_session):
+    query = export.table_query(db_session, 'timesheet')
+    chunks = list(export.iter_chunks(db_session, query, chunk_size=3))
+    assert [len(rows) for rows in chunks] == [3, 1]
+
+
+def test_export_parquet(db_session, tmpdir):
+    """Parquet files keep the column types."""
+    pq = pytest.importorskip('pyarrow.parquet')
+    directory = pathlib.Path(str(tmpdir))
+    counts = export.export(
+        db_session, directory, format='parquet', chunk_size=2
+    )
+    assert counts == {'users': 5, 'timesheet': 4}
+
+    timesheet = pq.read_table(str(directory.joinpath('timesheet.parquet')))
+    assert timesheet.schema == export.arrow_schema('timesheet')
+    assert timesheet.num_rows == 4
+    assert timesheet.column('time_out').to_pylist()[-1] == time(16, 44, 56)
+
+    users = pq.read_table(str(directory.joinpath('users.parquet')))
+    assert users.column('is_tutor').to_pylist() == [
+        True, False, True, False, True
+    ]
+
+
+def test_export_unknown_format(db_session, tmpdir):
+    with pytest.raises(ValueError):
+        export.export(db_session, pathlib.Path(str(tmpdir)), format='xlsx')
@@ -0,0 +1,65 @@
+import os
+import pathlib
+import subprocess
+import sys
+
+import chronophore
+
+ROOT = pathlib.Path(chronophore.__file__).resolve().parent.parent
+
+HEAVY_MODULES = ('sqlalchemy', 'PyQt5', 'tkinter', 'appdirs')
+
+
+def run_python(code, tmpdir):
+    """Run code in a fresh interpreter, with config and data
+    directories in tmpdir, and return what it prints.
+    """
+    env = dict(
+        os.environ,
+        PYTHONPATH=str(ROOT),
+        HOME=str(tmpdir),
+        XDG_CONFIG_HOME=str(tmpdir.join('config')),
+        XDG_DATA_HOME=str(tmpdir.join('data')),
+    )
+    return subprocess.check_output(
+        [sys.executable, '-c', code], env=env, universal_newlines=True,
+    )
+
+
+def loaded_heavy_modules():
+    return (
+        "print(sorted({m.split('.')[0] for m in sys.modules}"
+        + " & set({!r})))".format(HEAVY_MODULES)
+    )
+
+
+def test_version_skips_heavy_imports(tmpdir):
+    """`chronophore --version` doesn't load SQLAlchemy, a gui
+    toolkit, or the config file.
+    """
+    output = run_python(
+        'import sys\n'
+        + 'from chronophore.chronophore import main\n'
+        + "sys.argv = ['chronophore', '--version']\n"
+        + 'try:\n'
+        + '    main()\n'
+        + 'except SystemExit:\n'
+        + '    pass\n'
+        + loaded_heavy_modules(),
+        tmpdir,
+    )
+    version, modules = output.splitlines()
+    assert version == 'chronophore {}'.format(chronophore.__version__)
+    assert modules == '[]'
+    assert not tmpdir.join('config').check()
+
+
+def test_config_import_has_no_side_effects(tmpdir):
+    """Importing the config module doesn't read or write the config
+    file until `get_config()` is called.
+    """
+    run_python('import chronophore.config', tmpdir)
+    assert not tmpdir.join('config').check()
+
+    run_python('import chronophore.config\nchronophore.config.get_config()', tmpdir)
+    assert tmpdir.join('config', 'chronophore', 'config.ini').check()
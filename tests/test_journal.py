@@ -0,0 +1,158 @@
+import logging
+import pathlib
+import pytest
+from datetime import date, datetime
+
+from sqlalchemy.exc import OperationalError
+
+from chronophore import controller, journal
+from chronophore.models import Entry, JournalPosition
+
+logging.disable(logging.CRITICAL)
+
+DAY = date(2016, 3, 1)
+
+
+@pytest.fixture()
+def scan_journal(tmpdir, request):
+    j = journal.Journal(pathlib.Path(str(tmpdir)).joinpath('journal.jsonl'))
+    request.addfinalizer(j.close)
+    return j
+
+
+def unavailable(*args, **kwargs):
+    raise OperationalError('SELECT 1', {}, Exception('database is locked'))
+
+
+def sam_entries(session, user_id):
+    return (
+        session.query(Entry)
+        .filter(Entry.user_id == user_id, Entry.date == DAY)
+        .order_by(Entry.time_in)
+        .all()
+    )
+
+
+def test_append_and_read(scan_journal):
+    scan_journal.append('888111111', datetime(2016, 3, 1, 17, 0, 0))
+    scan_journal.append('888222222', datetime(2016, 3, 1, 17, 0, 5, 250), 'tutor')
+
+    events, position = scan_journal.read(0, 10)
+    assert events == [
+        controller.SignEvent('888111111', datetime(2016, 3, 1, 17, 0, 0), None),
+        controller.SignEvent(
+            '888222222', datetime(2016, 3, 1, 17, 0, 5, 250), 'tutor'
+        ),
+    ]
+    assert position == scan_journal.path.stat().st_size
+
+    events, position = scan_journal.read(scan_journal.start, 1)
+    assert [e.user_id for e in events] == ['888111111']
+    assert scan_journal.read(position, 10)[0][0].user_id == '888222222'
+
+
+def test_read_leaves_partial_line(scan_journal):
+    """A scan that's only half written, as after a crash, isn't
+    read until it's finished.
+    """
+    scan_journal.append('888111111', datetime(2016, 3, 1, 17, 0, 0))
+    with scan_journal.path.open('ab') as f:
+        f.write(b'{"user_id": "8882')
+
+    events, position = scan_journal.read(0, 10)
+    assert len(events) == 1
+    assert position < scan_journal.path.stat().st_size
+
+
+def test_journal_survives_reopening(scan_journal):
+    scan_journal.append('888111111', datetime(2016, 3, 1, 17, 0, 0))
+    scan_journal.close()
+
+    reopened = journal.Journal(scan_journal.path)
+    assert reopened.journal_id == scan_journal.journal_id
+    assert reopened.pending()
+    assert len(reopened.read(0, 10)[0]) == 1
+    reopened.close()
+
+
+def test_replay(db_session, test_users, scan_journal):
+    """Scans are applied in order, and the journal is started
+    over once they've all been applied.
+    """
+    sam_id = test_users['sam'].user_id
+    scan_journal.append(sam_id, datetime(2016, 3, 1, 17, 0, 0))
+    scan_journal.append('000000000', datetime(2016, 3, 1, 17, 5, 0))
+    scan_journal.append(sam_id, datetime(2016, 3, 1, 18, 0, 0))
+    old_id = scan_journal.journal_id
+
+    assert journal.replay(db_session, scan_journal, batch_size=2) == 3
+
+    entries = sam_entries(db_session, sam_id)
+    assert len(entries) == 1
+    assert entries[0].time_out is not None
+    assert not scan_journal.pending()
+    assert scan_journal.journal_id != old_id
+    assert db_session.query(JournalPosition).count() == 0
+
+
+def test_replay_exactly_once(db_session, test_users, scan_journal):
+    """A batch that was committed isn't applied again, even if
+    the kiosk stopped before it could start a new journal.
+    """
+    sam_id = test_users['sam'].user_id
+    scan_journal.append(sam_id, datetime(2016, 3, 1, 17, 0, 0))
+    events, position = scan_journal.read(0, 10)
+    db_session.add(JournalPosition(
+        journal_id=scan_journal.journal_id, position=position
+    ))
+    controller.sign_many(events, session=db_session)
+    scan_journal.close()
+
+    restarted = journal.Journal(scan_journal.path)
+    assert journal.replay(db_session, restarted) == 0
+    assert len(sam_entries(db_session, sam_id)) == 1
+    restarted.close()
+
+
+def test_sign_or_journal(db_session, test_users, scan_journal, monkeypatch):
+    """Scans are journaled while the database is unavailable,
+    and later scans wait behind them until they're replayed.
+    """
+    sam_id = test_users['sam'].user_id
+    controller.user_cache.get(db_session, sam_id)
+
+    with monkeypatch.context() as m:
+        m.setattr(controller, 'sign', unavailable)
+        status = journal.sign_or_journal(
+            scan_journal, sam_id, now=datetime(2016, 3, 1, 17, 0, 0)
+        )
+    assert status.valid
+    assert status.in_or_out is None
+    assert status.user_name == 'Sam Gamgee'
+
+    # The database is back, but the journaled scan goes first.
+    journal.sign_or_journal(
+        scan_journal, sam_id, now=datetime(2016, 3, 1, 18, 0, 0)
+    )
+    assert len(scan_journal.read(0, 10)[0]) == 2
+
+    journal.replay(db_session, scan_journal)
+    entries = sam_entries(db_session, sam_id)
+    assert [(e.time_in.hour, e.time_out.hour) for e in entries] == [(17, 18)]
+
+
+def test_sign_or_journal_ambiguous(db_session, test_users, scan_journal, monkeypatch):
+    """A cached user who is both a student and a tutor still
+    chooses before their scan is journaled.
+    """
+    frodo_id = test_users['frodo'].user_id
+    controller.user_cache.get(db_session, frodo_id)
+    monkeypatch.setattr(controller, 'sign', unavailable)
+
+    with pytest.raises(controller.AmbiguousUserType):
+        journal.sign_or_journal(scan_journal, frodo_id)
+    assert not scan_journal.pending()
+
+    status = journal.sign_or_journal(scan_journal, frodo_id, user_type='tutor')
+    assert status.user_type == 'tutor'
+    assert scan_journal.pending()
@@ -0,0 +1,197 @@
+import argparse
+import importlib.util
+import io
+import json
+import logging
+import pathlib
+import pytest
+from datetime import date
+
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from chronophore.models import Attendance, Base, Entry, User
+
+logging.disable(logging.CRITICAL)
+
+SCRIPT = pathlib.Path(__file__).parent.parent.joinpath(
+    'scripts', 'json_to_sqlite.py'
+)
+spec = importlib.util.spec_from_file_location('json_to_sqlite', str(SCRIPT))
+json_to_sqlite = importlib.util.module_from_spec(spec)
+spec.loader.exec_module(json_to_sqlite)
+
+TRICKY = (
+    '{"a": 1.5, "b": {}, "c": "say \\"hi\\" {, }", "d": -2.5e-3,'
+    ' "e": [10, 2.25, null], "f": true, "\\u00e9": 12345}'
+)
+
+
+def json_user(first_name, **fields):
+    user = {
+        'Date Joined': '2016-01-04',
+        'Date Left': None,
+        'Education Plan': False,
+        'School Email': None,
+        'Personal Email': None,
+        'First Name': first_name,
+        'Last Name': 'Took',
+        'Major': None,
+    }
+    user.update(fields)
+    return user
+
+
+@pytest.fixture()
+def users_file(tmpdir):
+    path = pathlib.Path(str(tmpdir)).joinpath('users.json')
+    names = ['Adelard', 'Bandobras', 'Belladonna', 'Ferumbras', 'Isengrim']
+    users = {
+        '88800000{}'.format(i): json_user(name) for i, name in enumerate(names)
+    }
+    path.write_text(json.dumps(users))
+    return path
+
+
+@pytest.fixture()
+def session(tmpdir, request):
+    engine = create_engine('sqlite:///{}'.format(tmpdir.join('output.sqlite')))
+    Base.metadata.create_all(engine)
+    session = sessionmaker(bind=engine)()
+    request.addfinalizer(session.close)
+    return session
+
+
+def stream_args(files, batch_size=2, type='users'):
+    return argparse.Namespace(
+        files=[str(f) for f in files], type=type, batch_size=batch_size,
+        dry_run=False, date_format='%Y-%m-%d', time_format='%H:%M:%S',
+    )
+
+
+@pytest.mark.parametrize('read_size', [1, 2, 3, 4, 8, 65536])
+def test_iter_json_items(read_size):
+    """Values split across chunks, like a number cut after
+    its decimal point, are read whole.
+    """
+    items = json_to_sqlite.iter_json_items(io.StringIO(TRICKY), read_size)
+    assert list(items) == list(json.loads(TRICKY).items())
+
+
+@pytest.mark.parametrize('text', ['{}', '  {  }  ', '{\n}'])
+def test_iter_json_items_empty(text):
+    assert list(json_to_sqlite.iter_json_items(io.StringIO(text), 1)) == []
+
+
+def test_iter_json_items_error_position():
+    """Errors give the position in the file, not in the chunk
+    being read.
+    """
+    text = '{"a": 1, "b": 2, "c": 3,, "d": 4}'
+    with pytest.raises(ValueError) as excinfo:
+        list(json_to_sqlite.iter_json_items(io.StringIO(text), 4))
+    assert str(excinfo.value).endswith('at character 24')
+
+    with pytest.raises(ValueError) as excinfo:
+        list(json_to_sqlite.iter_json_items(io.StringIO('{"a": 1 "b": 2}'), 2))
+    assert str(excinfo.value).endswith('at character 8')
+
+
+def test_stream_file_batches(session, users_file, monkeypatch):
+    """Items are committed a batch at a time."""
+    commits = []
+    monkeypatch.setattr(session, 'commit', lambda: commits.append(
+        session.query(User).count()
+    ))
+
+    json_to_sqlite.stream_file(
+        session, users_file, User,
+        lambda item: json_to_sqlite.user_fields(item, '%Y-%m-%d'),
+        batch_size=2, dry_run=False,
+    )
+    assert commits == [2, 4, 5]
+
+
+def test_stream_file_resumes(session, users_file):
+    """Running an import again skips the items it already
+    added.
+    """
+    def make_fields(item):
+        return json_to_sqlite.user_fields(item, '%Y-%m-%d')
+
+    assert json_to_sqlite.stream_file(
+        session, users_file, User, make_fields, 2, False
+    ) == (5, 0)
+    assert json_to_sqlite.stream_file(
+        session, users_file, User, make_fields, 2, False
+    ) == (0, 5)
+    assert session.query(User).count() == 5
+
+
+def test_stream_main_stops_after_bad_batch(session, tmpdir):
+    """An invalid item stops the import, but the batches
+    before it are kept.
+    """
+    path = pathlib.Path(str(tmpdir)).joinpath('users.json')
+    users = {
+        '888000000': json_user('Adelard'),
+        '888000001': json_user('Bandobras'),
+        '888000002': json_user('Belladonna'),
+        '888000003': {'First Name': 'Ferumbras'},
+        '888000004': json_user('Isengrim'),
+    }
+    path.write_text(json.dumps(users))
+
+    with pytest.raises(SystemExit):
+        json_to_sqlite.stream_main(stream_args([path]), session)
+
+    assert sorted(u for (u, ) in session.query(User.user_id)) == [
+        '888000000', '888000001'
+    ]
+    assert session.query(Entry).count() == 0
+
+
+def json_entry(user_id, time_in, time_out):
+    return {
+        'date': '2016-02-17', 'time_in': time_in, 'time_out': time_out,
+        'user_id': user_id,
+    }
+
+
+@pytest.mark.parametrize('stream', [True, False])
+def test_timesheet_import_counts_attendance(
+        session, users_file, tmpdir, monkeypatch, stream):
+    """Imported entries are added to the attendance rollup,
+    which keeps the days whose entries were archived.
+    """
+    json_to_sqlite.stream_main(stream_args([users_file]), session)
+    session.add(Attendance(
+        date=date(2015, 3, 2), user_id='888000000', user_type='student',
+        seconds=3600, visits=1,
+    ))
+    session.commit()
+
+    timesheet_file = pathlib.Path(str(tmpdir)).joinpath('timesheet.json')
+    timesheet_file.write_text(json.dumps({
+        'a': json_entry('888000000', '10:00:00', '11:00:00'),
+        'b': json_entry('888000000', '13:00:00', '13:30:00'),
+        'c': json_entry('888000001', '10:00:00', None),
+    }))
+    args = stream_args([timesheet_file], type='timesheet')
+    args.stream = stream
+    args.output = str(tmpdir.join('output.sqlite'))
+    args.verbose = False
+    monkeypatch.setattr(json_to_sqlite, 'get_args', lambda: args)
+
+    json_to_sqlite.main()
+    if stream:
+        # Entries skipped when resuming aren't counted again.
+        json_to_sqlite.main()
+
+    session.expire_all()
+    assert sorted(
+        (a.date, a.user_id, a.seconds, a.visits) for a in session.query(Attendance)
+    ) == [
+        (date(2015, 3, 2), '888000000', 60 * 60, 1),
+        (date(2016, 2, 17), '888000000', 90 * 60, 2),
+    ]
@@ -0,0 +1,113 @@
+import atexit
+import logging
+import pathlib
+import pytest
+import threading
+
+from chronophore.chronophore import set_up_logging
+
+
+def stop(root):
+    """Stop the background writer, waiting for it to write
+    every queued record, and remove its handler.
+    """
+    for handler in list(root.handlers):
+        if hasattr(handler, 'listener'):
+            atexit.unregister(handler.listener.stop)
+            handler.listener.stop()
+            root.removeHandler(handler)
+
+
+@pytest.fixture()
+def root_logger(request):
+    """Let records through, and put the root logger back the
+    way it was when the test is finished with it.
+    """
+    root = logging.getLogger()
+    level = root.level
+    logging.disable(logging.NOTSET)
+
+    def tearDown():
+        stop(root)
+        root.setLevel(level)
+        logging.disable(logging.CRITICAL)
+
+    request.addfinalizer(tearDown)
+    return root
+
+
+def test_logs_written_in_background(root_logger, tmpdir):
+    """Records are written to the log file by another thread."""
+    log_file = pathlib.Path(str(tmpdir)).joinpath('debug.log')
+    set_up_logging(log_file, logging.CRITICAL)
+
+    threads = set()
+
+    class ThreadRecorder(logging.Handler):
+        def emit(self, record):
+            threads.add(threading.current_thread())
+
+    handler = root_logger.handlers[-1]
+    handler.listener.handlers += (ThreadRecorder(), )
+
+    logging.getLogger('chronophore.test').info('%s signed in.', 'Sam')
+    stop(root_logger)
+
+    assert 'INFO (chronophore.test): Sam signed in.' in log_file.read_text()
+    assert threading.current_thread() not in threads
+
+
+def test_log_file_rotated(root_logger, tmpdir):
+    log_file = pathlib.Path(str(tmpdir)).joinpath('debug.log')
+    set_up_logging(log_file, logging.CRITICAL, max_bytes=1000, backup_count=2)
+
+    logger = logging.getLogger('chronophore.test')
+    for i in range(100):
+        logger.debug('Line %s of a long log.', i)
+    stop(root_logger)
+
+    assert sorted(p.name for p in log_file.parent.iterdir()) == [
+        'debug.log', 'debug.log.1', 'debug.log.2'
+    ]
+    assert log_file.stat().st_size <= 1000
+
+
+def test_records_formatted_in_background(root_logger, tmpdir):
+    """Records with plain arguments are queued as they are, to
+    be formatted by the background thread. Other arguments,
+    which might change before then, are formatted right away.
+    """
+    log_file = pathlib.Path(str(tmpdir)).joinpath('debug.log')
+    set_up_logging(log_file, logging.CRITICAL)
+    handler = root_logger.handlers[-1]
+
+    class Row:
+        def __init__(self):
+            self.user_id = '888111111'
+
+        def __str__(self):
+            return 'Row({})'.format(self.user_id)
+
+    logger = logging.getLogger('chronophore.test')
+    plain = logger.makeRecord(
+        logger.name, logging.DEBUG, __file__, 1,
+        '%s signed in after %s scans.', ('Sam', 2), None,
+    )
+    queued = handler.prepare(plain)
+    assert queued.args == ('Sam', 2)
+    assert not hasattr(queued, 'message')
+
+    row = Row()
+    mutable = logger.makeRecord(
+        logger.name, logging.DEBUG, __file__, 1, 'Signed in: %s', (row, ), None,
+    )
+    queued = handler.prepare(mutable)
+    row.user_id = '888222222'
+    assert queued.getMessage().endswith('Signed in: Row(888111111)')
+
+    logger.debug('%s signed in after %s scans.', 'Sam', 2)
+    logger.debug('Signed in: %s', row)
+    stop(root_logger)
+    text = log_file.read_text()
+    assert 'Sam signed in after 2 scans.' in text
+    assert 'Signed in: Row(888222222)' in text
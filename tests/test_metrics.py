@@ -0,0 +1,75 @@
+import io
+import logging
+import pathlib
+import pytest
+
+from chronophore import controller, metrics
+from chronophore.metrics import Histogram, Metrics, Summary
+
+logging.disable(logging.CRITICAL)
+
+
+def test_histogram_percentiles():
+    """Percentiles are accurate to within a bucket."""
+    histogram = Histogram()
+    for ms in range(1, 101):
+        histogram.record(ms / 1000)
+
+    assert histogram.count == 100
+    assert histogram.percentile(50) == pytest.approx(0.05, rel=0.25)
+    assert histogram.percentile(99) == pytest.approx(0.099, rel=0.25)
+    assert histogram.percentile(100) == 0.1
+    assert histogram.percentile(50) <= histogram.percentile(95)
+
+
+def test_histogram_empty():
+    histogram = Histogram()
+    assert histogram.percentile(50) is None
+    assert histogram.summary('x') == Summary('x', 0, None, None, None, None)
+
+
+def test_histogram_beyond_last_bucket():
+    histogram = Histogram()
+    histogram.record(1000)
+    assert histogram.percentile(50) == 1000
+
+
+def test_timer_records_errors():
+    """Operations are timed even if they fail."""
+    m = Metrics()
+    with pytest.raises(RuntimeError):
+        with m.timer('failing'):
+            raise RuntimeError()
+    assert [s.name for s in m.summaries()] == ['failing']
+
+
+def test_write_and_read(tmpdir):
+    m = Metrics()
+    m.record('sign', 0.002)
+    m.record('sign', 0.004)
+    path = pathlib.Path(str(tmpdir)).joinpath('metrics.json')
+    m.write(path)
+
+    assert Metrics.read(path).summaries() == m.summaries()
+
+
+def test_sign_is_timed(db_session, test_users, request):
+    """Each phase of a scan is timed."""
+    metrics.metrics.clear()
+    request.addfinalizer(metrics.metrics.clear)
+
+    controller.sign(test_users['sam'].user_id, session=db_session)
+    counts = {s.name: s.count for s in metrics.metrics.summaries()}
+    assert counts == {
+        'sign': 1, 'sign.lookup': 1, 'sign.entries': 1, 'sign.commit': 1
+    }
+
+
+def test_write_summaries():
+    m = Metrics()
+    m.record('sign', 0.002)
+    output = io.StringIO()
+    metrics.write_summaries(m.summaries(), output)
+    lines = output.getvalue().splitlines()
+    assert lines[0] == 'name,count,p50_ms,p95_ms,p99_ms,max_ms'
+    assert lines[1].startswith('sign,1,')
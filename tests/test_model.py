@@ -1,9 +1,17 @@
 import logging
 import pytest
 import sqlalchemy
+import threading
 from datetime import date, time
+from sqlalchemy import create_engine, inspect
+from sqlalchemy.orm import sessionmaker
 
-from chronophore.models import Entry, User, add_test_users
+from chronophore.models import (
+    Base, Entry, User, add_missing_indexes, add_test_users,
+    configure_sqlite_pragmas, convert_to_compact_timesheet,
+    create_database_engine, is_compact_timesheet, set_sqlite_pragma,
+    use_compact_timesheet,
+)
 
 logging.disable(logging.CRITICAL)
 
@@ -28,6 +36,19 @@ class TestEntry:
         with pytest.raises(sqlalchemy.exc.IntegrityError):
             db_session.commit()
 
+    def test_indexes_created(self, db_session):
+        """A new database gets the timesheet indexes
+        along with the table.
+        """
+        indexes = {
+            index['name']: index['column_names']
+            for index in inspect(db_session.bind).get_indexes('timesheet')
+        }
+        assert indexes['ix_timesheet_user_id_date_time_out'] == [
+            'user_id', 'date', 'time_out'
+        ]
+        assert indexes['ix_timesheet_date_time_out'] == ['date', 'time_out']
+
 
 class TestUser:
 
@@ -59,3 +80,155 @@ def test_add_test_users(db_session):
     """
     add_test_users(db_session)
     add_test_users(db_session)
+
+
+def test_add_missing_indexes():
+    """A database created before the timesheet indexes
+    existed gets them added. Running it again does nothing.
+    """
+    engine = create_engine('sqlite:///:memory:')
+    Base.metadata.create_all(engine)
+    for index in Entry.__table__.indexes:
+        index.drop(engine)
+
+    created = add_missing_indexes(engine)
+    assert set(created) == {index.name for index in Entry.__table__.indexes}
+    assert add_missing_indexes(engine) == []
+
+
+def test_sqlite_pragmas(tmpdir, request):
+    """Configured pragmas are issued on every new connection."""
+    request.addfinalizer(configure_sqlite_pragmas)
+    configure_sqlite_pragmas(
+        journal_mode='wal', synchronous='normal',
+        cache_size=-4000, busy_timeout=2500,
+    )
+
+    engine = create_engine('sqlite:///{}'.format(tmpdir.join('test.sqlite')))
+    connection = engine.connect()
+    assert connection.execute('PRAGMA journal_mode').scalar() == 'wal'
+    assert connection.execute('PRAGMA synchronous').scalar() == 1
+    assert connection.execute('PRAGMA cache_size').scalar() == -4000
+    assert connection.execute('PRAGMA busy_timeout').scalar() == 2500
+    assert connection.execute('PRAGMA foreign_keys').scalar() == 1
+    connection.close()
+
+
+def test_sqlite_pragmas_other_databases():
+    """Pragmas are only issued on SQLite connections."""
+    class OtherConnection:
+        def cursor(self):
+            raise AssertionError('Pragma issued on a non-sqlite connection')
+
+    set_sqlite_pragma(OtherConnection(), None)
+
+
+def test_create_database_engine_sqlite(tmpdir):
+    """A SQLite engine reuses one connection across threads."""
+    engine = create_database_engine(
+        'sqlite:///{}'.format(tmpdir.join('test.sqlite'))
+    )
+    assert engine.pool.size() == 1
+
+    connection = engine.raw_connection()
+    dbapi_connection = connection.connection
+    connection.close()
+
+    reused = []
+    thread = threading.Thread(
+        target=lambda: reused.append(engine.raw_connection().connection)
+    )
+    thread.start()
+    thread.join()
+    assert reused == [dbapi_connection]
+
+
+def test_sqlite_pragmas_invalid():
+    """Unknown pragma values are rejected."""
+    with pytest.raises(ValueError):
+        configure_sqlite_pragmas(journal_mode='sideways')
+
+
+class TestCompactTimesheet:
+
+    @pytest.fixture()
+    def engine(self, test_users, test_entries):
+        engine = create_engine('sqlite:///:memory:')
+        Base.metadata.create_all(engine)
+        session = sessionmaker(bind=engine, expire_on_commit=False)()
+        session.add_all(test_users.values())
+        session.add_all(test_entries)
+        session.commit()
+        session.close()
+        return engine
+
+    def test_convert(self, engine, test_entries):
+        """Entries survive the conversion unchanged, and are
+        stored as integers afterwards.
+        """
+        expected = {
+            entry.uuid: (entry.date, entry.time_in, entry.time_out)
+            for entry in test_entries
+        }
+        fresh = create_engine('sqlite://', creator=engine.raw_connection)
+
+        assert not is_compact_timesheet(fresh)
+        assert convert_to_compact_timesheet(fresh) == 4
+        assert is_compact_timesheet(fresh)
+
+        session = sessionmaker(bind=fresh)()
+        converted = {
+            entry.uuid: (entry.date, entry.time_in, entry.time_out)
+            for entry in session.query(Entry)
+        }
+        assert converted == expected
+
+        raw = fresh.execute(
+            "SELECT id, date, time_in, time_out FROM timesheet"
+            " WHERE uuid = '1f4f10a4-b0c6-43bf-94f4-9ce6e3e204d2'"
+        ).fetchone()
+        assert tuple(raw[1:]) == (
+            date(2016, 2, 17).toordinal(), 10 * 3600 + 45 * 60 + 48,
+            13 * 3600 + 30 * 60 + 18,
+        )
+        assert isinstance(raw[0], int)
+
+        assert {index.name for index in Entry.__table__.indexes} <= {
+            index['name'] for index in inspect(fresh).get_indexes('timesheet')
+        }
+        assert convert_to_compact_timesheet(fresh) == 0
+
+    def test_read_write(self, engine, test_users):
+        """New entries can be added to a compact timesheet and
+        queried by date and time.
+        """
+        fresh = create_engine('sqlite://', creator=engine.raw_connection)
+        convert_to_compact_timesheet(fresh)
+        session = sessionmaker(bind=fresh)()
+
+        session.add(Entry(
+            uuid='5e3a7c56-0f55-4bd1-8f35-3e1f5d0e9b10',
+            date=date(2016, 2, 18),
+            time_in=time(9, 0, 1),
+            time_out=None,
+            user_id=test_users['sam'].user_id,
+            user_type='student',
+        ))
+        session.commit()
+
+        assert session.query(Entry).filter(Entry.date > date(2016, 2, 17)).one()
+        assert session.query(Entry).filter(
+            Entry.date == date(2016, 2, 17),
+            Entry.time_in < time(11, 0, 0),
+        ).count() == 3
+
+    def test_create(self):
+        """A new database can start out with a compact timesheet."""
+        engine = create_engine('sqlite:///:memory:')
+        assert use_compact_timesheet(engine, create=True)
+        Base.metadata.create_all(engine)
+        assert is_compact_timesheet(engine)
+
+    def test_text_timesheet_untouched(self, engine):
+        assert not use_compact_timesheet(engine)
+        assert not use_compact_timesheet(engine, create=True)
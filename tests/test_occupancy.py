@@ -0,0 +1,117 @@
+import io
+import logging
+import pytest
+from datetime import date, datetime
+
+from chronophore import occupancy
+from chronophore.occupancy import Interval, OccupancyRow, Peak
+
+logging.disable(logging.CRITICAL)
+
+DAY = date(2016, 2, 17)
+
+
+def at(hour, minute=0, second=0):
+    return hour * 3600 + minute * 60 + second
+
+
+@pytest.fixture()
+def intervals():
+    return [
+        Interval(DAY, at(10), at(10, 3), 'student'),
+        Interval(DAY, at(10, 1), at(10, 2), 'student'),
+        Interval(DAY, at(10, 1, 30), at(10, 4), 'tutor'),
+        # Starts right as another entry ends.
+        Interval(DAY, at(10, 4), at(10, 5), 'student'),
+        # Signed out before signing in; ignored.
+        Interval(DAY, at(11), at(9), 'student'),
+        Interval(date(2016, 2, 18), at(9), at(9, 0, 30), 'tutor'),
+    ]
+
+
+def test_sweep(intervals):
+    """Each change in headcount is reported once, and
+    back to back entries don't overlap.
+    """
+    changes = list(occupancy.sweep(intervals))
+    assert changes == [
+        (DAY, at(10), {'student': 1}),
+        (DAY, at(10, 1), {'student': 2}),
+        (DAY, at(10, 1, 30), {'student': 2, 'tutor': 1}),
+        (DAY, at(10, 2), {'student': 1, 'tutor': 1}),
+        (DAY, at(10, 3), {'student': 0, 'tutor': 1}),
+        (DAY, at(10, 4), {'student': 1, 'tutor': 0}),
+        (DAY, at(10, 5), {'student': 0, 'tutor': 0}),
+        (date(2016, 2, 18), at(9), {'tutor': 1}),
+        (date(2016, 2, 18), at(9, 0, 30), {'tutor': 0}),
+    ]
+
+
+def test_occupancy_minutes(intervals):
+    """Each row holds the most users signed in at once
+    during its minute.
+    """
+    rows = occupancy.occupancy(intervals)
+    assert rows == [
+        OccupancyRow(datetime(2016, 2, 17, 10, 0), 1, 0, 1),
+        OccupancyRow(datetime(2016, 2, 17, 10, 1), 2, 1, 3),
+        OccupancyRow(datetime(2016, 2, 17, 10, 2), 1, 1, 2),
+        OccupancyRow(datetime(2016, 2, 17, 10, 3), 0, 1, 1),
+        OccupancyRow(datetime(2016, 2, 17, 10, 4), 1, 0, 1),
+        OccupancyRow(datetime(2016, 2, 18, 9, 0), 0, 1, 1),
+    ]
+
+
+def test_occupancy_hours(intervals):
+    rows = occupancy.occupancy(intervals, resolution=3600)
+    assert rows == [
+        OccupancyRow(datetime(2016, 2, 17, 10), 2, 1, 3),
+        OccupancyRow(datetime(2016, 2, 18, 9), 0, 1, 1),
+    ]
+
+
+def test_occupancy_invalid_resolution(intervals):
+    with pytest.raises(ValueError):
+        occupancy.occupancy(intervals, resolution=0)
+
+
+def test_peak_occupancy(intervals):
+    """Peaks are reported at the first moment they're reached."""
+    peaks = occupancy.peak_occupancy(intervals)
+    assert peaks == {
+        'student': Peak(2, datetime(2016, 2, 17, 10, 1)),
+        'tutor': Peak(1, datetime(2016, 2, 17, 10, 1, 30)),
+        'total': Peak(3, datetime(2016, 2, 17, 10, 1, 30)),
+    }
+
+
+def test_peak_occupancy_empty():
+    peaks = occupancy.peak_occupancy([])
+    assert peaks['total'] == Peak(0, None)
+
+
+def test_load_intervals(db_session):
+    """Only signed out entries are loaded."""
+    intervals = occupancy.load_intervals(db_session)
+    assert sorted(intervals) == [
+        Interval(DAY, at(10, 45, 48), at(13, 30, 18), 'tutor'),
+        Interval(DAY, at(12, 45, 9), at(16, 44, 56), 'student'),
+    ]
+    assert occupancy.load_intervals(db_session, user_type='student') == [
+        Interval(DAY, at(12, 45, 9), at(16, 44, 56), 'student'),
+    ]
+    assert occupancy.load_intervals(db_session, start=date(2016, 2, 18)) == []
+
+
+def test_print_occupancy(db_session):
+    output = io.StringIO()
+    occupancy.print_occupancy(db_session, resolution=3600, output=output)
+    lines = output.getvalue().splitlines()
+
+    assert lines[0] == 'start,students,tutors,total'
+    assert lines[1:4] == [
+        '2016-02-17 10:00:00,0,1,1',
+        '2016-02-17 11:00:00,0,1,1',
+        '2016-02-17 12:00:00,1,1,2',
+    ]
+    assert lines[-1] == '2016-02-17 16:00:00,1,0,1'
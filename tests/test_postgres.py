@@ -0,0 +1,126 @@
+import logging
+import pytest
+import threading
+from datetime import date, datetime, time
+
+from sqlalchemy.orm import sessionmaker
+
+from chronophore import controller, export, report
+from chronophore.models import (
+    Entry, User, configure_sqlite_pragmas, convert_to_compact_timesheet
+)
+
+logging.disable(logging.CRITICAL)
+
+SAM = '888111111'
+
+
+@pytest.fixture()
+def Session(postgres_engine):
+    return sessionmaker(bind=postgres_engine, expire_on_commit=False)
+
+
+def test_sqlite_pragmas_skipped(request, postgres_engine):
+    """SQLite pragmas aren't issued on PostgreSQL connections."""
+    request.addfinalizer(configure_sqlite_pragmas)
+    configure_sqlite_pragmas(journal_mode='wal', busy_timeout=2500)
+
+    postgres_engine.dispose()
+    connection = postgres_engine.connect()
+    assert connection.execute('SELECT 1').scalar() == 1
+    connection.close()
+
+
+def test_sign_in_and_out(Session):
+    """Times round trip through PostgreSQL's own time type."""
+    today = date.today()
+    session = Session()
+
+    status = controller.sign(SAM, today=today, session=session)
+    assert status.in_or_out == 'in'
+
+    status = controller.sign(SAM, today=today, session=session)
+    assert status.in_or_out == 'out'
+    session.close()
+
+    session = Session()
+    entry = session.query(Entry).filter(Entry.uuid == status.entry.uuid).one()
+    assert isinstance(entry.time_in, time)
+    assert isinstance(entry.time_out, time)
+    assert entry.date == today
+    session.close()
+
+
+def test_sign_waits_for_other_kiosk(Session):
+    """While another kiosk is signing a user in, `sign()` waits for it
+    to commit, then signs the user out instead of in again.
+    """
+    today = date.today()
+    other_kiosk = Session()
+    sam = (
+        other_kiosk
+        .query(User)
+        .filter(User.user_id == SAM)
+        .with_for_update()
+        .one()
+    )
+
+    statuses = []
+    waiting = threading.Thread(
+        target=lambda: statuses.append(
+            controller.sign(SAM, today=today, session=Session())
+        )
+    )
+    waiting.start()
+    waiting.join(timeout=0.5)
+    assert waiting.is_alive()
+
+    other_kiosk.add(controller.sign_in(sam, date=today))
+    other_kiosk.commit()
+    other_kiosk.close()
+
+    waiting.join(timeout=10)
+    assert not waiting.is_alive()
+    assert statuses[0].in_or_out == 'out'
+
+
+def test_sign_many(Session):
+    """A batch of scans is applied in order."""
+    session = Session()
+    events = [
+        (SAM, datetime(2016, 2, 18, 9), None),
+        (SAM, datetime(2016, 2, 18, 11), None),
+        ('000000000', datetime(2016, 2, 18, 12), None),
+    ]
+
+    statuses = controller.sign_many(events, session=session)
+    assert [s.in_or_out for s in statuses] == ['in', 'out', None]
+    session.close()
+
+
+def test_report(Session):
+    """Reports total hours from a PostgreSQL timesheet."""
+    session = Session()
+    timesheet = report.load_timesheet(session, today=date(2016, 2, 18))
+    rows = report.total_hours(timesheet, forgot_policy='exclude')
+    session.close()
+
+    hours = {row.group: row.hours for row in rows}
+    assert hours == {'888111111': 4.0, '888222222': 2.74}
+
+
+def test_export_streams_chunks(Session):
+    """Exports read PostgreSQL tables through a server-side cursor."""
+    session = Session()
+    query = export.table_query(session, 'timesheet', user_type='tutor')
+    chunks = list(export.iter_chunks(session, query, chunk_size=1))
+    session.close()
+
+    assert [len(rows) for rows in chunks] == [1, 1]
+    assert {rows[0].user_id for rows in chunks} == {'888222222'}
+
+
+def test_compact_timesheet_unsupported(postgres_engine):
+    """Only SQLite timesheets can be converted to the compact schema."""
+    with pytest.raises(ValueError):
+        convert_to_compact_timesheet(postgres_engine)
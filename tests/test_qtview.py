@@ -0,0 +1,258 @@
+import logging
+import os
+import pathlib
+import pytest
+import threading
+import time
+
+from chronophore import config, controller
+
+logging.disable(logging.CRITICAL)
+
+os.environ.setdefault('QT_QPA_PLATFORM', 'offscreen')
+pytest.importorskip('PyQt5.QtWidgets')
+
+from PyQt5.QtCore import Qt  # noqa: E402
+from PyQt5.QtWidgets import QApplication  # noqa: E402
+
+
+@pytest.fixture(scope='module')
+def app():
+    return QApplication.instance() or QApplication([])
+
+
+@pytest.fixture()
+def qtview(app, tmpdir, monkeypatch):
+    """Import and return the qtview module."""
+    # Importing qtview loads the config, so keep it out of the
+    # user's config directory.
+    monkeypatch.setattr(
+        config, 'CONFIG_FILE',
+        pathlib.Path(str(tmpdir)).joinpath('config', 'config.ini'),
+    )
+    monkeypatch.setattr(config, 'CONFIG', None)
+    from chronophore import qtview
+    return qtview
+
+
+@pytest.fixture()
+def model(qtview):
+    """Return an empty QtSignedInModel that records the rows
+    inserted into and removed from it.
+    """
+    model = qtview.QtSignedInModel()
+    model.changes = []
+    model.rowsInserted.connect(
+        lambda parent, first, last: model.changes.append(('insert', first))
+    )
+    model.rowsRemoved.connect(
+        lambda parent, first, last: model.changes.append(('remove', first))
+    )
+    return model
+
+
+class StubController:
+    """Stands in for `controller.sign()`, recording each call.
+    Signing waits until `gate` is set, and raises
+    `AmbiguousUserType` for the ids in `ambiguous` until a user
+    type is given.
+    """
+
+    def __init__(self):
+        self.calls = []
+        self.threads = set()
+        self.ambiguous = set()
+        self.gate = threading.Event()
+        self.gate.set()
+
+    def sign(self, user_id, user_type=None):
+        self.gate.wait(5)
+        self.calls.append((user_id, user_type))
+        self.threads.add(threading.current_thread())
+        if user_id in self.ambiguous and user_type is None:
+            raise controller.AmbiguousUserType(
+                'User is both a student and a tutor.'
+            )
+        return controller.Status(True, 'in', user_id, user_type or 'student', None)
+
+
+@pytest.fixture()
+def ui(qtview, monkeypatch):
+    """Return a QtChronophoreUI whose worker signs users in with a
+    `StubController`, and that records its feedback messages.
+    Sign ins are confirmed without asking.
+    """
+    stub = StubController()
+    monkeypatch.setattr(qtview.controller, 'sign', stub.sign)
+    monkeypatch.setattr(
+        qtview.QMessageBox, 'question',
+        lambda *args, **kwargs: qtview.QMessageBox.Yes,
+    )
+
+    ui = qtview.QtChronophoreUI()
+    ui.stub = stub
+    ui.feedback = []
+    monkeypatch.setattr(
+        ui, '_show_feedback_label',
+        lambda message, seconds=None: ui.feedback.append(message),
+    )
+    yield ui
+
+    ui.reconcile_timer.stop()
+    ui.worker_thread.quit()
+    ui.worker_thread.wait()
+
+
+def scan(ui, user_id):
+    ui.ent_id.setText(user_id)
+    ui._sign_button_press()
+
+
+def wait_until_idle(app, ui, timeout=5):
+    """Process events until every queued scan has been handled."""
+    deadline = time.monotonic() + timeout
+    while ui.busy or ui.pending:
+        assert time.monotonic() < deadline
+        app.processEvents()
+        time.sleep(0.01)
+
+
+def rows(model):
+    return [
+        model.data(model.index(row), Qt.DisplayRole)
+        for row in range(model.rowCount())
+    ]
+
+
+def test_add_keeps_rows_sorted(model):
+    assert model.add('888333333', 'Pippin Took')
+    assert model.add('888111111', 'Frodo Baggins')
+    assert model.add('888222222', 'Merry Brandybuck')
+    assert model.add('888444444', 'Sam Gamgee')
+
+    assert rows(model) == [
+        'Frodo Baggins', 'Merry Brandybuck', 'Pippin Took', 'Sam Gamgee'
+    ]
+    assert model.changes == [
+        ('insert', 0), ('insert', 0), ('insert', 1), ('insert', 3)
+    ]
+
+
+def test_add_same_name(model):
+    """Users with the same name get a row each, and adding a
+    user again changes nothing.
+    """
+    model.add('888222222', 'Frodo Baggins')
+    model.add('888111111', 'Frodo Baggins')
+    assert not model.add('888111111', 'Frodo Baggins')
+
+    assert rows(model) == ['Frodo Baggins', 'Frodo Baggins']
+    assert model._rows == [
+        ('Frodo Baggins', '888111111'), ('Frodo Baggins', '888222222')
+    ]
+    assert len(model.changes) == 2
+
+
+def test_rename(model):
+    """A renamed user's row moves to its new place."""
+    model.add('888111111', 'Frodo Baggins')
+    model.add('888222222', 'Merry Brandybuck')
+    model.changes.clear()
+
+    assert model.add('888111111', 'Sam Gamgee')
+    assert rows(model) == ['Merry Brandybuck', 'Sam Gamgee']
+    assert model.changes == [('remove', 0), ('insert', 1)]
+
+
+def test_remove(model):
+    model.add('888111111', 'Frodo Baggins')
+    model.add('888222222', 'Merry Brandybuck')
+    model.add('888333333', 'Pippin Took')
+    model.changes.clear()
+
+    assert model.remove('888222222')
+    assert not model.remove('888222222')
+    assert not model.remove('888999999')
+    assert rows(model) == ['Frodo Baggins', 'Pippin Took']
+    assert model.changes == [('remove', 1)]
+
+
+def test_sync(model):
+    """Only the rows that differ are added, renamed or
+    removed.
+    """
+    model.add('888111111', 'Frodo Baggins')
+    model.add('888222222', 'Merry Brandybuck')
+    model.add('888333333', 'Pippin Took')
+    model.changes.clear()
+
+    changed = model.sync({
+        '888111111': 'Frodo Baggins',
+        '888333333': 'Peregrin Took',
+        '888444444': 'Sam Gamgee',
+    })
+
+    assert changed == 3
+    assert rows(model) == ['Frodo Baggins', 'Peregrin Took', 'Sam Gamgee']
+    assert sorted(model.changes) == [
+        ('insert', 1), ('insert', 2), ('remove', 1), ('remove', 1)
+    ]
+    assert model.sync({}) == 3
+    assert model.rowCount() == 0
+
+
+def test_scans_queued_while_signing(app, ui):
+    """Ids scanned while a sign in is in progress are queued,
+    and signed in on the worker thread one at a time, in order.
+    """
+    ui.stub.gate.clear()
+    for user_id in ('888111111', '888222222', '888333333'):
+        scan(ui, user_id)
+
+    assert ui.busy
+    assert list(ui.pending) == ['888222222', '888333333']
+    assert ui.ent_id.text() == ''
+
+    ui.stub.gate.set()
+    wait_until_idle(app, ui)
+
+    assert ui.stub.calls == [
+        ('888111111', None), ('888222222', None), ('888333333', None)
+    ]
+    assert threading.main_thread() not in ui.stub.threads
+    assert ui.feedback == [
+        'Signed in: 888111111', 'Signed in: 888222222', 'Signed in: 888333333'
+    ]
+
+
+@pytest.mark.parametrize('accepted', [True, False])
+def test_ambiguous_user_type(app, ui, qtview, monkeypatch, accepted):
+    """A user with two user types is asked which to sign in
+    as, and signed in again with it before the next queued
+    scan. Cancelling moves on to the next scan.
+    """
+    class Dialog:
+        def __init__(self, message, parent=None):
+            self.user_type = 'tutor'
+
+        def exec_(self):
+            return qtview.QDialog.Accepted if accepted else qtview.QDialog.Rejected
+
+    monkeypatch.setattr(qtview, 'QtUserTypeSelectionDialog', Dialog)
+    ui.stub.ambiguous.add('888111111')
+    ui.stub.gate.clear()
+    scan(ui, '888111111')
+    scan(ui, '888222222')
+    ui.stub.gate.set()
+    wait_until_idle(app, ui)
+
+    if accepted:
+        assert ui.stub.calls == [
+            ('888111111', None), ('888111111', 'tutor'), ('888222222', None)
+        ]
+        assert ui.feedback == [
+            'Signed in: 888111111 (tutor)', 'Signed in: 888222222'
+        ]
+    else:
+        assert ui.stub.calls == [('888111111', None), ('888222222', None)]
+        assert ui.feedback == ['Signed in: 888222222']
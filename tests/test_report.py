@@ -0,0 +1,142 @@
+import io
+from datetime import date, time
+
+from chronophore import report
+from chronophore.models import Entry
+
+TODAY = date(2016, 2, 17)
+
+
+def add_entries(db_session, test_users):
+    db_session.add_all([
+        Entry(
+            uuid='c7b7d0e6-5f5b-4f2a-9d4c-3c1f4e0b6d01',
+            date=date(2016, 2, 15),
+            time_in=time(9, 0, 0),
+            time_out=time(11, 30, 0),
+            user_id=test_users['sam'].user_id,
+            user_type='student',
+        ),
+        Entry(
+            uuid='0c8f0b9a-8a1e-4b8e-8f5e-2b0b6a4d7e02',
+            date=date(2016, 2, 16),
+            forgot_sign_out=True,
+            time_in=time(14, 0, 0),
+            time_out=None,
+            user_id=test_users['sam'].user_id,
+            user_type='student',
+        ),
+    ])
+    db_session.commit()
+
+
+def test_load_timesheet(db_session, test_users):
+    """Signed out and forgotten entries are loaded.
+    Entries still signed in today are not.
+    """
+    add_entries(db_session, test_users)
+    timesheet = report.load_timesheet(db_session, today=TODAY)
+
+    assert len(timesheet.user_ids) == 4
+    assert sorted(s for s in timesheet.seconds if s is not None) == [
+        9000, 9870, 14387
+    ]
+    assert timesheet.forgot.count(True) == 1
+
+
+def test_load_timesheet_stale_entries(db_session):
+    """An entry from a previous day that was never flagged
+    still counts as forgotten.
+    """
+    timesheet = report.load_timesheet(db_session, today=date(2016, 2, 18))
+
+    assert len(timesheet.user_ids) == 4
+    assert timesheet.forgot.count(True) == 2
+
+
+def test_total_hours_by_user(db_session, test_users):
+    """Sam's hours for the term are totalled. His forgotten
+    entry is left out by default.
+    """
+    add_entries(db_session, test_users)
+    timesheet = report.load_timesheet(
+        db_session, user_type='student', today=TODAY
+    )
+    rows = report.total_hours(timesheet)
+
+    assert rows == [
+        report.ReportRow(None, test_users['sam'].user_id, 2, 6.50),
+    ]
+
+
+def test_total_hours_forgot_policy(db_session, test_users):
+    """Forgotten entries can count as a visit with no hours,
+    or with a fixed number of hours.
+    """
+    add_entries(db_session, test_users)
+    timesheet = report.load_timesheet(
+        db_session, user_type='student', today=TODAY
+    )
+    sam_id = test_users['sam'].user_id
+
+    zero = report.total_hours(timesheet, forgot_policy='zero')
+    assert zero == [report.ReportRow(None, sam_id, 3, 6.50)]
+
+    fixed = report.total_hours(timesheet, forgot_policy='fixed', forgot_hours=1)
+    assert fixed == [report.ReportRow(None, sam_id, 3, 7.50)]
+
+
+def test_total_hours_by_period(db_session, test_users):
+    """Hours are totalled per user type, per day and per week."""
+    add_entries(db_session, test_users)
+    timesheet = report.load_timesheet(db_session, today=TODAY)
+
+    days = report.total_hours(timesheet, group='user_type', period='day')
+    assert days == [
+        report.ReportRow(date(2016, 2, 15), 'student', 1, 2.50),
+        report.ReportRow(date(2016, 2, 17), 'student', 1, 4.00),
+        report.ReportRow(date(2016, 2, 17), 'tutor', 1, 2.74),
+    ]
+
+    weeks = report.total_hours(timesheet, group='user_type', period='week')
+    assert weeks == [
+        report.ReportRow(date(2016, 2, 15), 'student', 2, 6.50),
+        report.ReportRow(date(2016, 2, 15), 'tutor', 1, 2.74),
+    ]
+
+
+def test_total_hours_by_term():
+    """Hours are totalled per term, or over the whole date
+    range.
+    """
+    timesheet = report.Timesheet(
+        user_ids=['888111111'] * 3,
+        user_types=['student'] * 3,
+        dates=[date(2015, 12, 31), date(2016, 1, 4), date(2016, 5, 31)],
+        seconds=[3600, 1800, 1800],
+        forgot=[False] * 3,
+    )
+
+    terms = report.total_hours(timesheet, period='term')
+    assert terms == [
+        report.ReportRow(date(2015, 8, 1), '888111111', 1, 1.00),
+        report.ReportRow(date(2016, 1, 1), '888111111', 2, 1.00),
+    ]
+
+    everything = report.total_hours(timesheet, period='all')
+    assert everything == [report.ReportRow(None, '888111111', 3, 2.00)]
+
+
+def test_print_report(db_session, test_users):
+    """The report is written as csv, with user names."""
+    add_entries(db_session, test_users)
+    output = io.StringIO()
+    report.print_report(
+        db_session, start=date(2016, 2, 15), end=date(2016, 2, 15),
+        output=output,
+    )
+
+    assert output.getvalue() == (
+        'period,group,name,visits,hours\n'
+        + ',888111111,Sam Gamgee,1,2.50\n'
+    )
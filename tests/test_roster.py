@@ -0,0 +1,90 @@
+import io
+import logging
+import pytest
+from datetime import date
+
+from chronophore import controller, roster
+from chronophore.models import User
+
+logging.disable(logging.CRITICAL)
+
+TODAY = date(2016, 8, 22)
+
+ROSTER = '''user_id,first_name,last_name,is_student,is_tutor,major,ignored
+888000000,Frodo,Baggins,1,1,Medicine,x
+888111111,Sam,Gamgee,yes,no,Gardening,x
+888222222,Merry,Brandybuck,0,1,Physics,x
+888444444,Gandalf,the Grey,false,true,Computer Science,x
+888555555,Bilbo,Baggins,1,0,History,x
+'''
+
+
+def sync(session, text, **kwargs):
+    return roster.sync_roster(session, io.StringIO(text), today=TODAY, **kwargs)
+
+
+def test_sync_roster(db_session):
+    """New users are added, changed users updated, users
+    who left brought back, and missing users closed.
+    """
+    changes = sync(db_session, ROSTER)
+    assert changes == roster.RosterChanges(
+        added=['888555555'],
+        updated=['888111111', '888222222'],
+        closed=['888333333'],
+        unchanged=['888000000', '888444444'],
+        skipped=[],
+    )
+
+    users = {user.user_id: user for user in db_session.query(User)}
+    assert users['888555555'].first_name == 'Bilbo'
+    assert users['888555555'].date_joined == TODAY
+    assert users['888111111'].major == 'Gardening'
+    assert users['888111111'].personal_email == 'gamgee.samwise@gmail.com'
+    assert users['888222222'].date_left is None
+    assert users['888333333'].date_left == TODAY
+
+
+def test_sync_roster_idempotent(db_session):
+    sync(db_session, ROSTER)
+    changes = sync(db_session, ROSTER)
+    assert changes.added == changes.updated == changes.closed == []
+    assert len(changes.unchanged) == 5
+
+
+def test_sync_roster_dry_run(db_session):
+    changes = sync(db_session, ROSTER, dry_run=True, close_missing=False)
+    assert changes.added == ['888555555']
+    assert changes.closed == []
+    assert db_session.query(User).count() == 5
+    assert db_session.query(User).get('888333333').date_left is None
+
+
+def test_sync_roster_skips_bad_rows(db_session):
+    """Bad rows are reported, and the rest are still used."""
+    text = (
+        'user_id,first_name,is_student,date_left\n'
+        '888555555,Bilbo,1,\n'
+        ',Nobody,1,\n'
+        '888666666,Lobelia,maybe,\n'
+        '888777777,Otho,1,2016-13-01\n'
+        '888555555,Bilbo,1,\n'
+    )
+    changes = sync(db_session, text, close_missing=False)
+    assert changes.added == ['888555555']
+    assert [line for line, _ in changes.skipped] == [3, 4, 5, 6]
+
+
+def test_sync_roster_needs_user_id(db_session):
+    with pytest.raises(ValueError):
+        sync(db_session, 'first_name,last_name\nBilbo,Baggins\n')
+
+
+def test_sync_roster_clears_user_cache(db_session):
+    """Newly added users can sign in right away."""
+    with pytest.raises(controller.UnregisteredUser):
+        controller.sign('888555555', session=db_session)
+
+    sync(db_session, ROSTER)
+    status = controller.sign('888555555', session=db_session)
+    assert status.in_or_out == 'in'
@@ -0,0 +1,150 @@
+import logging
+import os
+import pathlib
+import pytest
+import sqlite3
+import stat
+from datetime import date, datetime
+
+from sqlalchemy import create_engine
+from sqlalchemy.exc import OperationalError
+from sqlalchemy.orm import sessionmaker
+
+from chronophore import archive, report, snapshot
+from chronophore.models import Base, Entry, User
+
+logging.disable(logging.CRITICAL)
+
+NOW = datetime(2016, 2, 17, 17, 0, 0)
+
+
+@pytest.fixture()
+def live_db(tmpdir, test_users, test_entries):
+    """Return the path to a WAL mode sqlite database with
+    the test users and entries.
+    """
+    path = pathlib.Path(str(tmpdir)).joinpath('chronophore.sqlite')
+    engine = create_engine('sqlite:///{}'.format(path))
+    engine.execute('PRAGMA journal_mode=WAL')
+    Base.metadata.create_all(engine)
+    session = sessionmaker(bind=engine)()
+    session.add_all(test_users.values())
+    session.add_all(test_entries)
+    session.commit()
+    session.close()
+    engine.dispose()
+    return path
+
+
+def test_create_snapshot(live_db, tmpdir):
+    snapshot_dir = pathlib.Path(str(tmpdir)).joinpath('snapshots')
+    path = snapshot.create_snapshot(live_db, snapshot_dir, now=NOW)
+
+    assert path.name == 'chronophore-20160217T170000.sqlite'
+    assert not path.stat().st_mode & (stat.S_IWUSR | stat.S_IWGRP | stat.S_IWOTH)
+    assert sorted(p.name for p in snapshot_dir.iterdir()) == [path.name]
+
+    engine = snapshot.create_snapshot_engine(path)
+    session = sessionmaker(bind=engine)()
+    assert session.query(Entry).count() == 4
+    assert session.query(User).count() == 5
+
+    with pytest.raises(OperationalError):
+        session.query(Entry).delete()
+    session.close()
+
+
+def test_snapshot_while_writing(live_db, tmpdir, monkeypatch):
+    """Writes from the kiosk during an incremental copy don't
+    leave the snapshot inconsistent.
+    """
+    kiosk = sqlite3.connect(str(live_db))
+    kiosk.execute('CREATE TABLE padding (data BLOB)')
+    kiosk.executemany(
+        'INSERT INTO padding VALUES (?)', [(os.urandom(4000), )] * 200
+    )
+    kiosk.commit()
+
+    writes = []
+    original = snapshot.time.sleep
+
+    def write_then_sleep(seconds):
+        if len(writes) < 3:
+            kiosk.execute(
+                "UPDATE timesheet SET time_out = '17:00:00'"
+                " WHERE time_out IS NULL"
+            )
+            kiosk.execute('DELETE FROM padding WHERE rowid = ?', (len(writes) + 1, ))
+            kiosk.commit()
+            writes.append(True)
+        original(seconds)
+
+    monkeypatch.setattr(snapshot.time, 'sleep', write_then_sleep)
+    path = snapshot.create_snapshot(
+        live_db, pathlib.Path(str(tmpdir)), pages=50, pause=0, now=NOW
+    )
+    monkeypatch.undo()
+    kiosk.close()
+
+    copy = sqlite3.connect(path.as_uri() + '?mode=ro', uri=True)
+    assert writes
+    assert copy.execute('PRAGMA integrity_check').fetchone() == ('ok', )
+    assert copy.execute('SELECT count(*) FROM padding').fetchone() == (197, )
+    assert copy.execute(
+        'SELECT count(*) FROM timesheet WHERE time_out IS NULL'
+    ).fetchone() == (0, )
+    assert copy.execute('PRAGMA journal_mode').fetchone() == ('delete', )
+    copy.close()
+
+
+def test_list_and_prune_snapshots(live_db, tmpdir):
+    snapshot_dir = pathlib.Path(str(tmpdir)).joinpath('snapshots')
+    taken = [datetime(2016, 2, day, 17, 0, 0) for day in (15, 16, 17)]
+    for taken_at in taken:
+        snapshot.create_snapshot(live_db, snapshot_dir, now=taken_at)
+    snapshot_dir.joinpath('chronophore-notes.sqlite').touch()
+    snapshot_dir.joinpath('test-20160218T170000.sqlite').touch()
+
+    assert [t for t, _ in snapshot.list_snapshots(snapshot_dir, live_db)] == taken
+    assert snapshot.latest_snapshot(snapshot_dir, live_db)[0] == taken[-1]
+
+    deleted = snapshot.prune_snapshots(snapshot_dir, live_db, keep=2)
+    assert [p.name for p in deleted] == ['chronophore-20160215T170000.sqlite']
+    assert len(snapshot.list_snapshots(snapshot_dir, live_db)) == 2
+
+    with pytest.raises(ValueError):
+        snapshot.prune_snapshots(snapshot_dir, live_db, keep=0)
+
+
+def test_snapshot_before_archiving(live_db, tmpdir):
+    """Reading a snapshot taken before archiving, along with
+    the archives, counts each archived entry once.
+    """
+    tmpdir = pathlib.Path(str(tmpdir))
+    archive_dir = tmpdir.joinpath('archive')
+
+    def totals(session):
+        timesheet = report.load_timesheet(session, today=NOW.date())
+        return report.total_hours(timesheet, forgot_policy='zero')
+
+    engine = create_engine('sqlite:///{}'.format(live_db))
+    session = sessionmaker(bind=engine)()
+    expected = totals(session)
+    path = snapshot.create_snapshot(live_db, tmpdir.joinpath('snapshots'), now=NOW)
+    assert archive.archive_entries(session, archive_dir, date(2016, 3, 1))
+    session.close()
+    engine.dispose()
+
+    for read_file in (path, live_db):
+        engine = archive.create_archive_engine(read_file, archive_dir)
+        session = sessionmaker(bind=engine)()
+        assert totals(session) == expected
+        uuids = [uuid for (uuid, ) in session.query(Entry.uuid)]
+        assert len(uuids) == len(set(uuids)) == 4
+        session.close()
+        engine.dispose()
+
+
+def test_no_snapshots(tmpdir):
+    path = pathlib.Path(str(tmpdir))
+    assert snapshot.latest_snapshot(path, path.joinpath('chronophore.sqlite')) is None